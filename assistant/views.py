@@ -1,7 +1,9 @@
 from django.shortcuts import render
 from django.http import JsonResponse
+from erp.db import read_only
 from .utils import ask_gemini
 
+@read_only()
 def assistant_chat(request):
     if request.method == "POST":
         user_message = request.POST.get("message")
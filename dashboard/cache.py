@@ -0,0 +1,68 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+# Seconds a snapshot is served as fresh before it is recomputed
+SNAPSHOT_TTL = getattr(settings, 'DASHBOARD_SNAPSHOT_TTL', 300)
+
+# Seconds a stale snapshot may still be served while another request recomputes
+SNAPSHOT_STALE_TTL = getattr(settings, 'DASHBOARD_SNAPSHOT_STALE_TTL', 60 * 60 * 24)
+
+# Upper bound on a single recomputation, after which the lock is released anyway
+RECOMPUTE_LOCK_TIMEOUT = 60
+
+VERSION_KEY = 'dashboard:data-version'
+
+
+def get_data_version():
+    """
+    Current dashboard data version.
+
+    Seeded from the clock so that a counter evicted from the cache can never
+    come back with a value an old snapshot was stored under.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """Mark every cached dashboard snapshot as stale."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def get_snapshot(key, compute):
+    """
+    Return the cached value for ``key``, recomputing it with ``compute()``
+    when it is missing, expired or older than the current data version.
+
+    Stale-while-revalidate: when a stale snapshot exists, only the request
+    that wins the recompute lock runs ``compute()``; concurrent requests keep
+    serving the old snapshot until the new one is stored.
+    """
+    version = get_data_version()
+    cache_key = f'dashboard:snapshot:{key}'
+    lock_key = f'dashboard:lock:{key}'
+
+    entry = cache.get(cache_key)
+    if entry is not None:
+        fresh = entry['version'] == version and time.time() - entry['created'] < SNAPSHOT_TTL
+        if fresh or not cache.add(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT):
+            return entry['data']
+
+    try:
+        data = compute()
+        cache.set(cache_key, {
+            'version': version,
+            'created': time.time(),
+            'data': data,
+        }, SNAPSHOT_STALE_TTL)
+    finally:
+        if entry is not None:
+            cache.delete(lock_key)
+    return data
@@ -0,0 +1,150 @@
+from collections import namedtuple
+from datetime import timedelta
+from django.db.models import Sum, Count, Avg, F, Q, DateField
+from django.db.models.functions import TruncDate, TruncWeek, TruncMonth
+from django.utils import timezone
+from sales.dates import local_day_start
+from sales.models import Sales
+
+
+PERIODS = ('day', 'week', 'month')
+
+# A KPI is one aggregate over one named window (a Q filter, or None for all rows)
+KPI = namedtuple('KPI', ['name', 'window', 'function', 'expression'])
+
+SALES_KPIS = (
+    KPI('today_sales_total', 'today', Sum, 'total_amount'),
+    KPI('today_sales_count', 'today', Count, 'id'),
+    KPI('unverified_sales', 'unverified_today', Sum, 'total_amount'),
+    KPI('week_sales_total', 'week', Sum, 'total_amount'),
+    KPI('week_sales_profit', 'week', Sum, 'gross_profit'),
+    KPI('month_sales_total', 'month', Sum, 'total_amount'),
+    KPI('month_sales_profit', 'month', Sum, 'gross_profit'),
+    KPI('month_sales_count', 'month', Count, 'id'),
+    KPI('total_revenue', 'all_time', Sum, 'total_amount'),
+    KPI('total_profit', 'all_time', Sum, 'gross_profit'),
+    KPI('avg_profit_margin', 'with_revenue', Avg, F('gross_profit') / F('total_amount') * 100),
+)
+
+PURCHASE_KPIS = (
+    KPI('total_purchases_value', None, Sum, F('quantity_purchased') * F('selling_price')),
+    KPI('pending_purchases', 'pending', Count, 'id'),
+    KPI('month_purchases_total', 'month', Sum, 'total_cost'),
+    KPI('month_purchases_count', 'month', Count, 'id'),
+)
+
+
+def bucket_start(day, period):
+    """First local date of the ``period`` bucket containing ``day``."""
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def next_bucket(day, period):
+    if period == 'day':
+        return day + timedelta(days=1)
+    if period == 'week':
+        return day + timedelta(days=7)
+    if period == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def _truncate(period, tzinfo):
+    if period == 'day':
+        return TruncDate('sold_on', tzinfo=tzinfo)
+    if period == 'week':
+        return TruncWeek('sold_on', output_field=DateField(), tzinfo=tzinfo)
+    if period == 'month':
+        return TruncMonth('sold_on', output_field=DateField(), tzinfo=tzinfo)
+    raise ValueError(f"Unknown period: {period}")
+
+
+def sales_time_series(start_date, end_date, period='day', queryset=None):
+    """
+    Zero-filled sales totals between two local dates (both inclusive),
+    bucketed by day, week (starting Monday) or month.
+
+    Runs a single grouped query regardless of the length of the range.
+    Buckets are computed in the current timezone (Asia/Kolkata), so a sale
+    made at 00:30 IST lands on its local day rather than the UTC one.
+    The first and last week/month buckets only cover the requested range.
+    Only verified sales are counted unless a ``queryset`` is given.
+    Returns a list of ``{'bucket', 'amount', 'profit', 'count'}`` dicts.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"Unknown period: {period}")
+
+    if queryset is None:
+        queryset = Sales.objects.filter(is_verified=True)
+
+    rows = queryset.filter(
+        sold_on__gte=local_day_start(start_date),
+        sold_on__lt=local_day_start(end_date + timedelta(days=1)),
+    ).annotate(
+        bucket=_truncate(period, timezone.get_current_timezone())
+    ).values('bucket').annotate(
+        amount=Sum('total_amount'),
+        profit=Sum('gross_profit'),
+        count=Count('id'),
+    ).order_by()
+
+    totals = {row['bucket']: row for row in rows}
+
+    series = []
+    day = bucket_start(start_date, period)
+    while day <= end_date:
+        row = totals.get(day, {})
+        series.append({
+            'bucket': day,
+            'amount': float(row.get('amount') or 0),
+            'profit': float(row.get('profit') or 0),
+            'count': row.get('count') or 0,
+        })
+        day = next_bucket(day, period)
+    return series
+
+
+# ==================== KPI ENGINE ====================
+
+def sales_windows(today):
+    """Named filters for the sales KPI windows, relative to local ``today``."""
+    today_start = local_day_start(today)
+    tomorrow_start = local_day_start(today + timedelta(days=1))
+    return {
+        'today': Q(is_verified=True, sold_on__gte=today_start, sold_on__lt=tomorrow_start),
+        'unverified_today': Q(is_verified=False, sold_on__gte=today_start, sold_on__lt=tomorrow_start),
+        'week': Q(is_verified=True, sold_on__gte=local_day_start(today - timedelta(days=7))),
+        'month': Q(is_verified=True, sold_on__gte=local_day_start(today - timedelta(days=30))),
+        'all_time': Q(is_verified=True),
+        'with_revenue': Q(is_verified=True, total_amount__gt=0),
+    }
+
+
+def purchase_windows(today):
+    return {
+        'pending': Q(is_received=False),
+        'month': Q(purchase_date__gte=today - timedelta(days=30)),
+    }
+
+
+def compute_kpis(queryset, windows, kpis):
+    """
+    Evaluate every KPI in ``kpis`` with a single ``aggregate()`` over
+    ``queryset``, using conditional aggregation (``filter=``) per window.
+
+    Adding a KPI to one of the declarative lists adds a column to the same
+    query, not a new query. Empty aggregates are returned as 0.
+    """
+    aggregates = {}
+    for kpi in kpis:
+        condition = windows[kpi.window] if kpi.window else None
+        aggregates[kpi.name] = kpi.function(kpi.expression, filter=condition)
+
+    result = queryset.aggregate(**aggregates)
+    return {name: value or 0 for name, value in result.items()}
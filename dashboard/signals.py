@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from inventory.models import Stock
+from purchases.models import Purchase
+from purchase_returns.models import PurchaseReturn
+from sales.models import Sales
+from utility.recompute import defer, register
+from .cache import bump_data_version
+
+register('dashboard.version', lambda keys: bump_data_version())
+
+
+@receiver(post_save, sender=Sales)
+@receiver(post_delete, sender=Sales)
+@receiver(post_save, sender=Stock)
+@receiver(post_delete, sender=Stock)
+@receiver(post_save, sender=Purchase)
+@receiver(post_delete, sender=Purchase)
+@receiver(post_save, sender=PurchaseReturn)
+@receiver(post_delete, sender=PurchaseReturn)
+def invalidate_dashboard(sender, instance, **kwargs):
+    if not defer('dashboard.version', [True]):
+        bump_data_version()
@@ -0,0 +1,208 @@
+from functools import cached_property
+from django.db.models import Sum, F
+from django.utils import timezone
+from datetime import timedelta
+from inventory.counters import category_counters, headline_counters, scope_for_user
+from inventory.models import LOW_STOCK_THRESHOLD, Stock
+from purchases.models import Purchase
+from sales.models import Sales
+from purchase_returns.models import PurchaseReturn
+from sales.rollups import top_products
+from erp.db import read_only
+from .cache import get_snapshot
+from .metrics import (
+    SALES_KPIS, PURCHASE_KPIS,
+    compute_kpis, sales_time_series, sales_windows, purchase_windows,
+)
+
+
+class DashboardStats:
+    """
+    Lazily evaluated dashboard statistics.
+
+    Every metric is computed the first time a template touches it and then
+    memoized for the lifetime of the object (one request), so pages that never
+    read ``dashboard.*`` don't run any of the dashboard queries.
+    """
+
+    # Widgets on the admin index and the metrics each one is built from.
+    # Every widget is cached and served independently.
+    WIDGETS = {
+        'kpis': (
+            'total_purchases_value', 'total_revenue', 'total_profit', 'total_purchase_return',
+            'total_stock_value', 'total_items', 'low_stock_count', 'out_of_stock',
+            'today_sales_total', 'today_sales_count', 'unverified_sales',
+            'week_sales_total', 'week_sales_profit',
+            'month_sales_total', 'month_sales_profit', 'month_sales_count',
+            'pending_purchases', 'month_purchases_total', 'month_purchases_count',
+            'avg_profit_margin',
+        ),
+        'daily_sales': ('daily_sales',),
+        'monthly_sales': ('monthly_sales',),
+        'top_products': ('top_products',),
+        'stock_alerts': ('stock_alerts',),
+        'category_distribution': ('category_distribution',),
+        'recent_sales': ('recent_sales',),
+    }
+
+    # metric -> widget it belongs to
+    WIDGET_OF = {field: widget for widget, fields in WIDGETS.items() for field in fields}
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def scope(self):
+        """Cache scope: superusers share one view, everyone else sees their own stock."""
+        return scope_for_user(self.user)
+
+    def widget_data(self, widget):
+        """Evaluate one widget's metrics into a plain, picklable dict."""
+        return {name: getattr(self, name) for name in self.WIDGETS[widget]}
+
+    # ==================== BASE QUERYSETS ====================
+
+    @cached_property
+    def today(self):
+        return timezone.localdate()
+
+    @cached_property
+    def month_ago(self):
+        return self.today - timedelta(days=30)
+
+    @property
+    def stock_base(self):
+        # Apply user filter only if not superuser
+        if self.user.is_superuser:
+            return Stock.objects.all()
+        return Stock.objects.filter(user=self.user)
+
+    @property
+    def sales_base(self):
+        # Note: Sales and Purchase don't have user fields, so they are global
+        return Sales.objects.all()
+
+    @property
+    def purchase_base(self):
+        return Purchase.objects.all()
+
+    @property
+    def purchase_return_base(self):
+        return PurchaseReturn.objects.all()
+
+    # ==================== KPIs ====================
+
+    # KPI name -> the cached group that computes it in one query
+    KPI_GROUPS = {
+        **{kpi.name: 'sales_kpis' for kpi in SALES_KPIS},
+        **{name: 'stock_kpis' for name in ('total_stock_value', 'total_items', 'low_stock_count', 'out_of_stock')},
+        **{kpi.name: 'purchase_kpis' for kpi in PURCHASE_KPIS},
+    }
+
+    def __getattr__(self, name):
+        group = self.KPI_GROUPS.get(name)
+        if group is None:
+            raise AttributeError(name)
+        value = getattr(self, group)[name]
+        return round(value, 2) if isinstance(value, float) else value
+
+    @cached_property
+    def sales_kpis(self):
+        return compute_kpis(self.sales_base, sales_windows(self.today), SALES_KPIS)
+
+    @cached_property
+    def stock_kpis(self):
+        # Maintained incrementally by inventory.counters: one lookup, any catalog size
+        counters = headline_counters(self.scope)
+        return {
+            'total_stock_value': counters['total_value'],
+            'total_items': counters['total_units'],
+            'low_stock_count': counters['low_stock_count'],
+            'out_of_stock': counters['out_of_stock_count'],
+        }
+
+    @cached_property
+    def purchase_kpis(self):
+        return compute_kpis(self.purchase_base, purchase_windows(self.today), PURCHASE_KPIS)
+
+    @cached_property
+    def total_purchase_return(self):
+        return self.purchase_return_base.aggregate(
+            total=Sum(F('quantity_returned') * F('stock_item__cost_price'))
+        )['total'] or 0
+
+    # ==================== TABLES ====================
+
+    @cached_property
+    def category_distribution(self):
+        return category_counters(self.scope)
+
+    @cached_property
+    def stock_alerts(self):
+        return list(self.stock_base.filter(
+            quantity__lt=LOW_STOCK_THRESHOLD
+        ).order_by('quantity').values('name', 'quantity', 'category__name'))
+
+    @cached_property
+    def top_products(self):
+        # Top Selling Products (This Month), read from the daily rollup
+        return top_products(self.month_ago, self.today)
+
+    @cached_property
+    def recent_sales(self):
+        return list(self.sales_base.filter(is_verified=True).values(
+            'stock__name', 'quantity_sold', 'total_amount', 'sold_on'
+        )[:10])
+
+    # ==================== CHARTS ====================
+
+    @cached_property
+    def daily_sales(self):
+        # Daily Sales Chart Data (Last 10 Days)
+        series = sales_time_series(self.today - timedelta(days=10), self.today, 'day')
+        return [
+            {'date': point['bucket'].strftime('%b %d'), 'amount': point['amount']}
+            for point in series
+        ]
+
+    @cached_property
+    def monthly_sales(self):
+        # Monthly Sales Chart Data (Last 6 Months)
+        start = self.today.replace(day=1)
+        for _ in range(5):
+            start = (start - timedelta(days=1)).replace(day=1)
+        series = sales_time_series(start, self.today, 'month')
+        return [
+            {'month': point['bucket'].strftime('%b'), 'amount': point['amount']}
+            for point in series
+        ]
+
+
+class CachedDashboardStats:
+    """
+    Lazy view over the cached dashboard widget snapshots for a user's scope.
+
+    Nothing is loaded until a metric is read; each widget's snapshot is then
+    fetched (or recomputed) once and memoized for the request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.stats = DashboardStats(user)
+        self.widgets = {}
+
+    @cached_property
+    def today(self):
+        return self.stats.today
+
+    def widget(self, name):
+        if name not in self.widgets:
+            key = f'{self.stats.scope}:{self.today}:{name}'
+            self.widgets[name] = get_snapshot(key, read_only()(lambda: self.stats.widget_data(name)))
+        return self.widgets[name]
+
+    def __getattr__(self, name):
+        widget = DashboardStats.WIDGET_OF.get(name)
+        if widget is None:
+            raise AttributeError(name)
+        return self.widget(widget)[name]
@@ -1,3 +1,261 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from inventory.models import Category, Stock
+from sales.dates import local_day_start
+from sales.models import Sales
+from utility.recompute import deferred_recompute
+from . import cache as snapshots
+from .context_processors import dashboard_stats
+from .metrics import SALES_KPIS, compute_kpis, sales_time_series, sales_windows
+from .stats import CachedDashboardStats, DashboardStats
 
-# Create your tests here.
+
+class DashboardDataMixin:
+
+    @classmethod
+    def create_stock(cls):
+        cls.user = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='admin')
+        category = Category.objects.create(name='Shirts')
+        cls.shirt = Stock.objects.create(user=cls.user, category=category, name='Shirt', cost_price=100, selling_price=150, quantity=50)
+        cls.tie = Stock.objects.create(user=cls.user, category=category, name='Tie', cost_price=20, selling_price=50, quantity=50)
+
+    @staticmethod
+    def sale(stock, day, hour=12, minute=0, quantity=1, is_verified=True):
+        sale = Sales.objects.create(stock=stock, quantity_sold=quantity, is_verified=is_verified)
+        # Saved rather than updated, so the data derived from sales follows
+        sale.sold_on = local_day_start(day) + timedelta(hours=hour, minutes=minute)
+        sale.save()
+        return sale
+
+
+class DashboardStatsTests(DashboardDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_stock()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_nothing_evaluated_until_read(self):
+        request = RequestFactory().get('/admin/sales/sales/')
+        request.user = self.user
+        with self.assertNumQueries(0):
+            dashboard = dashboard_stats(request)['dashboard']
+            stats = DashboardStats(self.user)
+
+        # One query per KPI group, however many of its KPIs are read
+        with self.assertNumQueries(1):
+            stats.today_sales_total
+            stats.month_sales_count
+            stats.total_revenue
+        with self.assertNumQueries(0):
+            stats.avg_profit_margin
+
+        # The cached view computes the one widget a metric belongs to, once
+        with self.assertNumQueries(4):
+            dashboard.today_sales_total
+            dashboard.total_items
+        self.assertEqual(set(dashboard.widgets), {'kpis'})
+        with self.assertNumQueries(0):
+            CachedDashboardStats(self.user).total_revenue
+        with self.assertRaises(AttributeError):
+            dashboard.no_such_metric
+
+    def test_rounds_floats_only(self):
+        stock = Stock.objects.create(user=self.user, category=self.shirt.category, name='Belt', cost_price=10, selling_price=33.333, quantity=50)
+        Sales.objects.create(stock=stock, quantity_sold=3, is_verified=True)
+        stats = DashboardStats(self.user)
+
+        self.assertNotEqual(stats.sales_kpis['total_revenue'], 100)
+        self.assertEqual(stats.total_revenue, 100.0)
+        self.assertEqual(stats.avg_profit_margin, 70.0)
+        self.assertEqual(stats.today_sales_count, 1)
+        self.assertIsInstance(stats.today_sales_count, int)
+        self.assertIsInstance(stats.total_items, int)
+
+
+class SalesTimeSeriesTests(DashboardDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_stock()
+        # Wednesday 28 January to Tuesday 3 February 2026
+        cls.start, cls.end = date(2026, 1, 28), date(2026, 2, 3)
+        cls.sale(cls.shirt, date(2026, 1, 28), quantity=2)
+        # 00:30 local on Sunday 1 February is still 31 January in UTC
+        cls.sale(cls.shirt, date(2026, 2, 1), hour=0, minute=30)
+        cls.sale(cls.shirt, date(2026, 2, 2), quantity=3)
+        cls.sale(cls.tie, date(2026, 2, 2), quantity=5, is_verified=False)
+        # Just outside the range on either side
+        cls.sale(cls.shirt, date(2026, 1, 27), hour=23, minute=45)
+        cls.sale(cls.shirt, date(2026, 2, 4), hour=0, minute=15)
+
+    def series(self, period, **kwargs):
+        return [(point['bucket'], point['amount'], point['profit'], point['count']) for point in sales_time_series(self.start, self.end, period, **kwargs)]
+
+    def test_days(self):
+        with self.assertNumQueries(1):
+            series = self.series('day')
+        self.assertEqual(series, [
+            (date(2026, 1, 28), 300, 100, 1),
+            (date(2026, 1, 29), 0, 0, 0),
+            (date(2026, 1, 30), 0, 0, 0),
+            (date(2026, 1, 31), 0, 0, 0),
+            (date(2026, 2, 1), 150, 50, 1),
+            (date(2026, 2, 2), 450, 150, 1),
+            (date(2026, 2, 3), 0, 0, 0),
+        ])
+
+    def test_weeks_from_monday(self):
+        self.assertEqual(self.series('week'), [
+            (date(2026, 1, 26), 450, 150, 2),
+            (date(2026, 2, 2), 450, 150, 1),
+        ])
+
+    def test_months(self):
+        self.assertEqual(self.series('month'), [
+            (date(2026, 1, 1), 300, 100, 1),
+            (date(2026, 2, 1), 600, 200, 2),
+        ])
+
+    def test_queryset_includes_unverified(self):
+        self.assertEqual(self.series('month', queryset=Sales.objects.all()), [
+            (date(2026, 1, 1), 300, 100, 1),
+            (date(2026, 2, 1), 850, 350, 3),
+        ])
+
+    def test_unknown_period(self):
+        with self.assertRaises(ValueError):
+            sales_time_series(self.start, self.end, 'year')
+
+
+class ComputeKpisTests(DashboardDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_stock()
+        cls.today = date(2026, 3, 10)
+        cls.sale(cls.shirt, cls.today, hour=10, quantity=2)
+        cls.sale(cls.shirt, cls.today, hour=9, is_verified=False)
+        cls.sale(cls.shirt, cls.today - timedelta(days=3))
+        cls.sale(cls.shirt, cls.today - timedelta(days=20), quantity=4)
+        cls.sale(cls.tie, cls.today - timedelta(days=60))
+
+    def test_sales_kpis(self):
+        with self.assertNumQueries(1):
+            kpis = compute_kpis(Sales.objects.all(), sales_windows(self.today), SALES_KPIS)
+        # Shirts sell at a 33.33% margin and ties at 60%
+        margin = kpis.pop('avg_profit_margin')
+        self.assertAlmostEqual(margin, (100 / 3 * 3 + 60) / 4)
+        self.assertEqual(kpis, {
+            'today_sales_total': 300, 'today_sales_count': 1, 'unverified_sales': 150,
+            'week_sales_total': 450, 'week_sales_profit': 150,
+            'month_sales_total': 1050, 'month_sales_profit': 350, 'month_sales_count': 3,
+            'total_revenue': 1100, 'total_profit': 380,
+        })
+
+    def test_empty_windows_are_zero(self):
+        kpis = compute_kpis(Sales.objects.none(), sales_windows(self.today), SALES_KPIS)
+        self.assertEqual(kpis, {kpi.name: 0 for kpi in SALES_KPIS})
+
+
+class SnapshotCacheTests(DashboardDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_stock()
+
+    def setUp(self):
+        cache.clear()
+
+    def test_version_bumped_by_changes(self):
+        version = snapshots.get_data_version()
+        sale = Sales.objects.create(stock=self.shirt, quantity_sold=1)
+        self.assertEqual(snapshots.get_data_version(), version + 1)
+
+        # Bulk changes bump it once, on the way out
+        with deferred_recompute():
+            sale.delete()
+            Sales.objects.create(stock=self.tie, quantity_sold=2)
+            self.assertEqual(snapshots.get_data_version(), version + 1)
+        self.assertEqual(snapshots.get_data_version(), version + 2)
+
+    def test_evicted_version_not_reused(self):
+        version = snapshots.get_data_version()
+        cache.delete(snapshots.VERSION_KEY)
+        snapshots.bump_data_version()
+        self.assertGreater(snapshots.get_data_version(), version)
+
+    def test_recomputed_when_stale(self):
+        compute = mock.Mock(side_effect=['first', 'second', 'third'])
+        self.assertEqual(snapshots.get_snapshot('all:kpis', compute), 'first')
+        self.assertEqual(snapshots.get_snapshot('all:kpis', compute), 'first')
+
+        snapshots.bump_data_version()
+        self.assertEqual(snapshots.get_snapshot('all:kpis', compute), 'second')
+
+        with mock.patch.object(snapshots, 'SNAPSHOT_TTL', 0):
+            self.assertEqual(snapshots.get_snapshot('all:kpis', compute), 'third')
+        self.assertEqual(compute.call_count, 3)
+
+    def test_stale_served_while_recomputing(self):
+        snapshots.get_snapshot('all:kpis', lambda: 'old')
+        snapshots.bump_data_version()
+
+        # Another request holds the recompute lock: the old snapshot is served
+        cache.add('dashboard:lock:all:kpis', 1)
+        compute = mock.Mock(return_value='new')
+        self.assertEqual(snapshots.get_snapshot('all:kpis', compute), 'old')
+        compute.assert_not_called()
+
+        # Once it is released, the next request recomputes and lets go of it
+        cache.delete('dashboard:lock:all:kpis')
+        self.assertEqual(snapshots.get_snapshot('all:kpis', compute), 'new')
+        self.assertIsNone(cache.get('dashboard:lock:all:kpis'))
+        self.assertEqual(snapshots.get_snapshot('all:kpis', compute), 'new')
+        compute.assert_called_once()
+
+
+class WidgetEndpointTests(DashboardDataMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_stock()
+        cls.clerk = get_user_model().objects.create_user(username='clerk', email='clerk@example.com', password='clerk')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, name, **headers):
+        return self.client.get(reverse('dashboard_widget', args=[name]), **headers)
+
+    def test_staff_only(self):
+        self.assertEqual(self.get('kpis').status_code, 302)
+        self.client.force_login(self.clerk)
+        self.assertEqual(self.get('kpis').status_code, 302)
+
+        self.client.force_login(self.user)
+        response = self.get('kpis')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.json()), set(DashboardStats.WIDGETS['kpis']))
+
+    def test_unknown_widget(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.get('no-such-widget').status_code, 404)
+
+    def test_conditional_get(self):
+        self.client.force_login(self.user)
+        etag = self.get('kpis')['ETag']
+        self.assertEqual(self.get('kpis', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # New data, new ETag
+        Sales.objects.create(stock=self.shirt, quantity_sold=1, is_verified=True)
+        response = self.get('kpis', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['today_sales_count'], 1)
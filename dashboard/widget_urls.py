@@ -0,0 +1,6 @@
+from django.urls import path
+from .widgets import dashboard_widget
+
+urlpatterns = [
+    path('<slug:name>/', dashboard_widget, name='dashboard_widget'),
+]
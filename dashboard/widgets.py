@@ -0,0 +1,26 @@
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, set_response_etag
+from django.views.decorators.http import require_GET
+from .stats import CachedDashboardStats, DashboardStats
+
+
+@require_GET
+@staff_member_required
+def dashboard_widget(request, name):
+    """
+    JSON data for one admin index widget.
+
+    Each widget is served from its own cached snapshot and carries an ETag,
+    so the page can load widgets in parallel and browsers revalidate them
+    with a cheap conditional GET.
+    """
+    if name not in DashboardStats.WIDGETS:
+        raise Http404(f"Unknown dashboard widget: {name}")
+
+    data = CachedDashboardStats(request.user).widget(name)
+
+    response = JsonResponse(data)
+    patch_cache_control(response, private=True, max_age=0)
+    set_response_etag(response)
+    return get_conditional_response(request, etag=response['ETag'], response=response)
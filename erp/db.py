@@ -0,0 +1,50 @@
+"""
+SQLite connection setup and read-only routing.
+
+Every new connection runs the ``PRAGMAS`` of its ``DATABASES`` entry (see
+the database profiles in ``erp.settings``). Reads made inside a
+``read_only()`` block go to the ``readonly`` alias when it is configured
+(see ``erp.routers``): a connection that never writes, so in WAL mode long
+report and dashboard reads neither wait for nor hold up sale entry writers.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+READONLY_ALIAS = 'readonly'
+
+_read_only = ContextVar('read_only', default=False)
+
+
+@receiver(connection_created)
+def apply_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = connection.settings_dict.get('PRAGMAS') or {}
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def read_only():
+    """
+    Block or view decorator sending its reads to the read-only connection.
+    Reads inside an open transaction on the default connection stay there,
+    so code reading back its own uncommitted writes still sees them.
+
+    Each decorated call gets its own generator, and so its own token, so
+    one decorated view can serve overlapping requests on several threads.
+    """
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def reading_only():
+    """True inside a ``read_only()`` block when the read-only alias exists."""
+    return _read_only.get() and READONLY_ALIAS in settings.DATABASES
@@ -0,0 +1,25 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from .db import READONLY_ALIAS, reading_only
+
+
+class ReadOnlyRouter:
+    """
+    Sends reads made inside ``erp.db.read_only()`` blocks to the read-only
+    connection, and every other query, writes included, to the default one.
+    Both aliases point at the same database file.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reading_only() and not connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return READONLY_ALIAS
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        # Also for instances loaded through the read-only connection
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'utility.instrumentation.RequestInstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,38 @@ DATABASES = {
     }
 }
 
+# Production profile (ERP_DATABASE_PROFILE=production): SQLite tuned for
+# concurrent use. WAL lets readers and one writer work at the same time,
+# busy_timeout makes a writer wait for the lock instead of failing at once,
+# and connections are kept open between requests. A second, query-only
+# connection to the same file serves reads inside erp.db.read_only() blocks
+# (dashboard, reports, exports, assistant) via erp.routers.ReadOnlyRouter.
+# PRAGMAS are applied by erp.db to every new connection.
+
+DATABASE_PROFILE = os.environ.get('ERP_DATABASE_PROFILE', 'development')
+
+if DATABASE_PROFILE == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'PRAGMAS': {
+            'journal_mode': 'WAL',
+            'busy_timeout': 5000,
+            'synchronous': 'NORMAL',
+            'mmap_size': 256 * 1024 * 1024,
+        },
+    })
+    DATABASES['readonly'] = {
+        **DATABASES['default'],
+        'PRAGMAS': {
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            'query_only': 'ON',
+        },
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['erp.routers.ReadOnlyRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -137,3 +170,51 @@ MEDIA_ROOT = '/var/www/mrtt/static/media/'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Dashboard snapshot cache
+# Snapshots live in the default cache. With the default per-process
+# LocMemCache, invalidation is per worker too; point CACHES at a shared
+# backend when running several workers.
+
+DASHBOARD_SNAPSHOT_TTL = 300
+DASHBOARD_SNAPSHOT_STALE_TTL = 60 * 60 * 24
+
+
+# Request instrumentation
+# Query counts and timings of the most recent requests are kept in memory,
+# per process, and shown to superusers at /instrumentation/.
+
+REQUEST_INSTRUMENTATION_HISTORY = 500
+REPEATED_QUERY_THRESHOLD = 10
+
+
+# Background sales reports
+# Reports are rendered off the request by sales.jobs and kept under
+# MEDIA_ROOT/reports/ for REPORT_JOB_TTL seconds. Set REPORT_JOBS_IN_PROCESS
+# to False to leave rendering to `manage.py run_report_jobs` instead of a
+# thread pool in each web worker.
+
+REPORT_JOBS_IN_PROCESS = True
+REPORT_JOB_WORKERS = 2
+REPORT_JOB_TTL = 60 * 60 * 24
+# Jobs still running after REPORT_JOB_TIMEOUT seconds are presumed dead and
+# requeued whenever a report is requested or the report list is opened.
+REPORT_JOB_TIMEOUT = 60 * 30
+# Rendered reports are cached by content (date range plus a version of the
+# underlying sales) and reused until the data changes or they are this old.
+REPORT_CACHE_MAX_AGE = 60 * 60 * 24 * 30
+# Processes rendering the transaction pages of one large report (needs pypdf
+# to join them). Each report job can start this many, so keep
+# REPORT_RENDER_WORKERS x REPORT_JOB_WORKERS within the machine's cores.
+REPORT_RENDER_WORKERS = 1
+
+
+# Stock writes
+# Bulk stock changes (verifying sales, receiving purchases, processing
+# returns) read without locks and write with a conditional UPDATE on
+# Stock.version; when another writer got in first, or SQLite reports the
+# database as locked, the batch is retried this many times in all.
+
+STOCK_WRITE_ATTEMPTS = 5
+STOCK_RETRY_DELAY = 0.05
@@ -6,6 +6,8 @@ from django.views.static import serve
 
 urlpatterns = [
     path('', include('assistant.urls')),
+    path('dashboard/widgets/', include('dashboard.widget_urls')),
+    path('instrumentation/', include('utility.urls')),
     path('', admin.site.urls),
 ]
 
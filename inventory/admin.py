@@ -1,6 +1,8 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.http import HttpResponseRedirect
 from django.utils.html import format_html
-from .models import Category, Stock
+from .models import Category, Stock, StockConflict, StockMovement
 
 
 # @admin.register(Category)
@@ -17,6 +19,19 @@ from .models import Category, Stock
 #     )
 
 
+class StockListFilter(admin.RelatedFieldListFilter):
+    """
+    Filter on a foreign key to Stock whose choices are loaded together with
+    their categories (``Stock.__str__`` includes the category name), instead
+    of one category query per stock item.
+    """
+
+    def field_choices(self, field, request, model_admin):
+        ordering = self.field_admin_ordering(field, request, model_admin) or ('name',)
+        stocks = Stock.objects.select_related('category').order_by(*ordering)
+        return [(stock.pk, str(stock)) for stock in stocks]
+
+
 @admin.register(Stock)
 class StockAdmin(admin.ModelAdmin):
     list_display = ('name', 'quantity', 'selling_price', 'category_name', 'cost_price', 'user', 'last_updated')
@@ -28,10 +43,24 @@ class StockAdmin(admin.ModelAdmin):
 
     fieldsets = (
         ("Stock Details", {
-            "fields": ("category", "name", 'cost_price', 'selling_price', 'quantity', 'user')
+            "fields": ("category", "name", 'cost_price', 'selling_price', 'quantity', 'user', 'version')
         }),
     )
 
+    def formfield_for_dbfield(self, db_field, request, **kwargs):
+        # The version the form was rendered with, so saving it over a newer
+        # change (a sale verified meanwhile, say) is refused, not overwritten
+        if db_field.name == 'version':
+            kwargs['widget'] = forms.HiddenInput
+        return super().formfield_for_dbfield(db_field, request, **kwargs)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        try:
+            return super().changeform_view(request, object_id, form_url, extra_context)
+        except StockConflict as e:
+            messages.error(request, f"{e}. Nothing was saved; review the current values and try again.")
+            return HttpResponseRedirect(request.get_full_path())
+
     def save_model(self, request, obj, form, change):
         if not change or not obj.user:  # When creating a new stock entry
             obj.user = request.user
@@ -44,6 +73,27 @@ class StockAdmin(admin.ModelAdmin):
 
 
 
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('stock', 'kind', 'quantity', 'cost_price', 'reference', 'created_at')
+    list_filter = ('kind', 'created_at', ('stock', StockListFilter))
+    # Stock.__str__ includes the category name
+    list_select_related = ('stock__category',)
+    search_fields = ('stock__name',)
+    date_hierarchy = 'created_at'
+
+    # The ledger is append-only: rows are written by stock changes, never by hand
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+
 # Optional: Customize Admin Site Branding
 admin.site.site_header = "ERP"
 admin.site.site_title = "ERP Dashboard"
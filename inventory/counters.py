@@ -0,0 +1,200 @@
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from .models import LOW_STOCK_THRESHOLD, InventoryCounter, Stock
+
+COUNTER_COLUMNS = ('total_value', 'total_units', 'item_count', 'low_stock_count', 'out_of_stock_count')
+
+GLOBAL_SCOPE = 'all'
+
+
+def user_scope(user_id):
+    return f'user:{user_id}'
+
+
+def scope_for_user(user):
+    """Superusers see every stock item, everyone else only the stock they own."""
+    return GLOBAL_SCOPE if user.is_superuser else user_scope(user.pk)
+
+
+def stock_contribution(state):
+    """
+    Counter keys and column values contributed by one stock item, given
+    its ``Stock.tracked_state()``. A key is ``(scope, category_id)``, with
+    ``None`` as the category of the scope total.
+    """
+    quantity = state['quantity'] or 0
+    values = {
+        'total_value': quantity * (state['cost_price'] or 0),
+        'total_units': quantity,
+        'item_count': 1,
+        'low_stock_count': int(quantity < LOW_STOCK_THRESHOLD),
+        'out_of_stock_count': int(quantity == 0),
+    }
+    keys = [
+        (scope, category_id)
+        for scope in (GLOBAL_SCOPE, user_scope(state['user_id']))
+        for category_id in (None, state['category_id'])
+    ]
+    return keys, values
+
+
+def counter_deltas(old_state, new_state):
+    """
+    Per counter key column deltas for a stock item going from ``old_state``
+    to ``new_state`` (``None`` for a created or deleted item). Saves that
+    don't change quantity, cost, owner or category produce no entries.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None:
+            continue
+        keys, values = stock_contribution(state)
+        for key in keys:
+            for column, value in values.items():
+                deltas[key][column] += sign * value
+
+    return {
+        key: {column: value for column, value in columns.items() if value}
+        for key, columns in deltas.items()
+        if any(columns.values())
+    }
+
+
+def counter_rows(scope, category_id):
+    if category_id is None:
+        return InventoryCounter.objects.filter(scope=scope, category__isnull=True)
+    return InventoryCounter.objects.filter(scope=scope, category_id=category_id)
+
+
+def apply_counter_delta(scope, category_id, deltas):
+    """Atomically add ``deltas`` to one counter row, creating it if needed."""
+    updates = {column: F(column) + value for column, value in deltas.items()}
+    rows = counter_rows(scope, category_id)
+    if rows.update(**updates):
+        return
+
+    # A missing row with only negative deltas belongs to a category being deleted
+    if not any(value > 0 for value in deltas.values()):
+        return
+    try:
+        with transaction.atomic():
+            InventoryCounter.objects.create(scope=scope, category_id=category_id, **deltas)
+    except IntegrityError:
+        # Created concurrently by another writer
+        rows.update(**updates)
+
+
+def apply_stock_change(old_state, new_state):
+    for (scope, category_id), deltas in counter_deltas(old_state, new_state).items():
+        apply_counter_delta(scope, category_id, deltas)
+
+
+def apply_stock_changes(changes):
+    """
+    Counter updates for many ``(old_state, new_state)`` pairs at once, e.g.
+    after a batch ``UPDATE`` of stock. Deltas are summed per counter row
+    first, so each row is written once however many items changed.
+    """
+    totals = defaultdict(lambda: defaultdict(int))
+    for old_state, new_state in changes:
+        for key, deltas in counter_deltas(old_state, new_state).items():
+            for column, value in deltas.items():
+                totals[key][column] += value
+    totals = {key: {column: value for column, value in deltas.items() if value} for key, deltas in totals.items()}
+    totals = {key: deltas for key, deltas in totals.items() if deltas}
+    if not totals:
+        return
+
+    # Existing rows get all their deltas in one UPDATE ... CASE
+    existing = {
+        (counter.scope, counter.category_id): counter.pk
+        for counter in InventoryCounter.objects.filter(scope__in={scope for scope, _ in totals}).only('scope', 'category_id')
+        if (counter.scope, counter.category_id) in totals
+    }
+    columns = {column for key in existing for column in totals[key]}
+    if existing:
+        InventoryCounter.objects.filter(pk__in=existing.values()).update(**{
+            column: F(column) + Case(
+                *[When(pk=pk, then=Value(totals[key][column])) for key, pk in existing.items() if column in totals[key]],
+                default=Value(0),
+                output_field=InventoryCounter._meta.get_field(column),
+            )
+            for column in columns
+        })
+
+    for (scope, category_id), deltas in totals.items():
+        if (scope, category_id) not in existing:
+            apply_counter_delta(scope, category_id, deltas)
+
+
+# ==================== RECONCILIATION ====================
+
+def expected_counters():
+    """
+    Counter values recomputed from Stock with one grouped query, keyed by
+    ``(scope, category_id)``.
+    """
+    rows = Stock.objects.values('user_id', 'category_id').annotate(
+        total_value=Sum(F('quantity') * F('cost_price'), default=0),
+        total_units=Sum('quantity', default=0),
+        item_count=Count('id'),
+        low_stock_count=Count('id', filter=Q(quantity__lt=LOW_STOCK_THRESHOLD)),
+        out_of_stock_count=Count('id', filter=Q(quantity=0)),
+    ).order_by()
+
+    expected = defaultdict(lambda: dict.fromkeys(COUNTER_COLUMNS, 0))
+    for row in rows:
+        for scope in (GLOBAL_SCOPE, user_scope(row['user_id'])):
+            for category_id in (None, row['category_id']):
+                for column in COUNTER_COLUMNS:
+                    expected[(scope, category_id)][column] += row[column]
+    return expected
+
+
+def reconcile_counters(fix=False, tolerance=0.01):
+    """
+    Compare every counter row with a full recompute and return the list of
+    ``(key, stored, expected)`` mismatches. With ``fix=True`` the stored
+    counters are replaced by the recomputed ones.
+    """
+    expected = expected_counters()
+    stored = {(c.scope, c.category_id): c for c in InventoryCounter.objects.all()}
+    zero = dict.fromkeys(COUNTER_COLUMNS, 0)
+
+    mismatches = []
+    for key in set(expected) | set(stored):
+        want = expected.get(key, zero)
+        have = {column: getattr(stored[key], column) for column in COUNTER_COLUMNS} if key in stored else zero
+        if any(abs(have[column] - want[column]) > tolerance for column in COUNTER_COLUMNS):
+            mismatches.append((key, have, want))
+
+    if fix and mismatches:
+        with transaction.atomic():
+            for key, _, want in mismatches:
+                if key in stored:
+                    counter_rows(*key).update(**want)
+                else:
+                    InventoryCounter.objects.create(scope=key[0], category_id=key[1], **want)
+    return mismatches
+
+
+# ==================== READS ====================
+
+def headline_counters(scope):
+    """Scope totals as a dict; zeros when the scope has no stock yet."""
+    counter = counter_rows(scope, None).values(*COUNTER_COLUMNS).first()
+    return counter or dict.fromkeys(COUNTER_COLUMNS, 0)
+
+
+def category_counters(scope):
+    """Per category units and value for a scope, most valuable first."""
+    return list(InventoryCounter.objects.filter(
+        scope=scope,
+        category__isnull=False,
+        item_count__gt=0,
+    ).values(
+        'category__name',
+        'total_value',
+        total_quantity=F('total_units'),
+    ).order_by('-total_value'))
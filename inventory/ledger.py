@@ -0,0 +1,155 @@
+"""
+Point-in-time stock positions from the ``StockMovement`` ledger.
+
+A stock item's quantity and cost price at the end of a local day is its
+latest ``StockSnapshot`` on or before that day plus the movements made
+after the snapshot, so a lookup reads one snapshot and at most one
+snapshot period of movements per item however long the history is.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.utils import timezone
+from .models import Stock, StockMovement, StockSnapshot
+
+# Stock items looked up per round of queries
+LEDGER_CHUNK_SIZE = 1000
+
+
+def day_end(day):
+    """Aware datetime of local midnight at the end of ``day``."""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def chunked(values, size=LEDGER_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+# ==================== POSITIONS ====================
+
+def ledger_positions(day, stock_ids):
+    """
+    ``{stock_id: {'quantity', 'cost_price', 'snapshot', 'movements'}}`` at
+    the end of ``day`` for ``stock_ids``, where ``snapshot`` is the date of
+    the snapshot used (``None`` if there was none) and ``movements`` how
+    many movements were added to it. Items with no history by then are left
+    out.
+    """
+    latest = StockSnapshot.objects.filter(stock=OuterRef('stock'), date__lte=day).order_by('-date').values('date')[:1]
+    snapshots = StockSnapshot.objects.filter(stock_id__in=stock_ids, date=Subquery(latest))
+    positions = {
+        snapshot.stock_id: {'quantity': snapshot.quantity, 'cost_price': snapshot.cost_price, 'snapshot': snapshot.date, 'movements': 0}
+        for snapshot in snapshots
+    }
+
+    # Movements after the snapshot, one query per snapshot date (snapshots are
+    # taken for all moving items on the same days, so there are few of them)
+    since = defaultdict(list)
+    for stock_id in stock_ids:
+        since[positions[stock_id]['snapshot'] if stock_id in positions else None].append(stock_id)
+
+    last_movements = {}
+    for snapshot_date, ids in since.items():
+        movements = StockMovement.objects.filter(stock_id__in=ids, created_at__lt=day_end(day))
+        if snapshot_date is not None:
+            movements = movements.filter(created_at__gte=day_end(snapshot_date))
+        totals = movements.values('stock_id').annotate(quantity=Sum('quantity'), count=Count('id'), last=Max('id')).order_by()
+        for row in totals:
+            position = positions.setdefault(row['stock_id'], {'quantity': 0, 'cost_price': 0, 'snapshot': None, 'movements': 0})
+            position['quantity'] += row['quantity']
+            position['movements'] = row['count']
+            last_movements[row['last']] = position
+
+    # The cost price is the one left by the last movement
+    for movement_id, cost_price in StockMovement.objects.filter(pk__in=last_movements).values_list('id', 'cost_price'):
+        last_movements[movement_id]['cost_price'] = cost_price
+    return positions
+
+
+def stock_levels(day, stock_ids=None):
+    """
+    ``{stock_id: (quantity, cost_price)}`` at the end of local ``day``, for
+    ``stock_ids`` or every stock item.
+    """
+    if stock_ids is None:
+        stock_ids = Stock.objects.order_by('pk').values_list('pk', flat=True)
+    levels = {}
+    for ids in chunked(stock_ids):
+        for stock_id, position in ledger_positions(day, ids).items():
+            levels[stock_id] = (position['quantity'], position['cost_price'])
+    return levels
+
+
+def inventory_valuation(day, stock_ids=None):
+    """Total units and their value at cost at the end of local ``day``."""
+    units = value = 0
+    for quantity, cost_price in stock_levels(day, stock_ids).values():
+        units += quantity
+        value += quantity * cost_price
+    return {'total_units': units, 'total_value': value}
+
+
+# ==================== SNAPSHOTS ====================
+
+def take_snapshots(day):
+    """
+    Snapshot every stock item that moved since its previous snapshot, as of
+    the end of local ``day``. ``day`` must be over: movements are dated when
+    they are written, so a finished day's snapshot never changes. Returns how
+    many snapshots were written.
+    """
+    if day >= timezone.localdate():
+        raise ValueError(f'{day} is not over yet')
+
+    written = 0
+    for ids in chunked(Stock.objects.order_by('pk').values_list('pk', flat=True)):
+        snapshots = [
+            StockSnapshot(stock_id=stock_id, date=day, quantity=position['quantity'], cost_price=position['cost_price'])
+            for stock_id, position in ledger_positions(day, ids).items()
+            if position['movements'] and position['snapshot'] != day
+        ]
+        StockSnapshot.objects.bulk_create(snapshots, ignore_conflicts=True)
+        written += len(snapshots)
+    return written
+
+
+# ==================== RECONCILIATION ====================
+
+def reconcile_stock(fix=False, tolerance=0.01):
+    """
+    Compare every stock item's quantity and cost price with its position in
+    the ledger, a chunk of items at a time, and return the list of
+    ``(stock_id, ledger, stored)`` mismatches as ``(quantity, cost_price)``
+    pairs. With ``fix=True`` an adjustment movement is added for each
+    mismatch (an opening balance for items with no history), so the ledger
+    matches ``Stock`` again without rewriting it.
+    """
+    today = timezone.localdate()
+    mismatches = []
+    for ids in chunked(Stock.objects.order_by('pk').values_list('pk', flat=True)):
+        with transaction.atomic():
+            stored = {
+                stock_id: (quantity, cost_price)
+                for stock_id, quantity, cost_price in Stock.objects.filter(pk__in=ids).values_list('pk', 'quantity', 'cost_price')
+            }
+            positions = ledger_positions(today, list(stored))
+
+            corrections = []
+            for stock_id, (quantity, cost_price) in stored.items():
+                position = positions.get(stock_id)
+                ledger = (position['quantity'], position['cost_price']) if position else None
+                if ledger and ledger[0] == quantity and abs(ledger[1] - cost_price) <= tolerance:
+                    continue
+                mismatches.append((stock_id, ledger, (quantity, cost_price)))
+                corrections.append(StockMovement(
+                    stock_id=stock_id,
+                    kind=StockMovement.ADJUSTMENT if ledger else StockMovement.OPENING,
+                    quantity=quantity - (ledger[0] if ledger else 0),
+                    cost_price=cost_price,
+                ))
+            if fix:
+                StockMovement.objects.bulk_create(corrections)
+    return mismatches
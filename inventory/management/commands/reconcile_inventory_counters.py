@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from inventory.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Verifies the inventory counters against a full recompute from Stock'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Overwrite mismatched counters with the recomputed values')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_counters(fix=options['fix'])
+
+        for (scope, category_id), stored, expected in mismatches:
+            self.stdout.write(self.style.WARNING(
+                f'{scope} / category {category_id or "total"}: stored {stored}, expected {expected}'
+            ))
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All inventory counters are consistent.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Fixed {len(mismatches)} inventory counters.'))
+        else:
+            self.stdout.write(self.style.ERROR(f'Found {len(mismatches)} inconsistent inventory counters. Run with --fix to repair.'))
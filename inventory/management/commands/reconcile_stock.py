@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from inventory.ledger import reconcile_stock
+
+
+class Command(BaseCommand):
+    help = 'Verifies stock quantities and cost prices against the stock movement ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Record adjustment movements so the ledger matches the stored stock')
+
+    def handle(self, *args, **options):
+        mismatches = reconcile_stock(fix=options['fix'])
+
+        for stock_id, ledger, stored in mismatches:
+            ledger = 'no history' if ledger is None else f'{ledger[0]} @ {ledger[1]}'
+            self.stdout.write(self.style.WARNING(
+                f'Stock {stock_id}: ledger {ledger}, stored {stored[0]} @ {stored[1]}'
+            ))
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('All stock matches the ledger.'))
+        elif options['fix']:
+            self.stdout.write(self.style.SUCCESS(f'Recorded adjustments for {len(mismatches)} stock items.'))
+        else:
+            self.stdout.write(self.style.ERROR(f'Found {len(mismatches)} stock items not matching the ledger. Run with --fix to record adjustments.'))
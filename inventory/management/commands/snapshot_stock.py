@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from inventory.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Snapshots the quantity and cost of every stock item that moved since its last snapshot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Local date to snapshot the end of (YYYY-MM-DD), by default yesterday')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                day = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError(f"Invalid date: {options['date']}")
+        else:
+            day = timezone.localdate() - timedelta(days=1)
+
+        try:
+            written = take_snapshots(day)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} stock snapshots for {day}.'))
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.9 on 2026-10-18 01:30
+
+from collections import defaultdict
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+import django.db.models.deletion
+
+COUNTER_COLUMNS = ('total_value', 'total_units', 'item_count', 'low_stock_count', 'out_of_stock_count')
+
+
+def populate_counters(apps, schema_editor):
+    Stock = apps.get_model('inventory', 'Stock')
+    InventoryCounter = apps.get_model('inventory', 'InventoryCounter')
+
+    rows = Stock.objects.values('user_id', 'category_id').annotate(
+        total_value=Sum(F('quantity') * F('cost_price'), default=0),
+        total_units=Sum('quantity', default=0),
+        item_count=Count('id'),
+        low_stock_count=Count('id', filter=Q(quantity__lt=4)),
+        out_of_stock_count=Count('id', filter=Q(quantity=0)),
+    ).order_by()
+
+    counters = defaultdict(lambda: dict.fromkeys(COUNTER_COLUMNS, 0))
+    for row in rows:
+        for scope in ('all', f"user:{row['user_id']}"):
+            for category_id in (None, row['category_id']):
+                for column in COUNTER_COLUMNS:
+                    counters[(scope, category_id)][column] += row[column]
+
+    InventoryCounter.objects.bulk_create([
+        InventoryCounter(scope=scope, category_id=category_id, **values)
+        for (scope, category_id), values in counters.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_alter_stock_cost_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(max_length=32)),
+                ('total_value', models.FloatField(default=0)),
+                ('total_units', models.BigIntegerField(default=0)),
+                ('item_count', models.IntegerField(default=0)),
+                ('low_stock_count', models.IntegerField(default=0)),
+                ('out_of_stock_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='inventory_counters', to='inventory.category')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='inventorycounter',
+            constraint=models.UniqueConstraint(fields=('scope', 'category'), name='unique_inventory_counter_scope_category'),
+        ),
+        migrations.AddConstraint(
+            model_name='inventorycounter',
+            constraint=models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('scope',), name='unique_inventory_counter_scope_total'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_stockmovement_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stock',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_stock_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['quantity'], name='stock_quantity'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['user', 'quantity'], name='stock_user_quantity'),
+        ),
+        migrations.AddIndex(
+            model_name='stock',
+            index=models.Index(fields=['last_updated'], name='stock_last_updated'),
+        ),
+    ]
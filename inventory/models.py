@@ -1,6 +1,10 @@
 from django.db import models
+from django.utils import timezone
 from accounts.models import CustomUser
 
+# Stock below this quantity counts as "low"
+LOW_STOCK_THRESHOLD = 4
+
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
 
@@ -8,6 +12,10 @@ class Category(models.Model):
         return self.name
 
 
+class StockConflict(Exception):
+    """Stock changed between being read and written."""
+
+
 class Stock(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='user')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='stocks')
@@ -16,14 +24,162 @@ class Stock(models.Model):
     selling_price = models.FloatField(default=0)
     quantity = models.PositiveIntegerField(default=0)
     last_updated = models.DateTimeField(auto_now=True)  # ✅ FIXED
+    # Bumped by every write, so saves and batch updates can tell a row
+    # changed since they read it (see inventory.services)
+    version = models.PositiveIntegerField(default=0)
+
+    # Fields remembered as ``previous_state`` so signal handlers can apply deltas
+    TRACKED_FIELDS = ('user_id', 'category_id', 'quantity', 'cost_price')
 
     def __str__(self):
         return f"{self.name} - {self.category.name}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    def tracked_state(self):
+        return {field: getattr(self, field) for field in self.TRACKED_FIELDS}
+
+    def remember_state(self):
+        """Record the tracked fields as they are stored in the database."""
+        if self.get_deferred_fields().intersection(self.TRACKED_FIELDS):
+            self.previous_state = None
+        else:
+            self.previous_state = self.tracked_state()
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self.remember_state()
+
+    def save(self, *args, **kwargs):
+        # Instances that weren't loaded with all tracked fields fetch them once
+        if self.pk is not None and getattr(self, 'previous_state', None) is None:
+            self.previous_state = type(self).objects.filter(pk=self.pk).values(*self.TRACKED_FIELDS).first()
+
+        super().save(*args, **kwargs)
+        self.remember_state()
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        # Only write the row if it still has the version this instance was
+        # loaded (or its form was rendered) with, bumping it on the way
+        version = self._meta.get_field('version')
+        values = [value for value in values if value[0] is not version]
+        values.append((version, None, self.version + 1))
+        updated = super()._do_update(base_qs.filter(version=self.version), using, pk_val, values, update_fields, forced_update)
+        if not updated and base_qs.filter(pk=pk_val).exists():
+            raise StockConflict(f"{self.name} was changed by someone else")
+        if updated:
+            self.version += 1
+        return updated
+
     class Meta:
         ordering = ['-last_updated']
+        indexes = [
+            # Low and out of stock lists, overall and per owner
+            models.Index(fields=['quantity'], name='stock_quantity'),
+            models.Index(fields=['user', 'quantity'], name='stock_user_quantity'),
+            models.Index(fields=['last_updated'], name='stock_last_updated'),
+        ]
 
     def save_model(self, request, obj, form, change):
         if not change or not obj.user:   # If creating new object
             obj.user = request.user
         super().save_model(request, obj, form, change)
+
+
+class InventoryCounter(models.Model):
+    """
+    Running stock totals per scope, kept in step with Stock by
+    ``inventory.signals`` so dashboard headline numbers are one lookup.
+
+    ``scope`` is ``'all'`` or ``'user:<id>'`` (stock owned by that user).
+    The row without a category holds the scope total, rows with one hold
+    that category's share. ``manage.py reconcile_inventory_counters``
+    checks them against a full recompute.
+    """
+    scope = models.CharField(max_length=32)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='inventory_counters')
+
+    total_value = models.FloatField(default=0)
+    total_units = models.BigIntegerField(default=0)
+    item_count = models.IntegerField(default=0)
+    low_stock_count = models.IntegerField(default=0)
+    out_of_stock_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.scope} - {self.category_id or 'total'}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'category'], name='unique_inventory_counter_scope_category'),
+            models.UniqueConstraint(fields=['scope'], condition=models.Q(category__isnull=True), name='unique_inventory_counter_scope_total'),
+        ]
+
+
+class StockMovement(models.Model):
+    """
+    Append-only ledger of stock changes: every change of a stock item's
+    quantity or cost price adds a row, written in bulk by
+    ``inventory.services`` and per save by ``inventory.signals``. Rows are
+    never edited; a correction is another row.
+
+    The quantities of a stock item's movements add up to its current
+    ``Stock.quantity``, and ``cost_price`` is the item's cost price after the
+    movement. ``manage.py reconcile_stock`` checks both.
+    """
+    OPENING = 'opening'
+    SALE = 'sale'
+    PURCHASE = 'purchase'
+    RETURN = 'return'
+    ADJUSTMENT = 'adjustment'
+    KIND_CHOICES = [
+        (OPENING, 'Opening balance'),
+        (SALE, 'Sale'),
+        (PURCHASE, 'Purchase'),
+        (RETURN, 'Purchase return'),
+        (ADJUSTMENT, 'Adjustment'),
+    ]
+
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='movements')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    quantity = models.IntegerField()  # Signed change
+    cost_price = models.FloatField()
+    # Id of the sale, purchase or return behind the movement
+    reference = models.PositiveBigIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.stock_id} {self.kind} {self.quantity:+d}"
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['stock', 'created_at'], name='inventory_movement_stock_time'),
+            models.Index(fields=['created_at'], name='inventory_movement_time'),
+        ]
+
+
+class StockSnapshot(models.Model):
+    """
+    A stock item's quantity and cost price at the end of a local day, so
+    its position at any date is the latest snapshot before it plus the
+    movements since (see ``inventory.ledger``). Written by
+    ``manage.py snapshot_stock`` only for items that moved since their
+    previous snapshot.
+    """
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='snapshots')
+    date = models.DateField()
+    quantity = models.IntegerField()
+    cost_price = models.FloatField()
+
+    def __str__(self):
+        return f"{self.stock_id} @ {self.date}: {self.quantity}"
+
+    class Meta:
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['stock', 'date'], name='unique_stock_snapshot_date'),
+        ]
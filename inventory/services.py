@@ -0,0 +1,152 @@
+"""
+Set-based stock changes for bulk flows (verifying sales, receiving
+purchases, processing returns).
+
+Instead of locking and saving one ``Stock`` row per sale or purchase, a
+batch of movements is applied with a fixed number of queries: the affected
+rows are read without locks, quantities are validated in Python and written
+by one conditional ``UPDATE ... CASE`` that only matches rows whose
+``version`` is still the one read and whose quantity still covers the
+change, the movements are appended to the ``StockMovement`` ledger with one
+bulk insert, and the inventory counters and dashboard version are brought
+up to date once for the whole batch.
+
+Nothing is locked until that ``UPDATE``, so the write transaction stays
+short (on SQLite ``select_for_update()`` does nothing and a writer holds the
+whole database). If another writer got in first the batch raises
+``StockConflict`` and ``run_stock_transaction`` runs it again from fresh
+reads.
+"""
+import random
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from utility.recompute import recompute
+from .counters import apply_stock_changes
+from .models import Stock, StockConflict, StockMovement
+
+# Attempts at a stock transaction before a conflict is reported
+STOCK_WRITE_ATTEMPTS = getattr(settings, 'STOCK_WRITE_ATTEMPTS', 5)
+
+# Seconds to wait before the first retry, doubled (with jitter) for each next one
+STOCK_RETRY_DELAY = getattr(settings, 'STOCK_RETRY_DELAY', 0.05)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, stock, required):
+        self.stock = stock
+        self.required = required
+        super().__init__(f"Insufficient stock for {stock.name}. Available: {stock.quantity}, Required: {required}")
+
+
+def read_stocks(stock_ids):
+    """``{id: Stock}`` for ``stock_ids``."""
+    return {stock.pk: stock for stock in Stock.objects.filter(pk__in=stock_ids)}
+
+
+def case(values, default, output_field=None):
+    """``CASE`` picking a value per stock id, ``default`` for the rest."""
+    return Case(*[When(pk=stock_id, then=Value(value)) for stock_id, value in values.items()], default=default, output_field=output_field)
+
+
+def apply_stock_movements(kind, movements, reprice=None, skip_shortages=False):
+    """
+    Apply ``movements``, an iterable of ``(stock_id, quantity_delta,
+    reference)`` of one ``StockMovement`` ``kind`` (``reference`` being the
+    id of the sale, purchase or return), in one batch. Must run inside
+    ``transaction.atomic()``, normally through ``run_stock_transaction``.
+
+    ``reprice(stock, delta)``, if given, is called with every stock item
+    (before the change) and returns the ``cost_price`` and/or
+    ``selling_price`` to set together with the quantity.
+
+    A stock item whose quantity would go negative raises
+    ``InsufficientStock``, or with ``skip_shortages`` has all its movements
+    left out. Raises ``StockConflict`` if an item was changed by someone
+    else after it was read. Returns ``{stock_id: Stock}`` for the items that
+    changed, with the new values set on the instances.
+    """
+    movements = list(movements)
+    totals = defaultdict(int)
+    for stock_id, delta, _ in movements:
+        totals[stock_id] += delta
+
+    stocks = read_stocks(totals)
+    applied = {}
+    for stock_id, delta in totals.items():
+        stock = stocks[stock_id]
+        if stock.quantity + delta < 0:
+            if skip_shortages:
+                continue
+            raise InsufficientStock(stock, -delta)
+        applied[stock_id] = delta
+    if not applied:
+        return {}
+    prices = {stock_id: reprice(stocks[stock_id], delta) for stock_id, delta in applied.items()} if reprice else {}
+
+    now = timezone.now()
+    updates = {
+        'quantity': F('quantity') + case(applied, Value(0)),
+        'version': F('version') + 1,
+        'last_updated': now,
+    }
+    for field in ('cost_price', 'selling_price'):
+        values = {stock_id: price[field] for stock_id, price in prices.items() if field in price}
+        if values:
+            # Typed by the column: a whole number price is still a float
+            updates[field] = case(values, F(field), output_field=Stock._meta.get_field(field))
+    # Only rows nobody wrote since they were read, and that still have the
+    # units being taken (so a stale read can never oversell)
+    updated = Stock.objects.filter(
+        pk__in=applied,
+        version=case({stock_id: stocks[stock_id].version for stock_id in applied}, Value(None)),
+        quantity__gte=case({stock_id: max(0, -delta) for stock_id, delta in applied.items()}, Value(0)),
+    ).update(**updates)
+    if updated != len(applied):
+        raise StockConflict(f"{len(applied) - updated} stock items were changed by someone else")
+
+    changes = []
+    for stock_id, delta in applied.items():
+        stock = stocks[stock_id]
+        old_state = stock.tracked_state()
+        stock.quantity += delta
+        stock.version += 1
+        for field, value in prices.get(stock_id, {}).items():
+            setattr(stock, field, value)
+        stock.remember_state()
+        changes.append((old_state, stock.tracked_state()))
+    apply_stock_changes(changes)
+
+    StockMovement.objects.bulk_create([
+        StockMovement(stock_id=stock_id, kind=kind, quantity=delta, cost_price=stocks[stock_id].cost_price, reference=reference, created_at=now)
+        for stock_id, delta, reference in movements
+        if stock_id in applied
+    ])
+    recompute('dashboard.version', [True])
+
+    return {stock_id: stocks[stock_id] for stock_id in applied}
+
+
+def run_stock_transaction(func, attempts=STOCK_WRITE_ATTEMPTS):
+    """
+    Return ``func()`` run in ``transaction.atomic()``, running it again from
+    the start (so from fresh reads) when it hits a ``StockConflict`` or a
+    locked database, up to ``attempts`` times with a growing random delay.
+
+    Inside an outer transaction, retrying can't see newer data or release
+    locks, so ``func`` runs once and any conflict is raised.
+    """
+    if transaction.get_connection().in_atomic_block:
+        return func()
+
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                return func()
+        except (StockConflict, OperationalError) as e:
+            if attempt == attempts or (isinstance(e, OperationalError) and 'locked' not in str(e)):
+                raise
+        time.sleep(STOCK_RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
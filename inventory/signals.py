@@ -0,0 +1,30 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .counters import apply_stock_change
+from .models import Stock, StockMovement
+
+
+@receiver(post_save, sender=Stock)
+def update_counters_on_save(sender, instance, created, **kwargs):
+    old_state = None if created else getattr(instance, 'previous_state', None)
+    apply_stock_change(old_state, instance.tracked_state())
+
+
+@receiver(post_delete, sender=Stock)
+def update_counters_on_delete(sender, instance, **kwargs):
+    old_state = getattr(instance, 'previous_state', None) or instance.tracked_state()
+    apply_stock_change(old_state, None)
+
+
+@receiver(post_save, sender=Stock)
+def record_movement_on_save(sender, instance, created, **kwargs):
+    # Bulk flows write their movements in inventory.services; this covers
+    # items created or edited one at a time
+    old_state = None if created else getattr(instance, 'previous_state', None)
+    if old_state is None:
+        kind, quantity = StockMovement.OPENING, instance.quantity
+    elif old_state['quantity'] != instance.quantity or old_state['cost_price'] != instance.cost_price:
+        kind, quantity = StockMovement.ADJUSTMENT, instance.quantity - old_state['quantity']
+    else:
+        return
+    StockMovement.objects.create(stock=instance, kind=kind, quantity=quantity, cost_price=instance.cost_price)
@@ -1,3 +1,192 @@
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
+from django.db import transaction
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from sales.dates import local_day_start
+from .counters import GLOBAL_SCOPE, headline_counters, reconcile_counters, user_scope
+from .ledger import ledger_positions, reconcile_stock, stock_levels, take_snapshots
+from .models import Category, Stock, StockConflict, StockMovement, StockSnapshot
+from .services import apply_stock_movements
 
-# Create your tests here.
+
+class StockVersionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='admin')
+        cls.category = Category.objects.create(name='Shirts')
+        cls.stock = Stock.objects.create(user=cls.user, category=cls.category, name='Shirt', cost_price=100, selling_price=150, quantity=10)
+
+    def sell(self, quantity):
+        with transaction.atomic():
+            apply_stock_movements(StockMovement.SALE, [(self.stock.pk, -quantity, None)])
+
+    def test_save_bumps_version(self):
+        stock = Stock.objects.get(pk=self.stock.pk)
+        stock.name = 'Blue shirt'
+        stock.save()
+        stock.selling_price = 160
+        stock.save(update_fields=['selling_price'])
+        self.assertEqual(stock.version, self.stock.version + 2)
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).version, stock.version)
+
+    def test_stale_save_after_batch_sale(self):
+        stale = Stock.objects.get(pk=self.stock.pk)
+        self.sell(3)
+
+        stale.name = 'Blue shirt'
+        with self.assertRaises(StockConflict), transaction.atomic():
+            stale.save()
+        stock = Stock.objects.get(pk=self.stock.pk)
+        self.assertEqual((stock.name, stock.quantity), ('Shirt', 7))
+
+        # Saving from a fresh read goes through
+        stock.name = 'Blue shirt'
+        stock.save()
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).quantity, 7)
+
+    def test_admin_stale_form(self):
+        self.client.force_login(self.user)
+        url = reverse('admin:inventory_stock_change', args=[self.stock.pk])
+        form = {'category': self.category.pk, 'name': 'Blue shirt', 'version': self.stock.version, '_save': 'Save'}
+        self.sell(3)
+
+        response = self.client.post(url, form)
+        self.assertRedirects(response, url)
+        self.assertIn('changed by someone else', ' '.join(str(m) for m in get_messages(response.wsgi_request)))
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).name, 'Shirt')
+
+        form['version'] = Stock.objects.get(pk=self.stock.pk).version
+        self.assertEqual(self.client.post(url, form).status_code, 302)
+        self.assertEqual(Stock.objects.values_list('name', 'quantity').get(pk=self.stock.pk), ('Blue shirt', 7))
+
+
+class LedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='clerk', password='clerk')
+        category = Category.objects.create(name='Shirts')
+        cls.today = timezone.localdate()
+        cls.days = [cls.today - timedelta(days=n) for n in range(5, 0, -1)]
+        cls.shirt = Stock.objects.create(user=user, category=category, name='Shirt', cost_price=100, quantity=10)
+        cls.tie = Stock.objects.create(user=user, category=category, name='Tie', cost_price=20, quantity=4)
+        # Opening balances on the first day
+        StockMovement.objects.update(created_at=cls.at(cls.days[0]))
+
+    @staticmethod
+    def at(day, hour=12):
+        return local_day_start(day) + timedelta(hours=hour)
+
+    def move(self, stock, kind, quantity, cost_price, day, hour=12):
+        StockMovement.objects.create(stock=stock, kind=kind, quantity=quantity, cost_price=cost_price, created_at=self.at(day, hour))
+
+    def test_positions_across_snapshots(self):
+        d0, d1, d2, d3, d4 = self.days
+        self.move(self.shirt, StockMovement.SALE, -3, 100, d1)
+        self.move(self.shirt, StockMovement.PURCHASE, 5, 120, d2)
+        # Last thing on d3, first thing on d4: either side of the day boundary
+        self.move(self.shirt, StockMovement.SALE, -2, 120, d3, hour=23)
+        self.move(self.shirt, StockMovement.SALE, -1, 120, d4, hour=0)
+        expected = {
+            d0 - timedelta(days=1): {},
+            d0: {self.shirt.pk: (10, 100), self.tie.pk: (4, 20)},
+            d1: {self.shirt.pk: (7, 100), self.tie.pk: (4, 20)},
+            d2: {self.shirt.pk: (12, 120), self.tie.pk: (4, 20)},
+            d3: {self.shirt.pk: (10, 120), self.tie.pk: (4, 20)},
+            d4: {self.shirt.pk: (9, 120), self.tie.pk: (4, 20)},
+        }
+        for day, levels in expected.items():
+            self.assertEqual(stock_levels(day), levels, day)
+
+        self.assertEqual(take_snapshots(d1), 2)
+        self.assertEqual(take_snapshots(d3), 1)
+        for day, levels in expected.items():
+            self.assertEqual(stock_levels(day), levels, day)
+
+        positions = ledger_positions(d4, [self.shirt.pk, self.tie.pk])
+        self.assertEqual((positions[self.shirt.pk]['snapshot'], positions[self.shirt.pk]['movements']), (d3, 1))
+        self.assertEqual((positions[self.tie.pk]['snapshot'], positions[self.tie.pk]['movements']), (d1, 0))
+
+    def test_cost_price_from_last_movement(self):
+        d0, d1 = self.days[:2]
+        self.move(self.shirt, StockMovement.PURCHASE, 5, 130, d1, hour=9)
+        self.move(self.shirt, StockMovement.ADJUSTMENT, 0, 90, d1, hour=9)
+        self.assertEqual(stock_levels(d1, [self.shirt.pk]), {self.shirt.pk: (15, 90)})
+
+        take_snapshots(d0)
+        self.move(self.shirt, StockMovement.SALE, -1, 95, d1, hour=10)
+        self.assertEqual(stock_levels(d1, [self.shirt.pk]), {self.shirt.pk: (14, 95)})
+
+    def test_snapshots_skip_unmoved_items(self):
+        d0, d1, d2 = self.days[:3]
+        self.assertEqual(take_snapshots(d0), 2)
+        self.move(self.shirt, StockMovement.SALE, -1, 100, d2)
+
+        self.assertEqual(take_snapshots(d1), 0)
+        self.assertEqual(take_snapshots(d2), 1)
+        # Taking a day again writes nothing new
+        self.assertEqual(take_snapshots(d2), 0)
+        self.assertEqual(
+            sorted(StockSnapshot.objects.values_list('stock_id', 'date', 'quantity')),
+            sorted([(self.shirt.pk, d0, 10), (self.tie.pk, d0, 4), (self.shirt.pk, d2, 9)]),
+        )
+        with self.assertRaises(ValueError):
+            take_snapshots(self.today)
+
+    def test_reconcile_fix(self):
+        self.assertEqual(reconcile_stock(), [])
+        # Writes that bypassed the ledger, and an item that lost its history
+        Stock.objects.filter(pk=self.shirt.pk).update(quantity=12, cost_price=110)
+        StockMovement.objects.filter(stock=self.tie).delete()
+
+        self.assertEqual(sorted(reconcile_stock(fix=True)), sorted([
+            (self.shirt.pk, (10, 100), (12, 110)),
+            (self.tie.pk, None, (4, 20)),
+        ]))
+        self.assertEqual(reconcile_stock(), [])
+        self.assertEqual(stock_levels(self.today), {self.shirt.pk: (12, 110), self.tie.pk: (4, 20)})
+
+
+class InventoryCounterTests(TestCase):
+    """InventoryCounter, kept by deltas, matches reconcile_counters() after every change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_user(username='owner', email='owner@example.com', password='owner')
+        cls.other = get_user_model().objects.create_user(username='other', email='other@example.com', password='other')
+        cls.shirts = Category.objects.create(name='Shirts')
+        cls.ties = Category.objects.create(name='Ties')
+
+    def assertCountersConsistent(self):
+        self.assertEqual(reconcile_counters(), [])
+
+    def test_stock_changes(self):
+        shirt = Stock.objects.create(user=self.owner, category=self.shirts, name='Shirt', cost_price=100, quantity=10)
+        tie = Stock.objects.create(user=self.owner, category=self.ties, name='Tie', cost_price=20, quantity=3)
+        self.assertCountersConsistent()
+        self.assertEqual(headline_counters(GLOBAL_SCOPE), {
+            'total_value': 1060, 'total_units': 13, 'item_count': 2, 'low_stock_count': 1, 'out_of_stock_count': 0,
+        })
+
+        shirt.quantity = 0
+        shirt.cost_price = 110
+        shirt.save()
+        self.assertCountersConsistent()
+
+        shirt.category = self.ties
+        shirt.user = self.other
+        shirt.save()
+        self.assertCountersConsistent()
+        self.assertEqual(headline_counters(user_scope(self.other.pk))['out_of_stock_count'], 1)
+
+        with transaction.atomic():
+            apply_stock_movements(StockMovement.PURCHASE, [(shirt.pk, 8, None), (tie.pk, 2, None)], reprice=lambda stock, delta: {'cost_price': 30})
+        self.assertCountersConsistent()
+
+        Stock.objects.get(pk=tie.pk).delete()
+        self.assertCountersConsistent()
+        self.assertEqual(headline_counters(user_scope(self.owner.pk))['item_count'], 0)
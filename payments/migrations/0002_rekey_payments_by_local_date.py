@@ -0,0 +1,52 @@
+# Generated by Django 4.2.9 on 2026-10-18 09:10
+
+from decimal import Decimal
+from django.db import migrations
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def rekey_payments(apps, schema_editor):
+    """
+    Payments used to be keyed by the UTC date of each sale and are now keyed
+    by its local date, and kept up to date by deltas from there on. Recompute
+    every day from the verified sales and delete the rows of days that have
+    none (the UTC-only days).
+    """
+    Payments = apps.get_model('payments', 'Payments')
+    Sales = apps.get_model('sales', 'Sales')
+
+    totals = {
+        day: Decimal(str(round(total, 2)))
+        for day, total in Sales.objects.filter(is_verified=True).annotate(
+            day=TruncDate('sold_on', tzinfo=timezone.get_current_timezone())
+        ).values('day').annotate(total=Sum('total_amount')).order_by().values_list('day', 'total')
+    }
+
+    to_update = []
+    orphans = []
+    for payment in Payments.objects.all():
+        total = totals.pop(payment.date, None)
+        if total is None:
+            orphans.append(payment.pk)
+        elif payment.total_sales != total:
+            payment.total_sales = total
+            to_update.append(payment)
+
+    for start in range(0, len(orphans), 500):
+        Payments.objects.filter(pk__in=orphans[start:start + 500]).delete()
+    Payments.objects.bulk_update(to_update, ['total_sales'], batch_size=500)
+    Payments.objects.bulk_create((Payments(date=day, total_sales=total) for day, total in totals.items()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0001_initial'),
+        ('sales', '0012_hot_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_payments, migrations.RunPython.noop),
+    ]
@@ -1,19 +1,93 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db.models import Sum
+from django.utils import timezone
+from sales.dates import local_date, local_day_start
 from sales.models import Sales
 from payments.models import Payments
+from utility.recompute import defer, register
+
+
+def payment_deltas(old_state, new_state):
+    """
+    Change in verified sales per local day for a sale going from
+    ``old_state`` to ``new_state`` (``None`` for a created or deleted sale).
+    Saves that don't touch verified money, e.g. editing an unverified sale,
+    produce no entries.
+    """
+    deltas = defaultdict(float)
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None or not state['is_verified'] or state['sold_on'] is None:
+            continue
+        deltas[local_date(state['sold_on'])] += sign * state['total_amount']
+    return {day: delta for day, delta in deltas.items() if round(delta, 2)}
+
+
+def apply_payment_delta(day, delta):
+    """Atomically add ``delta`` to the day's Payments total, creating the row if needed."""
+    amount = Decimal(str(round(delta, 2)))
+    rows = Payments.objects.filter(date=day)
+    if rows.update(total_sales=F('total_sales') + amount):
+        return
+    try:
+        with transaction.atomic():
+            Payments.objects.create(date=day, total_sales=amount)
+    except IntegrityError:
+        # Created concurrently by another writer
+        rows.update(total_sales=F('total_sales') + amount)
+
+
+def recompute_daily_payments(days):
+    """Recompute the Payments rows for a set of local days with one grouped query."""
+    days = sorted(days)
+    totals = dict(Sales.objects.filter(
+        is_verified=True,
+        sold_on__gte=local_day_start(days[0]),
+        sold_on__lt=local_day_start(days[-1] + timedelta(days=1)),
+    ).annotate(
+        day=TruncDate('sold_on', tzinfo=timezone.get_current_timezone())
+    ).filter(day__in=days).values('day').annotate(
+        total=Sum('total_amount')
+    ).order_by().values_list('day', 'total'))
+
+    existing = Payments.objects.in_bulk(days, field_name='date')
+    to_update = []
+    to_create = []
+    for day in days:
+        total = Decimal(str(round(totals.get(day) or 0, 2)))
+        payment = existing.get(day)
+        if payment is None:
+            to_create.append(Payments(date=day, total_sales=total))
+        elif payment.total_sales != total:
+            payment.total_sales = total
+            to_update.append(payment)
+
+    Payments.objects.bulk_update(to_update, ['total_sales'])
+    Payments.objects.bulk_create(to_create)
+
+
+register('payments.days', recompute_daily_payments)
+
 
 @receiver(post_save, sender=Sales)
 @receiver(post_delete, sender=Sales)
-def update_daily_payment(sender, instance, **kwargs):
-    if instance.sold_on:
-        day = instance.sold_on.date()
-        # Recalculate for that day to ensure accuracy
-        # Filter is_verified=True as per logic
-        total = Sales.objects.filter(is_verified=True, sold_on__date=day).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
-        
-        Payments.objects.update_or_create(
-            date=day,
-            defaults={'total_sales': total}
-        )
+def update_daily_payment(sender, instance, created=False, **kwargs):
+    # Only verified sales count as payments. The previous state lets a sale
+    # that moved to another day be taken off the old day's total as well.
+    if kwargs['signal'] is post_delete:
+        old_state = getattr(instance, 'previous_state', None) or instance.tracked_state()
+        new_state = None
+    else:
+        old_state = None if created else getattr(instance, 'previous_state', None)
+        new_state = instance.tracked_state()
+
+    deltas = payment_deltas(old_state, new_state)
+    if defer('payments.days', deltas):
+        return
+    for day, delta in deltas.items():
+        apply_payment_delta(day, delta)
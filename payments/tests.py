@@ -1,3 +1,82 @@
+from datetime import timedelta
+from decimal import Decimal
+from importlib import import_module
+from django.apps import apps
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from django.utils import timezone
+from inventory.models import Category, Stock
+from sales.dates import local_day_start
+from sales.models import Sales
+from utility.testing import DerivedDataAssertions, payment_totals
+from .models import Payments
 
-# Create your tests here.
+rekey_migration = import_module('payments.migrations.0002_rekey_payments_by_local_date')
+
+
+class DailyPaymentTests(DerivedDataAssertions, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='clerk', password='clerk')
+        cls.stock = Stock.objects.create(
+            user=user, category=Category.objects.create(name='Shirts'), name='Shirt', cost_price=100, selling_price=150, quantity=100,
+        )
+        cls.day = timezone.localdate() - timedelta(days=3)
+
+    def sale(self, quantity=2, hour=10, is_verified=True):
+        sale = Sales.objects.create(stock=self.stock, quantity_sold=quantity, is_verified=is_verified)
+        sale.sold_on = local_day_start(self.day) + timedelta(hours=hour)
+        sale.save()
+        return sale
+
+    def test_verify_and_unverify(self):
+        sale = self.sale(is_verified=False)
+        self.assertEqual(payment_totals(), {})
+
+        sale.is_verified = True
+        sale.save()
+        self.assertEqual(payment_totals(), {self.day: 300})
+
+        sale.is_verified = False
+        sale.save()
+        self.assertEqual(payment_totals(), {})
+        self.assertPaymentsConsistent()
+
+    def test_edit(self):
+        sale = self.sale()
+        self.sale(quantity=1)
+        sale.quantity_sold = 4
+        sale.save()
+        self.assertEqual(payment_totals(), {self.day: 750})
+        self.assertPaymentsConsistent()
+
+    def test_move_to_another_day(self):
+        sale = self.sale()
+        # 02:00 local is still the previous day in UTC: keyed by the local day
+        sale.sold_on = local_day_start(self.day + timedelta(days=1)) + timedelta(hours=2)
+        sale.save()
+        self.assertEqual(payment_totals(), {self.day + timedelta(days=1): 300})
+        self.assertPaymentsConsistent()
+
+    def test_delete(self):
+        sale = self.sale()
+        self.sale(quantity=1)
+        sale.delete()
+        self.assertEqual(payment_totals(), {self.day: 150})
+        # Deleted from a fresh read
+        Sales.objects.get().delete()
+        self.assertEqual(payment_totals(), {})
+        self.assertPaymentsConsistent()
+
+    def test_rekey_by_local_date(self):
+        self.sale(hour=2)
+        self.sale(quantity=1, hour=12)
+        # Rows as written before: the early sale on its UTC date
+        Payments.objects.all().delete()
+        Payments.objects.create(date=self.day - timedelta(days=1), total_sales=Decimal('300'))
+        Payments.objects.create(date=self.day, total_sales=Decimal('150'))
+
+        rekey_migration.rekey_payments(apps, None)
+        self.assertEqual(payment_totals(), {self.day: 450})
+        self.assertEqual(Payments.objects.count(), 1)
@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django import forms
 from .models import PurchaseReturn
-from django.db import transaction
 from django.contrib import messages
-from inventory.models import Stock
+from django.utils import timezone
+from inventory.models import Stock, StockMovement
+from inventory.services import StockConflict, apply_stock_movements, run_stock_transaction
+from utility.exports import export_actions
+from utility.recompute import deferred_recompute
 
 class StockChoiceField(forms.ModelChoiceField):
     def label_from_instance(self, obj):
@@ -18,27 +21,26 @@ class PurchaseReturnForm(forms.ModelForm):
 
 @admin.action(description="Process Return and Deduct Inventory")
 def process_return(modeladmin, request, queryset):
-    processed_count = 0
-    try:
-        with transaction.atomic():
-            for ret in queryset:
-                if ret.is_processed:
-                    continue
+    def process_pending():
+        with deferred_recompute():
+            pending = list(queryset.filter(is_processed=False).values_list('id', 'stock_item_id', 'quantity_returned'))
 
-                stock = ret.stock_item
-                # Lock stock row for safety
-                stock = Stock.objects.select_for_update().get(id=stock.id)
+            # Deduct inventory for all returns at once; any shortage aborts the whole batch
+            apply_stock_movements(
+                StockMovement.RETURN,
+                ((stock_id, -quantity, return_id) for return_id, stock_id, quantity in pending),
+            )
 
-                if stock.quantity < ret.quantity_returned:
-                    raise Exception(f"Insufficient stock for {stock.name}. Available: {stock.quantity}, Return Amount: {ret.quantity_returned}")
+            ids = [pk for pk, _, _ in pending]
+            if PurchaseReturn.objects.filter(pk__in=ids, is_processed=False).update(is_processed=True, last_updated=timezone.now()) != len(ids):
+                # Processed concurrently: start over without them
+                raise StockConflict("Some of the returns were processed by someone else")
+            return len(ids)
 
-                stock.quantity -= ret.quantity_returned
-                stock.save()
+    try:
+        # Short optimistic transactions, retried if stock changed meanwhile
+        processed_count = run_stock_transaction(process_pending)
 
-                ret.is_processed = True
-                ret.save()
-                processed_count += 1
-        
         if processed_count > 0:
             messages.success(request, f"Successfully processed {processed_count} returns.")
         else:
@@ -47,11 +49,22 @@ def process_return(modeladmin, request, queryset):
     except Exception as e:
         messages.error(request, f"Error processing returns: {e}")
 
+PURCHASE_RETURN_EXPORT_COLUMNS = [
+    ('Product', 'stock_item__name'),
+    ('Category', 'stock_item__category__name'),
+    ('Quantity Returned', 'quantity_returned'),
+    ('Selling Price', 'stock_item__selling_price'),
+    ('Processed', 'is_processed'),
+    ('Created At', 'created_at'),
+]
+
 @admin.register(PurchaseReturn)
 class PurchaseReturnAdmin(admin.ModelAdmin):
     form = PurchaseReturnForm
     list_display = ('stock_item', 'quantity_returned', 'selling_price', 'total_amount', 'is_processed', 'created_at')
     list_filter = ('is_processed', 'created_at')
+    # Newest first, along the pending returns index
+    ordering = ('-created_at',)
     search_fields = ('stock_item__name',)
 
     fieldsets = (
@@ -72,4 +85,4 @@ class PurchaseReturnAdmin(admin.ModelAdmin):
         return obj.quantity_returned * obj.stock_item.selling_price
     total_amount.short_description = "Total Amount"
 
-    actions = [process_return]
\ No newline at end of file
+    actions = [process_return, *export_actions(PURCHASE_RETURN_EXPORT_COLUMNS, 'Purchase_Returns')]
\ No newline at end of file
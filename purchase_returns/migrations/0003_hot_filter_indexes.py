@@ -0,0 +1,17 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase_returns', '0002_remove_purchasereturn_reason'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchasereturn',
+            index=models.Index(condition=models.Q(('is_processed', False)), fields=['created_at'], name='purchase_return_pending'),
+        ),
+    ]
@@ -10,3 +10,9 @@ class PurchaseReturn(models.Model):
 
     def __str__(self):
         return f"Return for {self.stock_item.name} - {self.quantity_returned} pcs"
+
+    class Meta:
+        indexes = [
+            # Returns waiting to be processed (see sales.models.Sales)
+            models.Index(fields=['created_at'], condition=models.Q(is_processed=False), name='purchase_return_pending'),
+        ]
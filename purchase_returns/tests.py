@@ -1,3 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
 from django.test import TestCase
+from django.urls import reverse
+from inventory.models import Category, Stock, StockMovement
+from utility.testing import DerivedDataAssertions
+from .models import PurchaseReturn
 
-# Create your tests here.
+
+class ProcessReturnTests(DerivedDataAssertions, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='admin')
+        category = Category.objects.create(name='Shirts')
+        cls.shirt = Stock.objects.create(user=cls.user, category=category, name='Shirt', cost_price=100, selling_price=150, quantity=2)
+        cls.tie = Stock.objects.create(user=cls.user, category=category, name='Tie', cost_price=20, selling_price=50, quantity=10)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def process(self, returns):
+        response = self.client.post(reverse('admin:purchase_returns_purchasereturn_changelist'), {
+            'action': 'process_return', '_selected_action': [purchase_return.pk for purchase_return in returns],
+        })
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+    def test_process(self):
+        returns = [PurchaseReturn.objects.create(stock_item=self.tie, quantity_returned=quantity) for quantity in (3, 4)]
+        self.assertEqual(self.process(returns), ['Successfully processed 2 returns.'])
+
+        self.assertEqual(Stock.objects.get(pk=self.tie.pk).quantity, 3)
+        self.assertEqual(StockMovement.objects.filter(kind=StockMovement.RETURN).count(), 2)
+        self.assertDerivedConsistent()
+
+    def test_insufficient_stock_aborts_the_batch(self):
+        returns = [
+            PurchaseReturn.objects.create(stock_item=self.tie, quantity_returned=3),
+            PurchaseReturn.objects.create(stock_item=self.shirt, quantity_returned=5),
+        ]
+        self.assertEqual(
+            self.process(returns),
+            ['Error processing returns: Insufficient stock for Shirt. Available: 2, Required: 5'],
+        )
+
+        self.assertFalse(PurchaseReturn.objects.filter(is_processed=True).exists())
+        self.assertEqual(list(Stock.objects.order_by('name').values_list('quantity', flat=True)), [2, 10])
+        self.assertFalse(StockMovement.objects.filter(kind=StockMovement.RETURN).exists())
+        self.assertDerivedConsistent()
@@ -2,8 +2,12 @@ from django.contrib import admin
 from .models import Purchase
 from django.utils.html import format_html
 from django.contrib import messages
-from django.db import transaction
-from inventory.models import Stock
+from django.utils import timezone
+from inventory.admin import StockListFilter
+from inventory.models import StockMovement
+from inventory.services import StockConflict, apply_stock_movements, run_stock_transaction
+from utility.exports import export_actions
+from utility.recompute import deferred_recompute
 
 @admin.action(description="Mark selected purchases as Received and Update Stock")
 def mark_as_received(modeladmin, request, queryset):
@@ -11,46 +15,48 @@ def mark_as_received(modeladmin, request, queryset):
         messages.error(request, "You don't have the permission to receive Purchases.")
         return
 
-    # Group purchases by Stock
-    purchase_groups = {}
-    for p in queryset:
-        if not p.is_received:
-            purchase_groups.setdefault(p.stock_item_id, []).append(p)
-
-    try:
-        with transaction.atomic():  # Lock everything safely
-            for stock_id, purchases in purchase_groups.items():
-
-                # Lock stock row
-                stock = Stock.objects.select_for_update().get(id=stock_id)
-
-                old_qty = stock.quantity
-                old_cost = stock.cost_price
-
-                total_new_qty = sum(p.quantity_purchased for p in purchases)
-                total_new_cost = sum(p.quantity_purchased * p.cost_price_per_unit for p in purchases)
-
-                # Update quantity
-                stock.quantity = old_qty + total_new_qty
-
-                # Weighted average cost
-                if stock.quantity > 0:
-                    new_avg_cost = ((old_qty * old_cost) + total_new_cost) / stock.quantity
-                    stock.cost_price = p.selling_price
-                    stock.selling_price = p.selling_price
-
+    def receive_pending():
+        with deferred_recompute():
+            # Totals per Stock of the purchases not received yet
+            received = {}
+            pending = list(queryset.filter(is_received=False).order_by('pk').values_list(
+                'id', 'stock_item_id', 'quantity_purchased', 'cost_price_per_unit', 'selling_price'
+            ))
+            for purchase_id, stock_id, quantity, cost_price, selling_price in pending:
+                totals = received.setdefault(stock_id, {'ids': [], 'quantity': 0, 'cost': 0, 'selling_price': None})
+                totals['ids'].append(purchase_id)
+                totals['quantity'] += quantity
+                totals['cost'] += quantity * cost_price
                 # Update selling price if provided in any purchase
-                for p in purchases:
-                    if p.selling_price:
-                        stock.selling_price = p.selling_price
+                if selling_price:
+                    totals['selling_price'] = selling_price
 
-                stock.save()
-
-                # Mark all purchases as received
-                for p in purchases:
-                    p.is_received = True
-                    p.save()
+            def reprice(stock, delta):
+                totals = received[stock.pk]
+                prices = {}
+                # Weighted average cost
+                if stock.quantity + delta > 0:
+                    prices['cost_price'] = ((stock.quantity * stock.cost_price) + totals['cost']) / (stock.quantity + delta)
+                if totals['selling_price']:
+                    prices['selling_price'] = totals['selling_price']
+                return prices
+
+            # Update all stock rows at once
+            apply_stock_movements(
+                StockMovement.PURCHASE,
+                ((stock_id, quantity, purchase_id) for purchase_id, stock_id, quantity, _, _ in pending),
+                reprice=reprice,
+            )
+
+            # Mark all purchases as received
+            ids = [pk for totals in received.values() for pk in totals['ids']]
+            if Purchase.objects.filter(pk__in=ids, is_received=False).update(is_received=True, last_updated=timezone.now()) != len(ids):
+                # Received concurrently: start over without them
+                raise StockConflict("Some of the purchases were received by someone else")
 
+    try:
+        # Short optimistic transactions, retried if stock changed meanwhile
+        run_stock_transaction(receive_pending)
     except Exception as e:
         messages.error(request, f"Error updating stock: {e}")
         return
@@ -59,11 +65,26 @@ def mark_as_received(modeladmin, request, queryset):
 
 
 
+PURCHASE_EXPORT_COLUMNS = [
+    ('Product', 'stock_item__name'),
+    ('Category', 'stock_item__category__name'),
+    ('Purchase Date', 'purchase_date'),
+    ('Quantity', 'quantity_purchased'),
+    ('Cost Price Per Unit', 'cost_price_per_unit'),
+    ('Selling Price', 'selling_price'),
+    ('Total Cost', 'total_cost'),
+    ('Received', 'is_received'),
+    ('Created At', 'created_at'),
+]
+
+
 @admin.register(Purchase)
 class PurchaseAdmin(admin.ModelAdmin):
     list_display = ("stock_item", "quantity_purchased", 'selling_price', "cost_price_per_unit", 'total_cost',
                     "is_received", "purchase_date")
-    list_filter = ("is_received", "purchase_date", 'stock_item')
+    list_filter = ("is_received", "purchase_date", ('stock_item', StockListFilter))
+    # Stock.__str__ includes the category name
+    list_select_related = ('stock_item__category',)
     readonly_fields = ('total_cost', 'created_at', 'last_updated')
 
     fieldsets = (
@@ -81,7 +102,7 @@ class PurchaseAdmin(admin.ModelAdmin):
         }),
     )
     search_fields = ('stock_item__name',)
-    actions = [mark_as_received]
+    actions = [mark_as_received, *export_actions(PURCHASE_EXPORT_COLUMNS, 'Purchases')]
 
 
 
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchases', '0005_purchase_is_received'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['purchase_date'], name='purchase_date'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(condition=models.Q(('is_received', False)), fields=['purchase_date'], name='purchase_pending_date'),
+        ),
+    ]
@@ -20,6 +20,11 @@ class Purchase(models.Model):
         ordering = ['-purchase_date']
         verbose_name = "Add Purchase"
         verbose_name_plural = "Add Purchases"
+        indexes = [
+            models.Index(fields=['purchase_date'], name='purchase_date'),
+            # Purchases waiting to be received (see sales.models.Sales)
+            models.Index(fields=['purchase_date'], condition=models.Q(is_received=False), name='purchase_pending_date'),
+        ]
 
     def __str__(self):
         return f"{self.stock_item.category.name} - {self.quantity_purchased} pcs"
@@ -1,3 +1,51 @@
+from django.contrib.auth import get_user_model
+from django.contrib.messages import get_messages
 from django.test import TestCase
+from django.urls import reverse
+from inventory.models import Category, Stock, StockMovement
+from utility.testing import DerivedDataAssertions
+from .models import Purchase
 
-# Create your tests here.
+
+class ReceivePurchaseTests(DerivedDataAssertions, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='admin')
+        cls.stock = Stock.objects.create(
+            user=cls.user, category=Category.objects.create(name='Shirts'), name='Shirt', cost_price=100, selling_price=150, quantity=10,
+        )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def receive(self, purchases):
+        response = self.client.post(reverse('admin:purchases_purchase_changelist'), {
+            'action': 'mark_as_received', '_selected_action': [purchase.pk for purchase in purchases],
+        })
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+    def test_weighted_average_cost(self):
+        purchases = [
+            Purchase.objects.create(stock_item=self.stock, quantity_purchased=10, cost_price_per_unit=130),
+            Purchase.objects.create(stock_item=self.stock, quantity_purchased=20, cost_price_per_unit=160, selling_price=210),
+        ]
+        self.assertEqual(self.receive(purchases), ['Selected purchases marked as received and stock updated successfully.'])
+
+        stock = Stock.objects.get(pk=self.stock.pk)
+        # (10 * 100 + 10 * 130 + 20 * 160) / 40
+        self.assertEqual((stock.quantity, stock.cost_price, stock.selling_price), (40, 137.5, 210))
+        self.assertFalse(Purchase.objects.filter(is_received=False).exists())
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(kind=StockMovement.PURCHASE).values_list('reference', 'quantity', 'cost_price')),
+            [(purchases[0].pk, 10, 137.5), (purchases[1].pk, 20, 137.5)],
+        )
+        self.assertDerivedConsistent()
+
+    def test_received_purchases_are_skipped(self):
+        purchase = Purchase.objects.create(stock_item=self.stock, quantity_purchased=10, cost_price_per_unit=130)
+        self.receive([purchase])
+        self.receive([purchase])
+
+        self.assertEqual(Stock.objects.get(pk=self.stock.pk).quantity, 20)
+        self.assertDerivedConsistent()
@@ -1,13 +1,21 @@
 from django.contrib import admin
-from .models import Sales
+from .models import ReportJob, Sales
 from django.utils.html import format_html
 from django.contrib import messages
-from django.http import HttpResponse
-from .reports import generate_sales_report
+from django.http import FileResponse, Http404
+from django.shortcuts import redirect
+from django.urls import path, reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from .jobs import enqueue_report, reclaim_stale_jobs
 from datetime import datetime
 from django.utils import timezone
-from django.db import transaction
-from inventory.models import Stock
+from django.db.models import Case, F, FloatField, Value, When
+from inventory.admin import StockListFilter
+from inventory.models import StockMovement
+from inventory.services import StockConflict, apply_stock_movements, run_stock_transaction
+from utility.exports import export_actions
+from utility.recompute import deferred_recompute, recompute
 
 def get_local_date(dt):
     """Convert datetime to Asia/Kolkata local date."""
@@ -20,39 +28,49 @@ def verify_sale(modeladmin, request, queryset):
         messages.error(request, "You don't have permission to verify Sales.")
         return
 
-    verified_count = 0
-
-    # Group sales by product stock
-    sales_grouped = {}
-    for sale in queryset:
-        if not sale.is_verified:
-            sales_grouped.setdefault(sale.stock_id, []).append(sale)
+    def verify_pending():
+        with deferred_recompute():
+            # Unverified sales as plain values: no instances, no per-sale saves
+            pending = list(queryset.filter(is_verified=False).values_list('id', 'stock_id', 'quantity_sold', 'sold_on'))
+
+            # Deduct stock for all products at once. A product without enough
+            # stock for all its selected sales is skipped entirely.
+            stocks = apply_stock_movements(
+                StockMovement.SALE,
+                ((stock_id, -quantity, sale_id) for sale_id, stock_id, quantity, _ in pending),
+                skip_shortages=True,
+            )
+            verified = [sale for sale in pending if sale[1] in stocks]  # (id, stock_id, quantity, sold_on)
+            if not verified:
+                return 0
+
+            # Mark them verified, re-pricing from the stock as Sales.save() does
+            selling_price = Case(
+                *[When(stock_id=pk, then=Value(stock.selling_price)) for pk, stock in stocks.items()],
+                output_field=FloatField(),
+            )
+            profit_per_unit = Case(
+                *[When(stock_id=pk, then=Value(stock.selling_price - stock.cost_price)) for pk, stock in stocks.items()],
+                output_field=FloatField(),
+            )
+            updated = Sales.objects.filter(pk__in=[sale_id for sale_id, *_ in verified], is_verified=False).update(
+                is_verified=True,
+                selling_price=selling_price,
+                total_amount=F('quantity_sold') * selling_price,
+                gross_profit=F('quantity_sold') * profit_per_unit,
+            )
+            if updated != len(verified):
+                # Verified concurrently: start over without them
+                raise StockConflict("Some of the sales were verified by someone else")
+
+            # queryset.update() sends no signals: refresh what they maintain
+            recompute('sales.rollup', {(get_local_date(sold_on), stock_id) for _, stock_id, _, sold_on in verified})
+            recompute('payments.days', {get_local_date(sold_on) for *_, sold_on in verified})
+            return len(verified)
 
     try:
-        with transaction.atomic():  # Lock the whole process
-            for stock_id, sales_list in sales_grouped.items():
-
-                # Lock the stock row
-                stock = Stock.objects.select_for_update().get(id=stock_id)
-
-                # Calculate total qty required
-                total_required = sum(s.quantity_sold for s in sales_list)
-
-                # If not enough stock, skip all sales of this product
-                if stock.quantity < total_required:
-                    continue
-
-                # Deduct stock
-                stock.quantity -= total_required
-                stock.save()
-
-                # Mark all sales as verified
-                for sale in sales_list:
-                    sale.is_verified = True
-                    sale.save()
-
-                verified_count += len(sales_list)
-
+        # Short optimistic transactions, retried if stock changed meanwhile
+        verified_count = run_stock_transaction(verify_pending)
     except Exception as e:
         messages.error(request, f"Error verifying sales: {e}")
         return
@@ -64,13 +82,16 @@ def verify_sale(modeladmin, request, queryset):
 
 
 @admin.action(description="📊 Download Sales Report")
-def download_sales_report(modeladmin, request, queryset):
+def download_sales_report(modeladmin, request, queryset, mode=''):
     """
     Generate PDF report for currently filtered sales.
     Works even without selecting items.
     Always uses Asia/Kolkata local timezone.
-    """
 
+    ``mode`` (set by the summary actions below) picks transactions or a
+    summary by day, category or product; by default long periods get the
+    daily summary. See ``ReportJob.MODE_CHOICES``.
+    """
     # --- Helper to convert datetime to local date ---
     def local_date(dt):
         return timezone.localtime(dt).date()
@@ -104,22 +125,45 @@ def download_sales_report(modeladmin, request, queryset):
             start_date = today
             end_date = today
 
-    # --- Generate the PDF ---
-    try:
-        buffer = generate_sales_report(start_date, end_date, filtered_qs)
+    # --- Queue the PDF ---
+    # get_queryset() doesn't apply changelist filters, so the report is scoped
+    # by date range; this lets its summary come from the daily sales rollup.
+    # Rendering runs in the background (see sales.jobs) and the user is sent to
+    # the report jobs list to follow its progress and download it.
+    job = enqueue_report(request.user, start_date, end_date, mode)
+    if job.status == ReportJob.DONE:
+        # Same data as a report rendered before: send the cached PDF right away
+        return redirect('admin:sales_reportjob_download', job.cache_key)
+    messages.success(request, f"📈 {job} queued; it will be ready to download here shortly")
+    return redirect('admin:sales_reportjob_changelist')
 
-        response = HttpResponse(buffer, content_type='application/pdf')
-        filename = f"Sales_Report_{start_date}_to_{end_date}.pdf"
-        response['Content-Disposition'] = f'attachment; filename=\"{filename}\"'
 
-        messages.success(request, f"📈 Sales report generated for {start_date} → {end_date}")
-        return response
+@admin.action(description="📊 Download Sales Summary by Day")
+def download_summary_by_day(modeladmin, request, queryset):
+    return download_sales_report(modeladmin, request, queryset, mode='day')
 
-    except Exception as e:
-        messages.error(request, f"❌ Error generating report: {str(e)}")
-        return
+
+@admin.action(description="📊 Download Sales Summary by Category")
+def download_summary_by_category(modeladmin, request, queryset):
+    return download_sales_report(modeladmin, request, queryset, mode='category')
 
 
+@admin.action(description="📊 Download Sales Summary by Product")
+def download_summary_by_product(modeladmin, request, queryset):
+    return download_sales_report(modeladmin, request, queryset, mode='product')
+
+
+SALES_EXPORT_COLUMNS = [
+    ('Product', 'stock__name'),
+    ('Category', 'stock__category__name'),
+    ('Quantity', 'quantity_sold'),
+    ('Selling Price', 'selling_price'),
+    ('Total Amount', 'total_amount'),
+    ('Gross Profit', 'gross_profit'),
+    ('Sold On', 'sold_on'),
+    ('Verified', 'is_verified'),
+]
+
 
 @admin.register(Sales)
 class SalesAdmin(admin.ModelAdmin):
@@ -132,10 +176,19 @@ class SalesAdmin(admin.ModelAdmin):
         'sold_on',
         'is_verified_display'
     )
-    list_filter = ('sold_on', 'stock__category', 'is_verified', 'stock')
+    list_filter = ('sold_on', 'stock__category', 'is_verified', ('stock', StockListFilter))
+    # Stock.__str__ includes the category name
+    list_select_related = ('stock__category',)
     search_fields = ('stock__name',)
     readonly_fields = ('sold_on', 'total_amount', 'gross_profit')
-    actions = [verify_sale, download_sales_report]
+    actions = [
+        verify_sale,
+        download_sales_report,
+        download_summary_by_day,
+        download_summary_by_category,
+        download_summary_by_product,
+        *export_actions(SALES_EXPORT_COLUMNS, 'Sales'),
+    ]
     
     # Add date hierarchy for better date filtering
     date_hierarchy = 'sold_on'
@@ -171,4 +224,83 @@ class SalesAdmin(admin.ModelAdmin):
             obj.gross_profit = (obj.selling_price - obj.stock.cost_price) * obj.quantity_sold
         else:
             obj.gross_profit = 0
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'user', 'status', 'progress_display', 'created_at', 'expires_at', 'download_link')
+    list_filter = ('status',)
+    list_select_related = ('user',)
+    readonly_fields = ('user', 'start_date', 'end_date', 'mode', 'status', 'progress', 'error', 'created_at', 'started_at', 'finished_at', 'expires_at')
+    exclude = ('file',)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        if request.user.is_superuser:
+            return qs
+        return qs.filter(user=request.user)
+
+    # Jobs are only created by the Sales "Download Sales Report" action
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    # Anyone who can see sales can request a report, so they can see their own jobs
+    def has_view_permission(self, request, obj=None):
+        return request.user.has_perm('sales.view_sales') or super().has_view_permission(request, obj)
+
+    def has_module_permission(self, request):
+        return self.has_view_permission(request) or super().has_module_permission(request)
+
+    def progress_display(self, obj):
+        if obj.status == ReportJob.FAILED:
+            return format_html('<span style="color: red; font-weight: bold;" title="{}">❌ Failed</span>', obj.error)
+        if obj.status == ReportJob.DONE:
+            return format_html('<span style="color: green; font-weight: bold;">✅ Ready</span>')
+        return format_html('<progress value="{}" max="100"></progress> {}%', obj.progress, obj.progress)
+    progress_display.short_description = 'Progress'
+
+    def download_link(self, obj):
+        if obj.status != ReportJob.DONE or not obj.file:
+            return '-'
+        return format_html('<a href="{}">📥 Download</a>', reverse('admin:sales_reportjob_download', args=[obj.cache_key]))
+    download_link.short_description = 'Report'
+
+    def get_urls(self):
+        return [
+            path('download/<str:key>/', self.admin_site.admin_view(self.download_view, cacheable=True), name='sales_reportjob_download'),
+        ] + super().get_urls()
+
+    def download_view(self, request, key):
+        # Addressed by cache key rather than job, so every download of the same
+        # report shares one URL and browsers can revalidate it with ETag
+        job = self.get_queryset(request).filter(
+            cache_key=key, status=ReportJob.DONE, expires_at__gte=timezone.now(),
+        ).exclude(file='').first()
+        if job is None:
+            raise Http404("Report is not ready or has expired")
+
+        etag = f'"{key}"'
+        # Whole seconds, as Last-Modified and If-Modified-Since carry them
+        last_modified = int(job.file.storage.get_modified_time(job.file.name).timestamp())
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        response = FileResponse(job.file.open('rb'), as_attachment=True, filename=job.filename, content_type='application/pdf')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def changelist_view(self, request, extra_context=None):
+        # The list template reloads itself while any job is still rendering
+        reclaim_stale_jobs()
+        extra_context = extra_context or {}
+        extra_context['has_pending'] = self.get_queryset(request).filter(
+            status__in=[ReportJob.QUEUED, ReportJob.RUNNING]
+        ).exists()
+        return super().changelist_view(request, extra_context)
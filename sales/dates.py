@@ -0,0 +1,12 @@
+from datetime import datetime, time
+from django.utils import timezone
+
+
+def local_date(dt):
+    """Convert an aware datetime to its Asia/Kolkata local date."""
+    return timezone.localtime(dt).date()
+
+
+def local_day_start(day):
+    """Aware datetime for local (Asia/Kolkata) midnight at the start of ``day``."""
+    return timezone.make_aware(datetime.combine(day, time.min))
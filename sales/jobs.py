@@ -0,0 +1,214 @@
+import logging
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import OperationalError, close_old_connections, connections, transaction
+from django.utils import timezone
+from erp.db import read_only
+from .models import ReportJob
+from .report_cache import REPORT_CACHE_DIR, cached_report, report_cache_key, report_cache_path
+from .reports import generate_sales_report
+
+logger = logging.getLogger(__name__)
+
+# Report renders running at once in the web process's thread pool
+REPORT_JOB_WORKERS = getattr(settings, 'REPORT_JOB_WORKERS', 2)
+
+# Seconds a finished report is kept for download
+REPORT_JOB_TTL = getattr(settings, 'REPORT_JOB_TTL', 60 * 60 * 24)
+
+# Seconds after which a job still marked running is presumed dead and requeued
+REPORT_JOB_TIMEOUT = getattr(settings, 'REPORT_JOB_TIMEOUT', 60 * 30)
+
+# Attempts at recording a job's outcome while the database is locked
+REPORT_JOB_WRITE_ATTEMPTS = getattr(settings, 'REPORT_JOB_WRITE_ATTEMPTS', 5)
+
+# Seconds to wait before the first retry, doubled (with jitter) for each next one
+REPORT_JOB_RETRY_DELAY = getattr(settings, 'REPORT_JOB_RETRY_DELAY', 0.2)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REPORT_JOB_WORKERS, thread_name_prefix='report-job')
+        return _executor
+
+
+# ==================== ENQUEUE ====================
+
+def enqueue_report(user, start_date, end_date, mode=''):
+    """
+    Queue a sales report for ``start_date``..``end_date`` in ``mode`` (a
+    ``ReportJob.MODE_CHOICES`` value) and return the job.
+    If the same report is already cached (see ``sales.report_cache``) the job
+    is returned finished, without rendering anything.
+
+    With ``REPORT_JOBS_IN_PROCESS`` (the default) it starts rendering on this
+    process's thread pool once the surrounding transaction commits; without
+    it the job waits for ``manage.py run_report_jobs``.
+    """
+    # Jobs left running by a process that died are picked up as others are requested
+    transaction.on_commit(reclaim_stale_jobs)
+
+    key = report_cache_key(start_date, end_date, mode=mode)
+    cached = cached_report(key)
+    if cached:
+        now = timezone.now()
+        return ReportJob.objects.create(
+            user=user, start_date=start_date, end_date=end_date, mode=mode, cache_key=key,
+            status=ReportJob.DONE, progress=100, file=cached,
+            started_at=now, finished_at=now, expires_at=now + timedelta(seconds=REPORT_JOB_TTL),
+        )
+
+    job = ReportJob.objects.create(user=user, start_date=start_date, end_date=end_date, mode=mode, cache_key=key)
+    if in_process():
+        transaction.on_commit(lambda: get_executor().submit(run_in_thread, job.pk))
+    return job
+
+
+def in_process():
+    return getattr(settings, 'REPORT_JOBS_IN_PROCESS', True)
+
+
+def run_in_thread(job_id):
+    try:
+        run_report_job(job_id)
+    finally:
+        # Worker threads get their own connections; don't leak them
+        connections.close_all()
+
+
+# ==================== RUN ====================
+
+def update_job(job_id, **fields):
+    """
+    Write ``fields`` to the job, trying again with a growing random delay
+    while the database is locked, up to ``REPORT_JOB_WRITE_ATTEMPTS`` times.
+    """
+    for attempt in range(1, REPORT_JOB_WRITE_ATTEMPTS + 1):
+        try:
+            return ReportJob.objects.filter(pk=job_id).update(**fields)
+        except OperationalError as e:
+            if attempt == REPORT_JOB_WRITE_ATTEMPTS or 'locked' not in str(e):
+                raise
+        time.sleep(REPORT_JOB_RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+
+
+def claim_job(job_id):
+    """Atomically move a queued job to running. False if someone else got it first."""
+    return bool(ReportJob.objects.filter(pk=job_id, status=ReportJob.QUEUED).update(
+        status=ReportJob.RUNNING, started_at=timezone.now(), progress=0,
+    ))
+
+
+def run_report_job(job_id):
+    """Render one queued job. Returns False if it was already claimed elsewhere."""
+    close_old_connections()
+    if not claim_job(job_id):
+        return False
+    job = ReportJob.objects.get(pk=job_id)
+
+    reported = [0]
+
+    def progress(done, total):
+        # Only write every few percent: the job row is polled, not streamed
+        percent = min(99, int(done * 100 / total)) if total else 99
+        if percent - reported[0] >= 5:
+            reported[0] = percent
+            try:
+                ReportJob.objects.filter(pk=job_id).update(progress=percent)
+            except OperationalError:
+                # Progress is only shown while polling; a busy database mustn't fail the render
+                logger.warning('Could not record progress of report job %s', job_id, exc_info=True)
+
+    try:
+        # Keyed again now: the data may have changed since the job was queued
+        key = report_cache_key(job.start_date, job.end_date, mode=job.mode)
+        name = cached_report(key)
+        if not name:
+            # Rendering only reads, so it stays off the writers' connection
+            with tempfile.TemporaryFile() as output, read_only():
+                generate_sales_report(job.start_date, job.end_date, output=output, progress=progress, mode=job.mode or None)
+                name = default_storage.save(report_cache_path(key), File(output))
+    except Exception as e:
+        logger.exception('Report job %s failed', job_id)
+        update_job(
+            job_id,
+            status=ReportJob.FAILED, error=str(e), finished_at=timezone.now(),
+        )
+        return True
+
+    finished = timezone.now()
+    update_job(
+        job_id,
+        status=ReportJob.DONE,
+        progress=100,
+        cache_key=key,
+        file=name,
+        finished_at=finished,
+        expires_at=finished + timedelta(seconds=REPORT_JOB_TTL),
+    )
+    return True
+
+
+def run_pending_jobs(limit=None):
+    """Run queued jobs, oldest first, in this thread. Returns how many ran."""
+    ran = 0
+    queued = ReportJob.objects.filter(status=ReportJob.QUEUED).order_by('created_at').values_list('pk', flat=True)
+    for job_id in list(queued[:limit] if limit else queued):
+        ran += run_report_job(job_id)
+    return ran
+
+
+# ==================== MAINTENANCE ====================
+
+def requeue_stale_jobs():
+    """
+    Put jobs whose runner died (still running after REPORT_JOB_TIMEOUT) back
+    in the queue. Returns their ids.
+    """
+    cutoff = timezone.now() - timedelta(seconds=REPORT_JOB_TIMEOUT)
+    stale = ReportJob.objects.filter(status=ReportJob.RUNNING, started_at__lt=cutoff)
+    requeued = []
+    for job_id in list(stale.values_list('pk', flat=True)):
+        # Filtered again, so a job finished or requeued meanwhile is left alone
+        if stale.filter(pk=job_id).update(status=ReportJob.QUEUED, started_at=None, progress=0):
+            requeued.append(job_id)
+    return requeued
+
+
+def reclaim_stale_jobs():
+    """
+    Requeue stale jobs and, with ``REPORT_JOBS_IN_PROCESS``, start them
+    again on this process's thread pool. Runs as reports are requested and
+    their jobs are listed, so jobs stranded by a restarted web process
+    finish without ``manage.py run_report_jobs``. Returns the requeued ids.
+    """
+    requeued = requeue_stale_jobs()
+    if in_process():
+        for job_id in requeued:
+            get_executor().submit(run_in_thread, job_id)
+    return requeued
+
+
+def cleanup_expired_reports():
+    """
+    Delete expired jobs. Returns how many were removed. Cached report files
+    are shared between jobs and left to ``prune_report_cache``.
+    """
+    expired = list(ReportJob.objects.filter(expires_at__lt=timezone.now()))
+    for job in expired:
+        if job.file and not job.file.name.startswith(f'{REPORT_CACHE_DIR}/'):
+            job.file.delete(save=False)
+    ReportJob.objects.filter(pk__in=[job.pk for job in expired]).delete()
+    return len(expired)
@@ -0,0 +1,27 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from sales.rollups import rebuild_rollup
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the daily sales rollup table from Sales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help='First local date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='end', help='Last local date to rebuild (YYYY-MM-DD)')
+
+    def parse_date(self, value):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Invalid date: {value}')
+
+    def handle(self, *args, **options):
+        start = self.parse_date(options['start'])
+        end = self.parse_date(options['end'])
+
+        self.stdout.write('Rebuilding daily sales rollup...')
+        written = rebuild_rollup(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Successfully wrote {written} rollup rows.'))
@@ -0,0 +1,44 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from sales.jobs import cleanup_expired_reports, requeue_stale_jobs, run_in_thread
+from sales.models import ReportJob
+from sales.report_cache import prune_report_cache
+
+
+class Command(BaseCommand):
+    help = 'Renders queued sales reports and removes expired jobs and cached reports'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Reports rendered at once')
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds between polls for new jobs')
+        parser.add_argument('--once', action='store_true', help='Run the jobs queued now, then exit')
+
+    def handle(self, *args, **options):
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            while True:
+                close_old_connections()
+                requeued = len(requeue_stale_jobs())
+                if requeued:
+                    self.stdout.write(self.style.WARNING(f'Requeued {requeued} stale jobs.'))
+                removed = cleanup_expired_reports()
+                if removed:
+                    self.stdout.write(f'Removed {removed} expired reports.')
+                pruned = prune_report_cache()
+                if pruned:
+                    self.stdout.write(f'Pruned {pruned} cached reports.')
+
+                queued = list(
+                    ReportJob.objects.filter(status=ReportJob.QUEUED).order_by('created_at').values_list('pk', flat=True)
+                )
+                # Jobs are claimed atomically, so running alongside in-process
+                # workers or other runners never renders a report twice
+                for _ in executor.map(run_in_thread, queued):
+                    pass
+                if queued:
+                    self.stdout.write(self.style.SUCCESS(f'Ran {len(queued)} report jobs.'))
+
+                if options['once']:
+                    return
+                time.sleep(options['interval'])
@@ -0,0 +1,76 @@
+# Generated by Django 4.2.9 on 2026-10-18 01:27
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def populate_rollup(apps, schema_editor):
+    Sales = apps.get_model('sales', 'Sales')
+    SalesDailyRollup = apps.get_model('sales', 'SalesDailyRollup')
+
+    verified = Q(is_verified=True)
+    unverified = Q(is_verified=False)
+    rows = Sales.objects.annotate(
+        day=TruncDate('sold_on', tzinfo=timezone.get_current_timezone())
+    ).values('day', 'stock_id', 'stock__category_id').annotate(
+        verified_quantity=Sum('quantity_sold', filter=verified, default=0),
+        verified_revenue=Sum('total_amount', filter=verified, default=0),
+        verified_profit=Sum('gross_profit', filter=verified, default=0),
+        verified_count=Count('id', filter=verified),
+        unverified_quantity=Sum('quantity_sold', filter=unverified, default=0),
+        unverified_revenue=Sum('total_amount', filter=unverified, default=0),
+        unverified_profit=Sum('gross_profit', filter=unverified, default=0),
+        unverified_count=Count('id', filter=unverified),
+    ).order_by()
+
+    SalesDailyRollup.objects.bulk_create(
+        (SalesDailyRollup(
+            date=row.pop('day'),
+            stock_id=row.pop('stock_id'),
+            category_id=row.pop('stock__category_id'),
+            **row
+        ) for row in rows.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_alter_stock_cost_price'),
+        ('sales', '0007_alter_sales_sold_on'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('verified_quantity', models.IntegerField(default=0)),
+                ('verified_revenue', models.FloatField(default=0)),
+                ('verified_profit', models.FloatField(default=0)),
+                ('verified_count', models.IntegerField(default=0)),
+                ('unverified_quantity', models.IntegerField(default=0)),
+                ('unverified_revenue', models.FloatField(default=0)),
+                ('unverified_profit', models.FloatField(default=0)),
+                ('unverified_count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.category')),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='inventory.stock')),
+            ],
+            options={
+                'verbose_name': 'Daily Sales Rollup',
+                'verbose_name_plural': 'Daily Sales Rollups',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'category'], name='sales_rollup_date_category')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='salesdailyrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'stock'), name='unique_sales_rollup_date_stock'),
+        ),
+        migrations.RunPython(populate_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_reportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='cache_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+    ]
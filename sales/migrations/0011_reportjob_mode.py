@@ -0,0 +1,18 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_reportjob_cache_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reportjob',
+            name='mode',
+            field=models.CharField(blank=True, choices=[('', 'Automatic'), ('transactions', 'Transactions'), ('day', 'Summary by day'), ('category', 'Summary by category'), ('product', 'Summary by product')], max_length=12),
+        ),
+    ]
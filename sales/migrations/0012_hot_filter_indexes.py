@@ -0,0 +1,29 @@
+# Generated by Django 4.2.9 on 2026-10-18 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0011_reportjob_mode'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sales',
+            index=models.Index(fields=['sold_on'], name='sales_sold_on'),
+        ),
+        migrations.AddIndex(
+            model_name='sales',
+            index=models.Index(condition=models.Q(('is_verified', True)), fields=['sold_on'], name='sales_verified_sold_on'),
+        ),
+        migrations.AddIndex(
+            model_name='sales',
+            index=models.Index(condition=models.Q(('is_verified', False)), fields=['sold_on'], name='sales_unverified_sold_on'),
+        ),
+        migrations.AddIndex(
+            model_name='sales',
+            index=models.Index(fields=['stock', 'sold_on'], name='sales_stock_sold_on'),
+        ),
+    ]
@@ -1,5 +1,7 @@
+import uuid
 from django.db import models
-from inventory.models import Stock
+from accounts.models import CustomUser
+from inventory.models import Category, Stock
 from django.utils import timezone
 
 class Sales(models.Model):
@@ -11,6 +13,25 @@ class Sales(models.Model):
     sold_on = models.DateTimeField(auto_now_add=True)
     is_verified = models.BooleanField(default=False)  # <-- VERY IMPORTANT
 
+    # Fields remembered as ``previous_state`` so signal handlers can apply deltas
+    TRACKED_FIELDS = ('stock_id', 'quantity_sold', 'total_amount', 'gross_profit', 'sold_on', 'is_verified')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_state()
+        return instance
+
+    def tracked_state(self):
+        return {field: getattr(self, field) for field in self.TRACKED_FIELDS}
+
+    def remember_state(self):
+        """Record the tracked fields as they are stored in the database."""
+        if self.get_deferred_fields().intersection(self.TRACKED_FIELDS):
+            self.previous_state = None
+        else:
+            self.previous_state = self.tracked_state()
+
     def save(self, *args, **kwargs):
         # Auto fetch selling price from stock
         self.selling_price = self.stock.selling_price
@@ -24,7 +45,12 @@ class Sales(models.Model):
         else:
             self.gross_profit = 0
 
+        # Instances that weren't loaded with all tracked fields fetch them once
+        if self.pk is not None and getattr(self, 'previous_state', None) is None:
+            self.previous_state = type(self).objects.filter(pk=self.pk).values(*self.TRACKED_FIELDS).first()
+
         super().save(*args, **kwargs)
+        self.remember_state()
 
     def __str__(self):
         return f"{self.stock.name} - {self.quantity_sold} pcs"
@@ -33,3 +59,121 @@ class Sales(models.Model):
         verbose_name = "Sale"
         verbose_name_plural = "Sales"
         ordering = ['-sold_on']
+        indexes = [
+            # Date ranges and the default ordering (reports, changelist)
+            models.Index(fields=['sold_on'], name='sales_sold_on'),
+            # SQLite can't seek on a boolean tested as "col" / "NOT col", so
+            # the verified and pending sales get a partial index each
+            models.Index(fields=['sold_on'], condition=models.Q(is_verified=True), name='sales_verified_sold_on'),
+            models.Index(fields=['sold_on'], condition=models.Q(is_verified=False), name='sales_unverified_sold_on'),
+            models.Index(fields=['stock', 'sold_on'], name='sales_stock_sold_on'),
+        ]
+
+
+class SalesDailyRollup(models.Model):
+    """
+    Sales totals per local (Asia/Kolkata) day and stock item.
+
+    Maintained incrementally by ``sales.signals`` on every sale save and
+    delete, and rebuildable with ``manage.py rebuild_sales_rollup``.
+    ``category`` is denormalized from the stock so category totals don't
+    need a join.
+    """
+    date = models.DateField()
+    stock = models.ForeignKey(Stock, on_delete=models.CASCADE, related_name='daily_rollups')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_rollups')
+
+    verified_quantity = models.IntegerField(default=0)
+    verified_revenue = models.FloatField(default=0)
+    verified_profit = models.FloatField(default=0)
+    verified_count = models.IntegerField(default=0)
+
+    unverified_quantity = models.IntegerField(default=0)
+    unverified_revenue = models.FloatField(default=0)
+    unverified_profit = models.FloatField(default=0)
+    unverified_count = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.date} - {self.stock_id}"
+
+    class Meta:
+        verbose_name = "Daily Sales Rollup"
+        verbose_name_plural = "Daily Sales Rollups"
+        ordering = ['-date']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'stock'], name='unique_sales_rollup_date_stock'),
+        ]
+        indexes = [
+            models.Index(fields=['date', 'category'], name='sales_rollup_date_category'),
+        ]
+
+
+def report_upload_to(instance, filename):
+    # Media is publicly served, so report files get unguessable names
+    return f'reports/{uuid.uuid4().hex}/{filename}'
+
+
+class ReportJob(models.Model):
+    """
+    A sales report rendered in the background by ``sales.jobs``, either in
+    the web process or by ``manage.py run_report_jobs``. The finished PDF
+    lives in the report cache (``MEDIA_ROOT/reports/cache/``) and can be
+    downloaded through the job until ``expires_at``.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # Blank lets sales.reports choose: transactions, or the daily summary for long periods
+    MODE_CHOICES = [
+        ('', 'Automatic'),
+        ('transactions', 'Transactions'),
+        ('day', 'Summary by day'),
+        ('category', 'Summary by category'),
+        ('product', 'Summary by product'),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='report_jobs')
+    start_date = models.DateField()
+    end_date = models.DateField()
+    mode = models.CharField(max_length=12, choices=MODE_CHOICES, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    progress = models.PositiveSmallIntegerField(default=0)
+    # Content address of the report, see sales.report_cache
+    cache_key = models.CharField(max_length=64, blank=True)
+    file = models.FileField(upload_to=report_upload_to, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        if self.mode in ('day', 'category', 'product'):
+            return f"Sales {self.get_mode_display().lower()} {self.start_date} → {self.end_date}"
+        return f"Sales report {self.start_date} → {self.end_date}"
+
+    @property
+    def filename(self):
+        if self.mode in ('day', 'category', 'product'):
+            return f"Sales_Summary_by_{self.mode}_{self.start_date}_to_{self.end_date}.pdf"
+        return f"Sales_Report_{self.start_date}_to_{self.end_date}.pdf"
+
+    @property
+    def is_pending(self):
+        return self.status in (self.QUEUED, self.RUNNING)
+
+    class Meta:
+        verbose_name = "Report Job"
+        verbose_name_plural = "Report Jobs"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='sales_reportjob_status'),
+        ]
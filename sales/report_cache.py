@@ -0,0 +1,111 @@
+"""
+Content-addressed storage for rendered sales reports.
+
+A report is stored under a key derived from what it shows: the query
+selecting its transactions (date range and any filters) and a cheap
+version of those rows' data. Re-requesting a report whose rows haven't
+changed reuses the stored PDF, so a closed past period is rendered once
+per ``REPORT_CACHE_MAX_AGE``; any added, edited, verified or deleted sale
+in the range changes the key.
+
+Summaries by category or product also key on the category each sold
+item is in now, so moving an item to another category renders them again.
+Renaming a stock item or category does not change the key: the old name
+stays in reports cached before the rename until they age out.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+from .dates import local_day_start
+from .models import ReportJob, Sales
+
+# Bump when the report layout changes, so cached PDFs are rendered again
+REPORT_CACHE_VERSION = 2
+
+# Seconds a cached report is kept after it was rendered
+REPORT_CACHE_MAX_AGE = getattr(settings, 'REPORT_CACHE_MAX_AGE', 60 * 60 * 24 * 30)
+
+REPORT_CACHE_DIR = 'reports/cache'
+
+# Report modes grouping sales by their stock item's current category
+CATEGORY_MODES = ('category', 'product')
+
+
+def report_sales(start_date, end_date):
+    """Sales shown in the report for a local date range."""
+    return Sales.objects.filter(
+        sold_on__gte=local_day_start(start_date),
+        sold_on__lt=local_day_start(end_date + timedelta(days=1))
+    )
+
+
+def data_version(sales, mode=''):
+    """
+    One aggregate over ``sales`` that changes whenever a row is added,
+    deleted or has a reported column changed, and in ``CATEGORY_MODES``
+    whenever a sold item moves to another category. Uses the same
+    ``sold_on`` index scan as the report itself, without reading rows into
+    Python.
+    """
+    aggregates = dict(
+        count=Count('id'),
+        last_id=Max('id'),
+        stock_ids=Sum('stock_id'),
+        quantity=Sum('quantity_sold'),
+        revenue=Sum('total_amount'),
+        profit=Sum('gross_profit'),
+        verified=Count('id', filter=Q(is_verified=True)),
+        last_sold=Max('sold_on'),
+    )
+    if mode in CATEGORY_MODES:
+        # Weighted by stock id, so items swapping categories still count
+        aggregates['categories'] = Sum(F('stock_id') * F('stock__category_id'))
+    return sales.order_by().aggregate(**aggregates)
+
+
+def report_cache_key(start_date, end_date, sales=None, mode=''):
+    """
+    Key of the report for ``start_date``..``end_date`` in ``mode`` (see
+    ``generate_sales_report``, blank for automatic). An HMAC (keyed by
+    ``SECRET_KEY``) rather than a plain hash, because media is served
+    publicly and the key is the file name.
+    """
+    if sales is None:
+        sales = report_sales(start_date, end_date)
+    version = sorted((name, str(value)) for name, value in data_version(sales, mode).items())
+    value = f'{REPORT_CACHE_VERSION}|{start_date}|{end_date}|{mode}|{sales.query}|{version}'
+    return salted_hmac('sales.report_cache', value, algorithm='sha256').hexdigest()
+
+
+def report_cache_path(key):
+    return f'{REPORT_CACHE_DIR}/{key}.pdf'
+
+
+def cached_report(key):
+    """Storage name of the PDF stored for ``key``, or ``None``."""
+    name = report_cache_path(key)
+    return name if default_storage.exists(name) else None
+
+
+def prune_report_cache(max_age=REPORT_CACHE_MAX_AGE):
+    """
+    Delete cached reports rendered more than ``max_age`` seconds ago, unless
+    a job that can still be downloaded points at them. Returns how many.
+    """
+    if not default_storage.exists(REPORT_CACHE_DIR):
+        return 0
+    cutoff = timezone.now() - timedelta(seconds=max_age)
+    in_use = set(ReportJob.objects.filter(
+        status=ReportJob.DONE, expires_at__gte=timezone.now(),
+    ).values_list('file', flat=True))
+
+    pruned = 0
+    for filename in default_storage.listdir(REPORT_CACHE_DIR)[1]:
+        name = f'{REPORT_CACHE_DIR}/{filename}'
+        if name not in in_use and default_storage.get_modified_time(name) < cutoff:
+            default_storage.delete(name)
+            pruned += 1
+    return pruned
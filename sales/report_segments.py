@@ -0,0 +1,51 @@
+"""
+Worker process side of ``sales.reports.render_in_parallel``.
+
+Workers are spawned, so this module is imported before Django is set up:
+everything from the project is imported inside the functions.
+"""
+
+
+def setup_django():
+    import django
+    django.setup()
+
+
+def segment_sales(first, last, max_id):
+    """
+    Transactions from the ``(sold_on, id)`` key ``first`` down to ``last``,
+    both included, in report order, leaving out ids above ``max_id``.
+    """
+    from django.db.models import Q
+    from .models import Sales
+
+    (first_sold, first_id), (last_sold, last_id) = first, last
+    return Sales.objects.filter(
+        Q(sold_on__lt=first_sold) | Q(id__lte=first_id),
+        Q(sold_on__gt=last_sold) | Q(id__gte=last_id),
+        sold_on__range=(last_sold, first_sold),
+        id__lte=max_id,
+    ).order_by('-sold_on', '-id')
+
+
+def render_segment(first, last, max_id, count, first_page, path, generated_on=None):
+    """
+    The ``count`` transactions of ``segment_sales(first, last, max_id)``,
+    written to ``path`` as pages numbered from ``first_page`` and followed by
+    the report footer if ``generated_on`` is given. Returns ``count``.
+    """
+    from django.db import connections
+    from reportlab.platypus import SimpleDocTemplate
+    from erp.db import read_only
+    from .reports import REPORT_PAGE_OPTIONS, TransactionRows, number_pages, report_footer, transaction_rows
+
+    elements = [TransactionRows(transaction_rows(segment_sales(first, last, max_id)))]
+    if generated_on is not None:
+        elements.extend(report_footer(generated_on))
+    try:
+        with read_only():
+            doc = SimpleDocTemplate(path, **REPORT_PAGE_OPTIONS)
+            doc.build(elements, onFirstPage=number_pages(first_page), onLaterPages=number_pages(first_page))
+    finally:
+        connections.close_all()
+    return count
@@ -1,34 +1,104 @@
+import logging
+import math
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.conf import settings
 from django.http import HttpResponse
 from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Flowable
+from reportlab.pdfbase.pdfmetrics import stringWidth
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib import colors
 from reportlab.lib.units import inch
 from reportlab.pdfgen import canvas
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT, TA_JUSTIFY
 from io import BytesIO
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDate
 from django.utils import timezone
+from . import report_segments
+from .dates import local_day_start
 from .models import Sales
-from datetime import datetime
+from .rollups import grouped_totals, sales_totals, top_products
+from datetime import datetime, timedelta
 import os
 
-def generate_sales_report(start_date, end_date, queryset=None):
+try:
+    from pypdf import PdfWriter
+except ImportError:  # Optional: without it reports always render in one process
+    PdfWriter = None
+
+logger = logging.getLogger(__name__)
+
+# Columns of the transaction table, read without building Sales instances
+TRANSACTION_COLUMNS = ('stock__name', 'quantity_sold', 'selling_price', 'total_amount', 'sold_on', 'is_verified')
+
+# Rows fetched per round trip while streaming the transaction table
+TRANSACTION_CHUNK_SIZE = 2000
+
+# Reports with more transactions than this use the canvas-drawn table
+LARGE_REPORT_ROWS = 2000
+
+# Processes rendering transaction pages of a single large report; 1 renders
+# everything in the calling process
+REPORT_RENDER_WORKERS = getattr(settings, 'REPORT_RENDER_WORKERS', 1)
+
+# Below this many transactions starting worker processes costs more than it saves
+PARALLEL_REPORT_ROWS = getattr(settings, 'PARALLEL_REPORT_ROWS', 50_000)
+
+# Segments per worker, so a slow segment doesn't leave the other workers idle
+SEGMENTS_PER_WORKER = 4
+
+# Report modes: every transaction, or totals per local day, category or product
+TRANSACTIONS = 'transactions'
+SUMMARY_MODES = {
+    'day': 'DAILY SUMMARY',
+    'category': 'SUMMARY BY CATEGORY',
+    'product': 'SUMMARY BY PRODUCT',
+}
+
+# Reports without an explicit mode list transactions up to this many, and
+# show the daily summary above it
+SUMMARY_REPORT_ROWS = getattr(settings, 'SUMMARY_REPORT_ROWS', 100_000)
+
+REPORT_PAGE_OPTIONS = dict(
+    pagesize=A4,
+    topMargin=0.75*inch,
+    bottomMargin=0.75*inch,
+    leftMargin=0.6*inch,
+    rightMargin=0.6*inch,
+    title="Sales Report",
+    author="Sales Management System"
+)
+
+def generate_sales_report(start_date, end_date, queryset=None, output=None, large=None, progress=None, workers=None, mode=None):
     """
     Generate a premium professional sales report with Indian Rupee formatting
+
+    The PDF is written to ``output`` (a binary file object, an in-memory
+    buffer by default), which is returned rewound. Reports with more than
+    ``LARGE_REPORT_ROWS`` transactions, or any report with ``large=True``,
+    draw the transaction rows directly on the canvas a page at a time, so
+    rendering time grows linearly and memory stays flat.
+
+    ``progress(done, total)``, if given, is called as transaction rows are
+    rendered.
+
+    With ``workers`` (default ``REPORT_RENDER_WORKERS``) above 1, date range
+    reports of at least ``PARALLEL_REPORT_ROWS`` transactions render their
+    transaction pages in that many processes and are stitched together with
+    pypdf; see ``render_in_parallel``. Without pypdf they render serially.
+
+    ``mode`` is ``'transactions'`` or one of ``SUMMARY_MODES``, which replace
+    the transaction list with one row per local day, category or product,
+    read with grouped aggregates. By default reports of more than
+    ``SUMMARY_REPORT_ROWS`` transactions show the daily summary.
     """
-    buffer = BytesIO()
+    buffer = output if output is not None else BytesIO()
     
     # Create PDF with professional margins
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=A4, 
-        topMargin=0.75*inch,
-        bottomMargin=0.75*inch,
-        leftMargin=0.6*inch,
-        rightMargin=0.6*inch,
-        title="Sales Report",
-        author="Sales Management System"
-    )
+    doc = SimpleDocTemplate(buffer, **REPORT_PAGE_OPTIONS)
     
     elements = []
     styles = getSampleStyleSheet()
@@ -116,37 +186,49 @@ def generate_sales_report(start_date, end_date, queryset=None):
     # ==================== DATA PROCESSING ====================
     
     if queryset is not None:
-        sales = queryset.select_related('stock')
+        sales = queryset
+
+        # Summary metrics in one aggregate query
+        totals = sales.aggregate(
+            total_sales=Count('id'),
+            total_quantity=Sum('quantity_sold', default=0),
+            total_revenue=Sum('total_amount', default=0),
+            total_profit=Sum('gross_profit', default=0),
+        )
+        total_sales = totals['total_sales']
+        total_quantity = totals['total_quantity']
+        total_revenue = totals['total_revenue']
+        total_profit = totals['total_profit']
+
+        # Get top selling product
+        top_product = sales.values('stock__name').annotate(
+            total_qty=Sum('quantity_sold')
+        ).order_by('-total_qty').first()
+        top_product_name = top_product['stock__name'] if top_product else 'N/A'
+        top_product_qty = top_product['total_qty'] if top_product else 0
     else:
         sales = Sales.objects.filter(
-            sold_on__date__gte=start_date,
-            sold_on__date__lte=end_date
-        ).select_related('stock')
-    
-    # Calculate metrics
-    total_sales = sales.count()
-    total_quantity = sum(sale.quantity_sold for sale in sales)
-    total_revenue = sum(sale.total_amount for sale in sales)
-    total_profit = sum(sale.gross_profit for sale in sales)
+            sold_on__gte=local_day_start(start_date),
+            sold_on__lt=local_day_start(end_date + timedelta(days=1))
+        ).order_by('-sold_on', '-id')
+
+        # Summary metrics come from the daily rollup: days x SKUs, not transactions
+        totals = sales_totals(start_date, end_date)
+        total_sales = totals['total_count']
+        total_quantity = totals['total_quantity']
+        total_revenue = totals['total_revenue']
+        total_profit = totals['total_profit']
+
+        top_product = next(iter(top_products(start_date, end_date, limit=1, verified_only=False)), None)
+        top_product_name = top_product['stock__name'] if top_product else 'N/A'
+        top_product_qty = top_product['total_sold'] if top_product else 0
+
     total_cost = total_revenue - total_profit
-    
+
     avg_sale_value = total_revenue / total_sales if total_sales > 0 else 0
     avg_profit_margin = (total_profit / total_revenue * 100) if total_revenue > 0 else 0
     avg_profit_per_unit = total_profit / total_quantity if total_quantity > 0 else 0
     
-    # Get top selling product
-    from django.db.models import Sum
-    top_product = sales.values('stock__name').annotate(
-        total_qty=Sum('quantity_sold')
-    ).order_by('-total_qty').first()
-    top_product_name = top_product['stock__name'] if top_product else 'N/A'
-    top_product_qty = top_product['total_qty'] if top_product else 0
-    
-    # Indian Rupee formatting function
-    def format_inr(amount):
-        """Format amount in Indian Rupee with proper comma separation"""
-        return f"Rs. {amount:,.2f}"
-    
     # ==================== EXECUTIVE SUMMARY ====================
     
     elements.append(Paragraph("EXECUTIVE SUMMARY", section_style))
@@ -250,79 +332,42 @@ def generate_sales_report(start_date, end_date, queryset=None):
     elements.append(Spacer(1, 30))
     
     # ==================== DETAILED TRANSACTIONS ====================
-    
-    if sales.exists():
+
+    automatic = mode is None
+    if automatic:
+        mode = 'day' if total_sales > SUMMARY_REPORT_ROWS else TRANSACTIONS
+
+    if workers is None:
+        workers = REPORT_RENDER_WORKERS
+    parallel = (
+        mode == TRANSACTIONS and workers > 1 and PdfWriter is not None and queryset is None
+        and large is not False and total_sales >= PARALLEL_REPORT_ROWS
+    )
+
+    if total_sales > 0 and mode in SUMMARY_MODES:
+        elements.append(Paragraph(SUMMARY_MODES[mode], section_style))
+        if automatic:
+            elements.append(Paragraph(
+                f"This period has {total_sales:,} transactions, too many to list; "
+                "they are summarised per day. Export the Sales list to CSV for every transaction.",
+                ParagraphStyle('SummaryNote', fontSize=8, fontName='Helvetica-Oblique', textColor=colors.HexColor('#6c757d'), spaceAfter=10)
+            ))
+        groups = summary_groups(mode, start_date, end_date, queryset)
+        elements.append(TransactionRows(summary_rows(mode, groups), columns=SUMMARY_COLUMNS[mode]))
+    elif total_sales > 0:
         elements.append(Paragraph("TRANSACTION DETAILS", section_style))
-        
-        # Transaction table header
-        transaction_data = [[
-            Paragraph('<b>PRODUCT</b>', ParagraphStyle('TH', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white)),
-            Paragraph('<b>QTY</b>', ParagraphStyle('TH', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, alignment=TA_CENTER)),
-            Paragraph('<b>UNIT PRICE</b>', ParagraphStyle('TH', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, alignment=TA_RIGHT)),
-            Paragraph('<b>AMOUNT</b>', ParagraphStyle('TH', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, alignment=TA_RIGHT)),
-            Paragraph('<b>DATE</b>', ParagraphStyle('TH', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, alignment=TA_CENTER)),
-            Paragraph('<b>STATUS</b>', ParagraphStyle('TH', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, alignment=TA_CENTER))
-        ]]
-        
-        # Add transaction rows
-        for sale in sales:
-            status_icon = "✓" if sale.is_verified else "○"
-            status_text = f"{status_icon} Verified" if sale.is_verified else f"{status_icon} Pending"
-            
-            transaction_data.append([
-                Paragraph(sale.stock.name, ParagraphStyle('TD', fontSize=8, fontName='Helvetica', leading=10)),
-                str(sale.quantity_sold),
-                format_inr(sale.selling_price),
-                format_inr(sale.total_amount),
-                timezone.localtime(sale.sold_on).strftime('%d/%m/%y'),
-                status_text
-            ])
-        
-        # Create transaction table
-        transaction_table = Table(
-            transaction_data, 
-            repeatRows=1, 
-            colWidths=[1.8*inch, 0.5*inch, 0.95*inch, 0.95*inch, 0.95*inch, 0.7*inch, 0.85*inch]
-        )
-        
-        transaction_table.setStyle(TableStyle([
-            # Header styling
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#343a40')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 8),
-            ('TOPPADDING', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 11),
-            ('LEFTPADDING', (0, 0), (-1, 0), 8),
-            ('RIGHTPADDING', (0, 0), (-1, 0), 8),
-            
-            # Data rows
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-            ('LEFTPADDING', (0, 1), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 1), (-1, -1), 8),
-            
-            # Alignment
-            ('ALIGN', (1, 1), (1, -1), 'CENTER'),  # Quantity
-            ('ALIGN', (2, 1), (4, -1), 'RIGHT'),   # Prices
-            ('ALIGN', (5, 1), (5, -1), 'CENTER'),  # Date
-            ('ALIGN', (6, 1), (6, -1), 'CENTER'),  # Status
-            
-            # Alternating row colors
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-            
-            # Grid
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            
-            # Box around entire table
-            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#adb5bd')),
-        ]))
-        
-        elements.append(transaction_table)
-    else:
+
+        # In parallel mode the rows after the heading are rendered by render_in_parallel
+        if not parallel:
+            rows = transaction_rows(sales, progress, total_sales)
+            if large is None:
+                large = total_sales > LARGE_REPORT_ROWS
+            if large:
+                # Drawn straight onto the canvas a page at a time
+                elements.append(TransactionRows(rows))
+            else:
+                elements.append(transaction_table(rows))
+    elif total_sales == 0:
         no_data_style = ParagraphStyle(
             'NoData', 
             fontSize=10,
@@ -338,19 +383,39 @@ def generate_sales_report(start_date, end_date, queryset=None):
         ))
     
     # ==================== FOOTER ====================
-    
-    elements.append(Spacer(1, 35))
-    
-    # Footer separator
+
+    generated_on = timezone.localtime(timezone.now()).strftime('%d %B %Y at %I:%M %p')
+    # In parallel mode it closes the last transaction segment
+    if not parallel:
+        elements.extend(report_footer(generated_on))
+
+    # ==================== BUILD PDF ====================
+
+    if parallel:
+        try:
+            render_in_parallel(elements, buffer, sales, total_sales, workers, generated_on, progress)
+            buffer.seek(0)
+            return buffer
+        except Exception:
+            # A broken pool (e.g. a worker killed for memory) shouldn't lose the report
+            logger.exception('Parallel rendering failed, rendering the sales report serially')
+            buffer.seek(0)
+            buffer.truncate()
+            return generate_sales_report(
+                start_date, end_date, queryset=queryset, output=buffer, large=large, progress=progress, workers=1, mode=mode,
+            )
+
+    doc.build(elements, onFirstPage=number_pages(), onLaterPages=number_pages())
+    buffer.seek(0)
+    return buffer
+
+
+def report_footer(generated_on):
+    """Separator and confidentiality note closing the report."""
     footer_line = Table([['']], colWidths=[7.3*inch])
     footer_line.setStyle(TableStyle([
         ('LINEABOVE', (0, 0), (-1, 0), 0.5, colors.HexColor('#dee2e6')),
     ]))
-    elements.append(footer_line)
-    elements.append(Spacer(1, 10))
-    
-    # Footer information
-    generated_on = timezone.localtime(timezone.now()).strftime('%d %B %Y at %I:%M %p')
     footer_style = ParagraphStyle(
         'Footer', 
         fontSize=7.5, 
@@ -359,17 +424,410 @@ def generate_sales_report(start_date, end_date, queryset=None):
         fontName='Helvetica',
         leading=10
     )
-    
     footer_text = f"""
     <b>Document Generated:</b> {generated_on}<br/>
     <i>CONFIDENTIAL - For Internal Use Only</i><br/>
     This report contains proprietary business information
     """
-    
-    elements.append(Paragraph(footer_text, footer_style))
-    
-    # ==================== BUILD PDF ====================
-    
-    doc.build(elements)
-    buffer.seek(0)
-    return buffer
\ No newline at end of file
+    return [Spacer(1, 35), footer_line, Spacer(1, 10), Paragraph(footer_text, footer_style)]
+
+
+# Indian Rupee formatting
+def format_inr(amount):
+    """Format amount in Indian Rupee with proper comma separation"""
+    return f"Rs. {amount:,.2f}"
+
+
+def transaction_rows(sales, progress=None, total=None):
+    """
+    Transaction table cells as text, streamed from the database in chunks.
+    ``progress(done, total)`` is called after every chunk and at the end.
+    """
+    rows = sales.values_list(*TRANSACTION_COLUMNS).iterator(chunk_size=TRANSACTION_CHUNK_SIZE)
+    for done, (stock_name, quantity_sold, selling_price, total_amount, sold_on, is_verified) in enumerate(rows, 1):
+        if progress and done % TRANSACTION_CHUNK_SIZE == 0:
+            progress(done, total)
+        status_icon = "✓" if is_verified else "○"
+        status_text = f"{status_icon} Verified" if is_verified else f"{status_icon} Pending"
+        yield (
+            stock_name,
+            str(quantity_sold),
+            format_inr(selling_price),
+            format_inr(total_amount),
+            timezone.localtime(sold_on).strftime('%d/%m/%y'),
+            status_text,
+        )
+    if progress:
+        progress(total, total)
+
+
+# ==================== TRANSACTION TABLE ====================
+
+TRANSACTION_HEADERS = ('PRODUCT', 'QTY', 'UNIT PRICE', 'AMOUNT', 'DATE', 'STATUS')
+TRANSACTION_ALIGNMENTS = (TA_LEFT, TA_CENTER, TA_RIGHT, TA_RIGHT, TA_CENTER, TA_CENTER)
+TRANSACTION_COL_WIDTHS = (1.8*inch, 0.5*inch, 0.95*inch, 0.95*inch, 0.95*inch, 0.7*inch)
+
+# Built once instead of once per cell
+TRANSACTION_HEADER_STYLES = {
+    alignment: ParagraphStyle(f'TH{alignment}', fontSize=8, fontName='Helvetica-Bold', textColor=colors.white, alignment=alignment)
+    for alignment in set(TRANSACTION_ALIGNMENTS)
+}
+TRANSACTION_CELL_STYLE = ParagraphStyle('TD', fontSize=8, fontName='Helvetica', leading=10)
+
+TRANSACTION_TABLE_STYLE = TableStyle([
+    # Header styling
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#343a40')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 8),
+    ('TOPPADDING', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 11),
+    ('LEFTPADDING', (0, 0), (-1, 0), 8),
+    ('RIGHTPADDING', (0, 0), (-1, 0), 8),
+
+    # Data rows
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ('LEFTPADDING', (0, 1), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 1), (-1, -1), 8),
+
+    # Alignment
+    ('ALIGN', (1, 1), (1, -1), 'CENTER'),  # Quantity
+    ('ALIGN', (2, 1), (4, -1), 'RIGHT'),   # Prices
+    ('ALIGN', (5, 1), (5, -1), 'CENTER'),  # Date
+    ('ALIGN', (6, 1), (6, -1), 'CENTER'),  # Status
+
+    # Alternating row colors
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
+
+    # Grid
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#dee2e6')),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+
+    # Box around entire table
+    ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#adb5bd')),
+])
+
+
+def transaction_table(rows):
+    """The transaction table as one ReportLab Table, for regular sized reports."""
+    transaction_data = [[
+        Paragraph(f'<b>{header}</b>', TRANSACTION_HEADER_STYLES[alignment])
+        for header, alignment in zip(TRANSACTION_HEADERS, TRANSACTION_ALIGNMENTS)
+    ]]
+    for stock_name, *cells in rows:
+        transaction_data.append([Paragraph(stock_name, TRANSACTION_CELL_STYLE), *cells])
+
+    transaction_table = Table(
+        transaction_data,
+        repeatRows=1,
+        colWidths=[1.8*inch, 0.5*inch, 0.95*inch, 0.95*inch, 0.95*inch, 0.7*inch, 0.85*inch]
+    )
+    transaction_table.setStyle(TRANSACTION_TABLE_STYLE)
+    return transaction_table
+
+
+class TransactionRows(Flowable):
+    """
+    Transaction table for large reports, drawn directly on the canvas.
+
+    Rows are pulled from an iterator one page at a time: when the rows left
+    don't fit, the flowable splits into a page worth of rows and a new
+    TransactionRows for the rest. Only one page of rows is ever held, and
+    every row is laid out exactly once, with no per-cell Paragraphs.
+
+    ``columns`` (headers, alignments, relative widths) draws other tables,
+    such as the summaries, the same way.
+    """
+
+    HEADER_HEIGHT = 22
+    ROW_HEIGHT = 16
+    PADDING = 6
+    FONT_SIZE = 8
+
+    def __init__(self, rows, buffered=None, columns=None):
+        super().__init__()
+        self.rows = rows
+        self.buffered = buffered or []
+        self.columns = columns or (TRANSACTION_HEADERS, TRANSACTION_ALIGNMENTS, TRANSACTION_COL_WIDTHS)
+
+    def rows_fitting(self, height):
+        return max(int((height - self.HEADER_HEIGHT) // self.ROW_HEIGHT), 0)
+
+    def fill(self, count):
+        while self.rows is not None and len(self.buffered) < count:
+            row = next(self.rows, None)
+            if row is None:
+                self.rows = None
+            else:
+                self.buffered.append(row)
+
+    def wrap(self, availWidth, availHeight):
+        # One row more than fits tells whether this is the last piece
+        self.fill(self.rows_fitting(availHeight) + 1)
+        self.width = availWidth
+        self.height = self.HEADER_HEIGHT + len(self.buffered) * self.ROW_HEIGHT
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        fitting = self.rows_fitting(availHeight)
+        if not fitting:
+            return []
+        self.fill(fitting + 1)
+        if len(self.buffered) <= fitting:
+            return [self]
+        return [
+            TransactionRows(None, self.buffered[:fitting], self.columns),
+            TransactionRows(self.rows, self.buffered[fitting:], self.columns),
+        ]
+
+    def draw(self):
+        canv = self.canv
+        headers, alignments, col_widths = self.columns
+        scale = self.width / sum(col_widths)
+        widths = [width * scale for width in col_widths]
+        lefts = [sum(widths[:i]) for i in range(len(widths))]
+
+        def draw_cells(cells, baseline, font):
+            canv.setFont(font, self.FONT_SIZE)
+            for text, alignment, left, width in zip(cells, alignments, lefts, widths):
+                if alignment == TA_LEFT:
+                    canv.drawString(left + self.PADDING, baseline, fit_text(text, font, self.FONT_SIZE, width - 2 * self.PADDING))
+                elif alignment == TA_RIGHT:
+                    canv.drawRightString(left + width - self.PADDING, baseline, text)
+                else:
+                    canv.drawCentredString(left + width / 2, baseline, text)
+
+        # Header
+        top = self.height - self.HEADER_HEIGHT
+        canv.setFillColor(colors.HexColor('#343a40'))
+        canv.rect(0, top, self.width, self.HEADER_HEIGHT, stroke=0, fill=1)
+        canv.setFillColor(colors.white)
+        draw_cells(headers, top + 8, 'Helvetica-Bold')
+
+        # Rows with alternating backgrounds
+        for index, cells in enumerate(self.buffered):
+            bottom = top - (index + 1) * self.ROW_HEIGHT
+            if index % 2:
+                canv.setFillColor(colors.HexColor('#f8f9fa'))
+                canv.rect(0, bottom, self.width, self.ROW_HEIGHT, stroke=0, fill=1)
+            canv.setFillColor(colors.HexColor('#212529'))
+            draw_cells(cells, bottom + 5, 'Helvetica')
+
+        # Grid and box
+        canv.setStrokeColor(colors.HexColor('#dee2e6'))
+        canv.setLineWidth(0.5)
+        for index in range(1, len(self.buffered) + 1):
+            canv.line(0, top - index * self.ROW_HEIGHT, self.width, top - index * self.ROW_HEIGHT)
+        for left in lefts[1:]:
+            canv.line(left, 0, left, self.height)
+        canv.setStrokeColor(colors.HexColor('#adb5bd'))
+        canv.setLineWidth(1)
+        canv.rect(0, 0, self.width, self.height, stroke=1, fill=0)
+
+
+# ==================== SUMMARY TABLES ====================
+
+SUMMARY_MEASURE_HEADERS = ('TRANSACTIONS', 'UNITS', 'REVENUE', 'PROFIT', 'MARGIN')
+SUMMARY_MEASURE_ALIGNMENTS = (TA_RIGHT,) * 5
+SUMMARY_MEASURE_WIDTHS = (0.9*inch, 0.7*inch, 1.2*inch, 1.2*inch, 0.7*inch)
+
+SUMMARY_COLUMNS = {
+    mode: (headers + SUMMARY_MEASURE_HEADERS, alignments + SUMMARY_MEASURE_ALIGNMENTS, widths + SUMMARY_MEASURE_WIDTHS)
+    for mode, headers, alignments, widths in (
+        ('day', ('DATE',), (TA_CENTER,), (1.2*inch,)),
+        ('category', ('CATEGORY',), (TA_LEFT,), (1.8*inch,)),
+        ('product', ('PRODUCT', 'CATEGORY'), (TA_LEFT, TA_LEFT), (1.8*inch, 1.1*inch)),
+    )
+}
+
+# Sales fields each summary groups by, for reports of a given queryset
+SALES_SUMMARY_GROUPS = {
+    'day': ('day',),
+    'category': ('stock__category__name',),
+    'product': ('stock__name', 'stock__category__name'),
+}
+
+
+def summary_groups(mode, start_date, end_date, queryset=None):
+    """
+    ``(*group, count, quantity, revenue, profit)`` per day, category or
+    product: from the daily rollup for a date range, or grouped over
+    ``queryset`` when the report is for one.
+    """
+    if queryset is None:
+        return grouped_totals(start_date, end_date, mode)
+
+    fields = SALES_SUMMARY_GROUPS[mode]
+    sales = queryset.order_by()
+    if mode == 'day':
+        sales = sales.annotate(day=TruncDate('sold_on', tzinfo=timezone.get_current_timezone()))
+    ordering = fields if mode == 'day' else ('-revenue', *fields)
+    return sales.values(*fields).annotate(
+        count=Count('id'),
+        quantity=Sum('quantity_sold'),
+        revenue=Sum('total_amount'),
+        profit=Sum('gross_profit'),
+    ).order_by(*ordering).values_list(*fields, 'count', 'quantity', 'revenue', 'profit')
+
+
+def summary_rows(mode, groups):
+    """Summary table cells as text."""
+    for *labels, count, quantity, revenue, profit in groups:
+        if mode == 'day':
+            labels = [labels[0].strftime('%d %b %Y')]
+        yield (
+            *(label or '-' for label in labels),
+            f"{count:,}",
+            f"{quantity:,}",
+            format_inr(revenue),
+            format_inr(profit),
+            f"{profit / revenue * 100:.1f}%" if revenue else '-',
+        )
+
+
+def number_pages(first_page=1):
+    """``onPage`` callback printing page numbers, counting from ``first_page``."""
+    def draw(canv, doc):
+        canv.saveState()
+        canv.setFont('Helvetica', 7.5)
+        canv.setFillColor(colors.HexColor('#868e96'))
+        canv.drawCentredString(doc.pagesize[0] / 2, 0.45*inch, f"Page {first_page + canv.getPageNumber() - 1}")
+        canv.restoreState()
+    return draw
+
+
+# ==================== PARALLEL RENDERING ====================
+
+def rows_per_page():
+    """Transaction rows on every page of a document holding only TransactionRows."""
+    doc = SimpleDocTemplate(BytesIO(), **REPORT_PAGE_OPTIONS)
+    # SimpleDocTemplate's frame has 6pt padding at the top and bottom
+    return TransactionRows(None).rows_fitting(doc.height - 12)
+
+
+class LeadingRows(TransactionRows):
+    """
+    The first transaction rows, under the summary: as many as fit on the
+    summary's last page (a whole next page if none do), as the serial
+    layout has them. The rest are dropped and left to the segments;
+    ``drawn`` is how many rows were drawn.
+    """
+    drawn = 0
+
+    def split(self, availWidth, availHeight):
+        fitting = self.rows_fitting(availHeight)
+        if not fitting:
+            return []
+        self.fill(fitting)
+        del self.buffered[fitting:]
+        self.rows = None
+        return [self]
+
+    def draw(self):
+        self.drawn = len(self.buffered)
+        super().draw()
+
+
+def after_key(sales, key):
+    """``sales`` after the ``(sold_on, id)`` key ``key`` in report order."""
+    sold_on, pk = key
+    return sales.filter(Q(sold_on__lt=sold_on) | Q(sold_on=sold_on, id__lt=pk))
+
+
+def segment_bounds(sales, segment_rows):
+    """
+    Cut ``sales`` (in report order) into segments of ``segment_rows``
+    transactions, reading their ``(sold_on, id)`` keys in one query. Returns
+    ``[(first, last, count)]`` keys of each segment's first and last row and
+    the highest id seen, which bounds every segment so rows written since
+    can't shift them.
+    """
+    segments, max_id = [], 0
+    keys = sales.values_list('sold_on', 'id').iterator(chunk_size=TRANSACTION_CHUNK_SIZE)
+    for n, key in enumerate(keys):
+        if n % segment_rows == 0:
+            segments.append([key, key, 0])
+        segment = segments[-1]
+        segment[1] = key
+        segment[2] += 1
+        max_id = max(max_id, key[1])
+    return [tuple(segment) for segment in segments], max_id
+
+
+def render_in_parallel(elements, buffer, sales, total_sales, workers, generated_on, progress=None):
+    """
+    Render a large date range report in several processes and write it to
+    ``buffer``, page for page as ``generate_sales_report`` lays it out in
+    one process.
+
+    The summary (``elements``, built up to the transaction heading) is laid
+    out here followed by the transaction rows fitting under it
+    (``LeadingRows``). The remaining transactions of ``sales`` are cut into
+    contiguous segments of whole pages, each rendered to its own PDF by a
+    worker process; the last one ends with the footer. Segments are bounded
+    by the ``(sold_on, id)`` keys of their first and last rows, read here in
+    one query, so a worker reads exactly its rows whatever was written
+    since. Every transaction page after the summary holds the same number of
+    rows, so each segment knows its first page number before anything is
+    rendered, and the segments are concatenated in order.
+    """
+    per_page = rows_per_page()
+
+    with tempfile.TemporaryDirectory() as staging:
+        # At most a page of rows goes under the summary
+        lead_keys = list(sales.values_list('sold_on', 'id')[:per_page])
+        lead = LeadingRows(transaction_rows(report_segments.segment_sales(
+            lead_keys[0], lead_keys[-1], max(pk for _, pk in lead_keys),
+        )))
+        summary_path = os.path.join(staging, 'summary.pdf')
+        summary = SimpleDocTemplate(summary_path, **REPORT_PAGE_OPTIONS)
+        summary.build([*elements, lead], onFirstPage=number_pages(), onLaterPages=number_pages())
+        first_transaction_page = summary.page + 1
+
+        # Planned from the count; the keys read below decide the actual segments
+        pages = math.ceil((total_sales - lead.drawn) / per_page)
+        segment_rows = per_page * math.ceil(pages / (workers * SEGMENTS_PER_WORKER))
+        bounds, max_id = segment_bounds(after_key(sales, lead_keys[lead.drawn - 1]), segment_rows)
+        if not bounds:
+            # Everything fitted under the summary, where the footer isn't
+            raise ValueError('No transactions left to render in parallel')
+        total = lead.drawn + sum(count for _, _, count in bounds)
+
+        paths = [os.path.join(staging, f'{n:06d}.pdf') for n in range(len(bounds))]
+
+        # Spawned rather than forked: the caller may be a thread of a web worker
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'), initializer=report_segments.setup_django,
+        ) as executor:
+            futures = [
+                executor.submit(
+                    report_segments.render_segment, first, last, max_id, count,
+                    first_transaction_page + n * segment_rows // per_page, path,
+                    generated_on if n == len(bounds) - 1 else None,
+                )
+                for n, ((first, last, count), path) in enumerate(zip(bounds, paths))
+            ]
+            done = lead.drawn
+            for future in as_completed(futures):
+                done += future.result()
+                if progress:
+                    progress(done, total)
+
+        writer = PdfWriter()
+        writer.append(summary_path)
+        for path in paths:
+            writer.append(path)
+        writer.add_metadata({'/Title': REPORT_PAGE_OPTIONS['title'], '/Author': REPORT_PAGE_OPTIONS['author']})
+        writer.write(buffer)
+
+
+def fit_text(text, font, size, width):
+    """``text`` shortened with an ellipsis to fit ``width`` points."""
+    if stringWidth(text, font, size) <= width:
+        return text
+    while text and stringWidth(text + '...', font, size) > width:
+        text = text[:-1]
+    return text + '...'
@@ -0,0 +1,237 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db import IntegrityError, transaction
+from django.db.models import Sum, Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from inventory.models import Stock
+from .dates import local_date, local_day_start
+from .models import Sales, SalesDailyRollup
+
+ROLLUP_COLUMNS = (
+    'verified_quantity', 'verified_revenue', 'verified_profit', 'verified_count',
+    'unverified_quantity', 'unverified_revenue', 'unverified_profit', 'unverified_count',
+)
+
+# Aggregates over Sales that produce one rollup row per (day, stock) group
+ROLLUP_AGGREGATES = {
+    'verified_quantity': Sum('quantity_sold', filter=Q(is_verified=True), default=0),
+    'verified_revenue': Sum('total_amount', filter=Q(is_verified=True), default=0),
+    'verified_profit': Sum('gross_profit', filter=Q(is_verified=True), default=0),
+    'verified_count': Count('id', filter=Q(is_verified=True)),
+    'unverified_quantity': Sum('quantity_sold', filter=Q(is_verified=False), default=0),
+    'unverified_revenue': Sum('total_amount', filter=Q(is_verified=False), default=0),
+    'unverified_profit': Sum('gross_profit', filter=Q(is_verified=False), default=0),
+    'unverified_count': Count('id', filter=Q(is_verified=False)),
+}
+
+BULK_CHUNK_SIZE = 1000
+
+
+# ==================== INCREMENTAL MAINTENANCE ====================
+
+def sale_contribution(state):
+    """
+    Rollup key and column values contributed by one sale, given its
+    ``Sales.tracked_state()``.
+    """
+    prefix = 'verified' if state['is_verified'] else 'unverified'
+    key = (local_date(state['sold_on']), state['stock_id'])
+    return key, {
+        f'{prefix}_quantity': state['quantity_sold'],
+        f'{prefix}_revenue': state['total_amount'],
+        f'{prefix}_profit': state['gross_profit'],
+        f'{prefix}_count': 1,
+    }
+
+
+def sale_deltas(old_state, new_state):
+    """
+    Per rollup key column deltas for a sale going from ``old_state`` to
+    ``new_state`` (``None`` for a created or deleted sale). No-op changes
+    produce no entries.
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None or state['sold_on'] is None:
+            continue
+        key, values = sale_contribution(state)
+        for column, value in values.items():
+            deltas[key][column] += sign * value
+
+    return {
+        key: {column: value for column, value in columns.items() if value}
+        for key, columns in deltas.items()
+        if any(columns.values())
+    }
+
+
+def apply_rollup_delta(day, stock_id, deltas):
+    """Atomically add ``deltas`` to the (day, stock) rollup row, creating it if needed."""
+    updates = {column: F(column) + value for column, value in deltas.items()}
+    rows = SalesDailyRollup.objects.filter(date=day, stock_id=stock_id)
+    if rows.update(**updates):
+        return
+
+    # A missing row with only negative deltas belongs to a stock being deleted
+    if not any(value > 0 for value in deltas.values()):
+        return
+
+    category_id = Stock.objects.filter(pk=stock_id).values_list('category_id', flat=True).first()
+    if category_id is None:
+        return
+    try:
+        with transaction.atomic():
+            SalesDailyRollup.objects.create(date=day, stock_id=stock_id, category_id=category_id, **deltas)
+    except IntegrityError:
+        # Created concurrently by another writer
+        rows.update(**updates)
+
+
+def recompute_rollup(keys):
+    """
+    Recompute the rollup rows for a set of (local day, stock id) keys from
+    Sales with one grouped query, e.g. after a deferred bulk operation.
+    """
+    keys = set(keys)
+    days = sorted({day for day, _ in keys})
+    stock_ids = {stock_id for _, stock_id in keys}
+
+    rows = Sales.objects.filter(
+        stock_id__in=stock_ids,
+        sold_on__gte=local_day_start(days[0]),
+        sold_on__lt=local_day_start(days[-1] + timedelta(days=1)),
+    ).annotate(
+        day=TruncDate('sold_on', tzinfo=timezone.get_current_timezone())
+    ).filter(day__in=days).values('day', 'stock_id', 'stock__category_id').annotate(**ROLLUP_AGGREGATES).order_by()
+    computed = {(row['day'], row['stock_id']): row for row in rows}
+
+    existing = {
+        (rollup.date, rollup.stock_id): rollup
+        for rollup in SalesDailyRollup.objects.filter(date__in=days, stock_id__in=stock_ids)
+    }
+
+    to_update = []
+    to_create = []
+    to_delete = []
+    for key in keys:
+        row = computed.get(key)
+        rollup = existing.get(key)
+        if row is None:
+            if rollup is not None:
+                to_delete.append(rollup.pk)
+            continue
+        if rollup is None:
+            rollup = SalesDailyRollup(date=key[0], stock_id=key[1])
+            to_create.append(rollup)
+        else:
+            to_update.append(rollup)
+        rollup.category_id = row['stock__category_id']
+        for column in ROLLUP_COLUMNS:
+            setattr(rollup, column, row[column])
+
+    with transaction.atomic():
+        SalesDailyRollup.objects.filter(pk__in=to_delete).delete()
+        SalesDailyRollup.objects.bulk_update(to_update, ('category',) + ROLLUP_COLUMNS, batch_size=BULK_CHUNK_SIZE)
+        SalesDailyRollup.objects.bulk_create(to_create, batch_size=BULK_CHUNK_SIZE)
+
+
+# ==================== REBUILD ====================
+
+def rebuild_rollup(start_date=None, end_date=None):
+    """
+    Recompute rollup rows from Sales for local dates between ``start_date``
+    and ``end_date`` (both inclusive, open-ended when ``None``) with one
+    grouped query. Returns the number of rows written.
+    """
+    sales = Sales.objects.all()
+    rollups = SalesDailyRollup.objects.all()
+    if start_date:
+        sales = sales.filter(sold_on__gte=local_day_start(start_date))
+        rollups = rollups.filter(date__gte=start_date)
+    if end_date:
+        sales = sales.filter(sold_on__lt=local_day_start(end_date + timedelta(days=1)))
+        rollups = rollups.filter(date__lte=end_date)
+
+    rows = sales.annotate(
+        day=TruncDate('sold_on', tzinfo=timezone.get_current_timezone())
+    ).values('day', 'stock_id', 'stock__category_id').annotate(**ROLLUP_AGGREGATES).order_by()
+
+    written = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=BULK_CHUNK_SIZE):
+            batch.append(SalesDailyRollup(
+                date=row['day'],
+                stock_id=row['stock_id'],
+                category_id=row['stock__category_id'],
+                **{column: row[column] for column in ROLLUP_COLUMNS}
+            ))
+            if len(batch) >= BULK_CHUNK_SIZE:
+                SalesDailyRollup.objects.bulk_create(batch)
+                written += len(batch)
+                batch = []
+        SalesDailyRollup.objects.bulk_create(batch)
+        written += len(batch)
+    return written
+
+
+# ==================== READS ====================
+
+def rollup_range(start_date, end_date):
+    """Rollup rows for local dates between ``start_date`` and ``end_date`` (inclusive)."""
+    return SalesDailyRollup.objects.filter(date__gte=start_date, date__lte=end_date)
+
+
+def sales_totals(start_date, end_date, rollups=None):
+    """
+    Verified, unverified and combined quantity, revenue, profit and
+    transaction count for a local date range, read from the rollup.
+    """
+    if rollups is None:
+        rollups = rollup_range(start_date, end_date)
+    totals = rollups.aggregate(**{column: Sum(column) for column in ROLLUP_COLUMNS})
+    totals = {column: value or 0 for column, value in totals.items()}
+
+    for measure in ('quantity', 'revenue', 'profit', 'count'):
+        totals[f'total_{measure}'] = totals[f'verified_{measure}'] + totals[f'unverified_{measure}']
+    return totals
+
+
+def top_products(start_date, end_date, limit=5, verified_only=True):
+    """Best selling stock items by quantity for a local date range."""
+    quantity = F('verified_quantity') if verified_only else F('verified_quantity') + F('unverified_quantity')
+    revenue = F('verified_revenue') if verified_only else F('verified_revenue') + F('unverified_revenue')
+    return list(rollup_range(start_date, end_date).values(
+        'stock__name',
+        'stock__category__name'
+    ).annotate(
+        total_sold=Sum(quantity),
+        revenue=Sum(revenue)
+    ).filter(total_sold__gt=0).order_by('-total_sold')[:limit])
+
+
+# Rollup columns each summary report groups by
+SUMMARY_GROUPS = {
+    'day': ('date',),
+    'category': ('category__name',),
+    'product': ('stock__name', 'category__name'),
+}
+
+
+def grouped_totals(start_date, end_date, group):
+    """
+    Transaction count, quantity, revenue and profit (verified and
+    unverified together) for a local date range, one row per day, category
+    or product as given by ``group`` (a key of ``SUMMARY_GROUPS``). Days
+    come in date order, the others by revenue, highest first.
+    """
+    fields = SUMMARY_GROUPS[group]
+    ordering = fields if group == 'day' else ('-revenue', *fields)
+    return rollup_range(start_date, end_date).values(*fields).annotate(
+        count=Sum(F('verified_count') + F('unverified_count')),
+        quantity=Sum(F('verified_quantity') + F('unverified_quantity')),
+        revenue=Sum(F('verified_revenue') + F('unverified_revenue')),
+        profit=Sum(F('verified_profit') + F('unverified_profit')),
+    ).filter(count__gt=0).order_by(*ordering).values_list(*fields, 'count', 'quantity', 'revenue', 'profit')
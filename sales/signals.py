@@ -0,0 +1,37 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from inventory.models import Stock
+from utility.recompute import defer, register
+from .models import Sales, SalesDailyRollup
+from .rollups import apply_rollup_delta, recompute_rollup, sale_deltas
+
+register('sales.rollup', recompute_rollup)
+
+
+def apply_sale_change(old_state, new_state):
+    deltas = sale_deltas(old_state, new_state)
+    if defer('sales.rollup', deltas):
+        return
+    for (day, stock_id), columns in deltas.items():
+        apply_rollup_delta(day, stock_id, columns)
+
+
+@receiver(post_save, sender=Sales)
+def update_rollup_on_save(sender, instance, created, **kwargs):
+    old_state = None if created else getattr(instance, 'previous_state', None)
+    apply_sale_change(old_state, instance.tracked_state())
+
+
+@receiver(post_delete, sender=Sales)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    old_state = getattr(instance, 'previous_state', None) or instance.tracked_state()
+    apply_sale_change(old_state, None)
+
+
+@receiver(post_save, sender=Stock)
+def update_rollup_category(sender, instance, created, **kwargs):
+    # Keep the denormalized category in step when a stock item is recategorized
+    if not created:
+        SalesDailyRollup.objects.filter(stock=instance).exclude(
+            category_id=instance.category_id
+        ).update(category_id=instance.category_id)
@@ -1,3 +1,613 @@
-from django.test import TestCase
+import tempfile
+from concurrent.futures import Future
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock, skipIf
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.messages import get_messages
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import OperationalError, connection
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from reportlab.platypus import SimpleDocTemplate
+from inventory import services
+from inventory.models import Category, Stock, StockMovement
+from utility.recompute import _handlers
+from utility.testing import DerivedDataAssertions
+from . import jobs, reports
+from .dates import local_date, local_day_start
+from .models import ReportJob, Sales
+from .report_cache import report_cache_key
+from .report_segments import segment_sales
+from .reports import (
+    REPORT_PAGE_OPTIONS, PdfWriter, TransactionRows, generate_sales_report, rows_per_page, segment_bounds, transaction_rows,
+)
 
-# Create your tests here.
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+
+class ReportSegmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='clerk', password='clerk')
+        stock = Stock.objects.create(user=user, category=Category.objects.create(name='Shirts'), name='Shirt', selling_price=150, quantity=100)
+        cls.stock = stock
+        # Three sales at each of three instants, so segments split ties
+        cls.day = timezone.localdate() - timedelta(days=1)
+        for hour in (9, 12, 15):
+            ids = [Sales.objects.create(stock=stock, quantity_sold=1).pk for _ in range(3)]
+            Sales.objects.filter(pk__in=ids).update(sold_on=local_day_start(cls.day) + timedelta(hours=hour))
+
+    def report_sales(self):
+        return Sales.objects.filter(
+            sold_on__gte=local_day_start(self.day), sold_on__lt=local_day_start(self.day + timedelta(days=1)),
+        ).order_by('-sold_on', '-id')
+
+    def test_segments_cover_every_row_once(self):
+        expected = list(self.report_sales().values_list('id', flat=True))
+        bounds, max_id = segment_bounds(self.report_sales(), 2)
+        self.assertEqual([count for _, _, count in bounds], [2, 2, 2, 2, 1])
+
+        # Rows written after the bounds were read stay out of every segment
+        late = Sales.objects.create(stock=self.stock, quantity_sold=1)
+        Sales.objects.filter(pk=late.pk).update(sold_on=bounds[1][0][0])
+
+        segments = [list(segment_sales(first, last, max_id).values_list('id', flat=True)) for first, last, _ in bounds]
+        self.assertEqual([len(ids) for ids in segments], [count for _, _, count in bounds])
+        self.assertEqual([pk for ids in segments for pk in ids], expected)
+
+
+class TransactionRowIteratorTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='clerk', password='clerk')
+        category = Category.objects.create(name='Shirts')
+        cls.shirt = Stock.objects.create(user=user, category=category, name='Shirt', cost_price=100, selling_price=1500, quantity=100)
+        cls.tie = Stock.objects.create(user=user, category=category, name='Tie', cost_price=20, selling_price=49.5, quantity=100)
+        cls.day = timezone.localdate() - timedelta(days=1)
+        for stock, quantity, hour, is_verified in ((cls.shirt, 2, 9, True), (cls.tie, 3, 12, False), (cls.shirt, 1, 0.5, True)):
+            sale = Sales.objects.create(stock=stock, quantity_sold=quantity, is_verified=is_verified)
+            sale.sold_on = local_day_start(cls.day) + timedelta(hours=hour)
+            sale.save()
+
+    def sales(self):
+        return Sales.objects.order_by('-sold_on', '-id')
+
+    def test_cells(self):
+        day = self.day.strftime('%d/%m/%y')
+        self.assertEqual(list(transaction_rows(self.sales())), [
+            ('Tie', '3', 'Rs. 49.50', 'Rs. 148.50', day, '○ Pending'),
+            ('Shirt', '2', 'Rs. 1,500.00', 'Rs. 3,000.00', day, '✓ Verified'),
+            # 00:30 local, the previous day in UTC
+            ('Shirt', '1', 'Rs. 1,500.00', 'Rs. 1,500.00', day, '✓ Verified'),
+        ])
+
+    @mock.patch.object(reports, 'TRANSACTION_CHUNK_SIZE', 2)
+    def test_streams_only_the_columns(self):
+        progress = mock.Mock()
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(transaction_rows(self.sales(), progress, 3))
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(progress.call_args_list, [mock.call(2, 3), mock.call(3, 3)])
+        # One query, one join for the name, none of the columns the table doesn't show
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql']
+        self.assertEqual(sql.count(' JOIN '), 1)
+        for column in ('gross_profit', 'stock_id"', 'cost_price', 'category_id'):
+            self.assertNotIn(column, sql.split(' FROM ')[0])
+
+
+class TransactionRowsFlowableTests(SimpleTestCase):
+
+    @staticmethod
+    def cells(count):
+        return [(f'Item {n}', '1', 'Rs. 1.00', 'Rs. 1.00', '01/01/26', '✓ Verified') for n in range(count)]
+
+    def test_split(self):
+        height = TransactionRows.HEADER_HEIGHT + 3.5 * TransactionRows.ROW_HEIGHT
+        rows = TransactionRows(iter(self.cells(5)))
+        self.assertEqual(rows.split(500, TransactionRows.HEADER_HEIGHT + 10), [])
+
+        first, rest = rows.split(500, height)
+        self.assertEqual([row[0] for row in first.buffered], ['Item 0', 'Item 1', 'Item 2'])
+        self.assertIsNone(first.rows)
+        # The rest keeps the one row read ahead and the unread ones
+        self.assertEqual(rest.split(500, height), [rest])
+        self.assertEqual([row[0] for row in rest.buffered], ['Item 3', 'Item 4'])
+
+    def test_reads_a_page_at_a_time(self):
+        per_page = rows_per_page()
+        total = per_page * 2 + 5
+        read = []
+
+        def rows():
+            for cells in self.cells(total):
+                read.append(cells)
+                yield cells
+
+        drawn = []
+        draw = TransactionRows.draw
+
+        def record(flowable):
+            drawn.append((len(flowable.buffered), len(read)))
+            draw(flowable)
+
+        doc = SimpleDocTemplate(BytesIO(), **REPORT_PAGE_OPTIONS)
+        with mock.patch.object(TransactionRows, 'draw', record):
+            doc.build([TransactionRows(rows())])
+
+        self.assertEqual(doc.page, 3)
+        self.assertEqual([count for count, _ in drawn], [per_page, per_page, 5])
+        # Never more than the page being drawn and one row ahead
+        done = 0
+        for count, read_so_far in drawn:
+            done += count
+            self.assertLessEqual(read_so_far, done + 1)
+
+
+class InlineExecutor:
+    """``ProcessPoolExecutor`` stand-in running each task on submit, in this process."""
+
+    def __init__(self, max_workers=None, mp_context=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+@skipIf(PdfWriter is None, 'pypdf is not installed')
+@mock.patch('sales.reports.ProcessPoolExecutor', InlineExecutor)
+@mock.patch('sales.reports.PARALLEL_REPORT_ROWS', 1)
+class ParallelReportTests(TestCase):
+    """Reports rendered in segments read page for page like serial ones."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='clerk', password='clerk')
+        stock = Stock.objects.create(user=user, category=Category.objects.create(name='Shirts'), name='Shirt', selling_price=150, quantity=1000)
+        cls.end = timezone.localdate() - timedelta(days=1)
+        cls.start = cls.end - timedelta(days=4)
+        # Four and a half pages of transactions, a few sharing an instant
+        for n in range(rows_per_page() * 9 // 2):
+            sale = Sales.objects.create(stock=stock, quantity_sold=1 + n % 3)
+            # Saved rather than updated, so the rollup behind the totals follows
+            sale.sold_on = local_day_start(cls.start + timedelta(days=n % 5)) + timedelta(hours=9, minutes=n // 4)
+            sale.save()
+
+    def pages(self, workers):
+        report = generate_sales_report(self.start, self.end, output=BytesIO(), large=True, workers=workers, mode='transactions')
+        return [
+            [line for line in page.extract_text().splitlines() if 'Generated' not in line]
+            for page in PdfReader(report).pages
+        ]
+
+    def test_same_pages_as_serial(self):
+        # Not quietly rendered serially after a failure
+        with mock.patch('sales.reports.render_in_parallel', wraps=reports.render_in_parallel) as render, \
+                self.assertNoLogs(reports.logger, 'ERROR'):
+            parallel = self.pages(workers=2)
+        render.assert_called_once()
+        serial = self.pages(workers=1)
+
+        self.assertGreater(len(serial), 4)
+        self.assertEqual(len(parallel), len(serial))
+        for number, (got, expected) in enumerate(zip(parallel, serial), 1):
+            self.assertEqual(got, expected, f'page {number}')
+
+
+class VerifySaleMixin:
+
+    @classmethod
+    def create_stock(cls):
+        cls.user = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='admin')
+        category = Category.objects.create(name='Shirts')
+        cls.shirt = Stock.objects.create(user=cls.user, category=category, name='Shirt', cost_price=100, selling_price=150, quantity=5)
+        cls.tie = Stock.objects.create(user=cls.user, category=category, name='Tie', cost_price=20, selling_price=50, quantity=10)
+
+    def verify(self, sales):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('admin:sales_sales_changelist'), {
+            'action': 'verify_sale', '_selected_action': [sale.pk for sale in sales],
+        })
+        return [str(message) for message in get_messages(response.wsgi_request)]
+
+
+class VerifySaleTests(VerifySaleMixin, DerivedDataAssertions, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_stock()
+
+    def test_verify(self):
+        sales = [Sales.objects.create(stock=self.tie, quantity_sold=quantity) for quantity in (2, 3)]
+        self.assertEqual(self.verify(sales), ['Successfully verified 2 sales.'])
+
+        self.assertFalse(Sales.objects.filter(is_verified=False).exists())
+        self.assertEqual(Stock.objects.get(pk=self.tie.pk).quantity, 5)
+        self.assertEqual(
+            sorted(StockMovement.objects.filter(kind=StockMovement.SALE).values_list('reference', 'quantity')),
+            [(sales[0].pk, -2), (sales[1].pk, -3)],
+        )
+        self.assertDerivedConsistent()
+
+    def test_one_payments_recompute_per_batch(self):
+        sales = [Sales.objects.create(stock=self.tie, quantity_sold=1) for _ in range(5)]
+        recompute_days = mock.Mock(wraps=_handlers['payments.days'])
+        with mock.patch.dict(_handlers, {'payments.days': recompute_days}):
+            self.verify(sales)
+
+        recompute_days.assert_called_once_with({local_date(sale.sold_on) for sale in sales})
+        self.assertPaymentsConsistent()
+
+    def test_skip_shortages(self):
+        # 7 shirts wanted, 5 in stock: both shirt sales stay unverified
+        shirts = [Sales.objects.create(stock=self.shirt, quantity_sold=quantity) for quantity in (3, 4)]
+        tie = Sales.objects.create(stock=self.tie, quantity_sold=2)
+        self.assertEqual(self.verify([*shirts, tie]), ['Successfully verified 1 sales.'])
+
+        self.assertEqual(list(Sales.objects.filter(is_verified=True).values_list('pk', flat=True)), [tie.pk])
+        self.assertEqual(Stock.objects.get(pk=self.shirt.pk).quantity, 5)
+        self.assertEqual(Stock.objects.get(pk=self.tie.pk).quantity, 8)
+        self.assertDerivedConsistent()
+
+    def test_reprices_from_stock(self):
+        sales = [Sales.objects.create(stock=stock, quantity_sold=2) for stock in (self.shirt, self.tie)]
+        for stock, prices in ((self.shirt, {'selling_price': 180}), (self.tie, {'selling_price': 60, 'cost_price': 25})):
+            stock = Stock.objects.get(pk=stock.pk)
+            for field, price in prices.items():
+                setattr(stock, field, price)
+            stock.save()
+        self.verify(sales)
+
+        self.assertEqual(
+            sorted(Sales.objects.values_list('stock_id', 'selling_price', 'total_amount', 'gross_profit')),
+            sorted([(self.shirt.pk, 180, 360, 160), (self.tie.pk, 60, 120, 70)]),
+        )
+        self.assertDerivedConsistent()
+
+
+@mock.patch.object(services, 'STOCK_RETRY_DELAY', 0)
+class VerifySaleRetryTests(VerifySaleMixin, DerivedDataAssertions, TransactionTestCase):
+    """The verify action outside a test transaction, so it can retry."""
+
+    def setUp(self):
+        self.create_stock()
+
+    def interfering_reads(self, times):
+        """``read_stocks`` that sells a tie behind the caller's back the first ``times`` calls."""
+        read_stocks = services.read_stocks
+        calls = []
+
+        def read(stock_ids):
+            stocks = read_stocks(stock_ids)
+            calls.append(stock_ids)
+            if len(calls) <= times:
+                # Another writer, between this read and the UPDATE
+                Stock.objects.filter(pk=self.tie.pk).update(quantity=F('quantity') - 1, version=F('version') + 1)
+            return stocks
+        return mock.patch.object(services, 'read_stocks', read), calls
+
+    def test_retries_after_conflict(self):
+        sale = Sales.objects.create(stock=self.tie, quantity_sold=2)
+        patch, calls = self.interfering_reads(1)
+        with patch:
+            self.assertEqual(self.verify([sale]), ['Successfully verified 1 sales.'])
+
+        # The first attempt was rolled back, the interfering write with it
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Stock.objects.get(pk=self.tie.pk).quantity, 8)
+        self.assertTrue(Sales.objects.get(pk=sale.pk).is_verified)
+        self.assertEqual(StockMovement.objects.filter(kind=StockMovement.SALE).count(), 1)
+        self.assertDerivedConsistent()
+
+    def test_gives_up_after_the_last_attempt(self):
+        sale = Sales.objects.create(stock=self.tie, quantity_sold=2)
+        patch, calls = self.interfering_reads(services.STOCK_WRITE_ATTEMPTS)
+        with patch:
+            messages = self.verify([sale])
+
+        self.assertEqual(len(calls), services.STOCK_WRITE_ATTEMPTS)
+        self.assertEqual(messages, ['Error verifying sales: 1 stock items were changed by someone else'])
+        self.assertFalse(Sales.objects.get(pk=sale.pk).is_verified)
+        self.assertEqual(Stock.objects.get(pk=self.tie.pk).quantity, 10)
+        self.assertDerivedConsistent()
+
+
+class RollupInvariantTests(DerivedDataAssertions, TestCase):
+    """SalesDailyRollup, kept by deltas, matches rebuild_rollup() after every change."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='clerk', password='clerk')
+        cls.shirts = Category.objects.create(name='Shirts')
+        cls.ties = Category.objects.create(name='Ties')
+        cls.shirt = Stock.objects.create(user=user, category=cls.shirts, name='Shirt', cost_price=100, selling_price=150, quantity=50)
+        cls.tie = Stock.objects.create(user=user, category=cls.ties, name='Tie', cost_price=20, selling_price=50, quantity=50)
+        cls.day = timezone.localdate() - timedelta(days=2)
+
+    def test_sale_lifecycle(self):
+        sale = Sales.objects.create(stock=self.shirt, quantity_sold=2)
+        other = Sales.objects.create(stock=self.shirt, quantity_sold=1, is_verified=True)
+        self.assertRollupConsistent()
+
+        sale.is_verified = True
+        sale.save()
+        self.assertRollupConsistent()
+
+        sale.quantity_sold = 5
+        sale.save()
+        self.assertRollupConsistent()
+
+        # Early morning of an earlier day, still the day before in UTC
+        sale.sold_on = local_day_start(self.day) + timedelta(hours=1)
+        sale.save()
+        self.assertRollupConsistent()
+
+        sale.stock = self.tie
+        sale.save()
+        self.assertRollupConsistent()
+
+        sale.is_verified = False
+        sale.save()
+        self.assertRollupConsistent()
+
+        sale.delete()
+        self.assertRollupConsistent()
+
+        Sales.objects.get(pk=other.pk).delete()
+        self.assertRollupConsistent()
+
+    def test_stock_recategorized(self):
+        Sales.objects.create(stock=self.shirt, quantity_sold=2, is_verified=True)
+        shirt = Stock.objects.get(pk=self.shirt.pk)
+        shirt.category = self.ties
+        shirt.save()
+        self.assertRollupConsistent()
+
+
+class ReportCacheKeyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(username='clerk', password='clerk')
+        cls.shirts = Category.objects.create(name='Shirts')
+        cls.ties = Category.objects.create(name='Ties')
+        cls.stock = Stock.objects.create(user=user, category=cls.shirts, name='Shirt', cost_price=100, selling_price=150, quantity=50)
+        Sales.objects.create(stock=cls.stock, quantity_sold=2)
+        cls.today = timezone.localdate()
+
+    def keys(self):
+        return {mode: report_cache_key(self.today, self.today, mode=mode) for mode in ('', 'day', 'category', 'product')}
+
+    def test_category_move(self):
+        before = self.keys()
+        stock = Stock.objects.get(pk=self.stock.pk)
+        stock.category = self.ties
+        stock.save()
+        after = self.keys()
+
+        self.assertEqual([mode for mode in before if before[mode] != after[mode]], ['category', 'product'])
+
+    def test_sale_change(self):
+        before = self.keys()
+        Sales.objects.create(stock=self.stock, quantity_sold=1)
+        after = self.keys()
+
+        self.assertTrue(all(before[mode] != after[mode] for mode in before))
+
+    def test_every_edit_changes_key(self):
+        sale = Sales.objects.get()
+        seen = [report_cache_key(self.today, self.today)]
+        self.assertEqual(report_cache_key(self.today, self.today), seen[0])
+
+        def edit(**fields):
+            for field, value in fields.items():
+                setattr(sale, field, value)
+            sale.save()
+            seen.append(report_cache_key(self.today, self.today))
+
+        edit(is_verified=True)
+        edit(quantity_sold=3)
+        edit(sold_on=sale.sold_on - timedelta(minutes=1))
+        other = Stock.objects.create(user=self.stock.user, category=self.ties, name='Tie', cost_price=20, selling_price=50, quantity=50)
+        edit(stock=other)
+        sale.delete()
+        seen.append(report_cache_key(self.today, self.today))
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_other_days_keep_key(self):
+        before = report_cache_key(self.today, self.today)
+        sale = Sales.objects.create(stock=self.stock, quantity_sold=1)
+        sale.sold_on = local_day_start(self.today) - timedelta(minutes=1)
+        sale.save()
+        # Renames don't change the key either; cached reports keep the old name
+        Stock.objects.filter(pk=self.stock.pk).update(name='Blue shirt')
+        self.assertEqual(report_cache_key(self.today, self.today), before)
+
+
+class ReportJobTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(username='clerk', password='clerk')
+        stock = Stock.objects.create(user=cls.user, category=Category.objects.create(name='Shirts'), name='Shirt', selling_price=150, quantity=10)
+        Sales.objects.create(stock=stock, quantity_sold=2)
+        cls.today = timezone.localdate()
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.executor = self.enterContext(mock.patch.object(jobs, 'get_executor')).return_value
+
+    def stale_job(self, **fields):
+        started = timezone.now() - timedelta(seconds=jobs.REPORT_JOB_TIMEOUT + 60)
+        return ReportJob.objects.create(
+            user=self.user, start_date=self.today, end_date=self.today, status=ReportJob.RUNNING, started_at=started, progress=40, **fields,
+        )
+
+    def test_enqueue_submits_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = jobs.enqueue_report(self.user, self.today, self.today)
+            self.executor.submit.assert_not_called()
+        self.executor.submit.assert_called_once_with(jobs.run_in_thread, job.pk)
+        self.assertEqual(job.status, ReportJob.QUEUED)
+
+        self.assertTrue(jobs.run_report_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress, job.file.name), (ReportJob.DONE, 100, f'reports/cache/{job.cache_key}.pdf'))
+        self.assertTrue(default_storage.exists(job.file.name))
+        self.assertGreater(job.expires_at, timezone.now())
+
+        # The same report again is served from the cache, without a render
+        self.executor.submit.reset_mock()
+        with self.captureOnCommitCallbacks(execute=True):
+            again = jobs.enqueue_report(self.user, self.today, self.today)
+        self.executor.submit.assert_not_called()
+        self.assertEqual((again.status, again.file.name), (ReportJob.DONE, job.file.name))
+
+    @override_settings(REPORT_JOBS_IN_PROCESS=False)
+    def test_enqueue_leaves_job_to_runner(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            job = jobs.enqueue_report(self.user, self.today, self.today)
+        self.executor.submit.assert_not_called()
+        self.assertEqual(jobs.run_pending_jobs(), 1)
+        self.assertEqual(ReportJob.objects.get(pk=job.pk).status, ReportJob.DONE)
+
+    def test_claimed_once(self):
+        job = ReportJob.objects.create(user=self.user, start_date=self.today, end_date=self.today)
+        self.assertTrue(jobs.claim_job(job.pk))
+        self.assertFalse(jobs.claim_job(job.pk))
+        # Already running elsewhere: not rendered again
+        self.assertFalse(jobs.run_report_job(job.pk))
+        self.assertEqual(ReportJob.objects.get(pk=job.pk).status, ReportJob.RUNNING)
+
+    def test_progress_write_failure_keeps_render(self):
+        def render(start_date, end_date, output, progress, mode):
+            # The database is locked for every progress write
+            with mock.patch.object(jobs.ReportJob.objects, 'filter', side_effect=OperationalError('database is locked')):
+                for done in range(0, 101, 10):
+                    progress(done, 100)
+            output.write(b'%PDF-1.4')
+
+        job = ReportJob.objects.create(user=self.user, start_date=self.today, end_date=self.today)
+        with mock.patch.object(jobs, 'generate_sales_report', render), self.assertLogs(jobs.logger, 'WARNING'):
+            self.assertTrue(jobs.run_report_job(job.pk))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), (ReportJob.DONE, 100))
+
+    @mock.patch.object(jobs, 'REPORT_JOB_RETRY_DELAY', 0)
+    def test_outcome_write_retried_while_locked(self):
+        job = ReportJob.objects.create(user=self.user, start_date=self.today, end_date=self.today)
+        locked = OperationalError('database is locked')
+        with mock.patch('django.db.models.QuerySet.update', side_effect=[locked, locked, 1]) as update:
+            self.assertEqual(jobs.update_job(job.pk, status=ReportJob.DONE), 1)
+        self.assertEqual(update.call_count, 3)
+
+        with mock.patch('django.db.models.QuerySet.update', side_effect=OperationalError('no such table')) as update:
+            with self.assertRaises(OperationalError):
+                jobs.update_job(job.pk, status=ReportJob.DONE)
+        self.assertEqual(update.call_count, 1)
+
+    def test_stale_jobs_reclaimed(self):
+        stale = self.stale_job()
+        running = ReportJob.objects.create(
+            user=self.user, start_date=self.today, end_date=self.today, status=ReportJob.RUNNING, started_at=timezone.now(),
+        )
+        # Requesting any report picks up the stranded job
+        with self.captureOnCommitCallbacks(execute=True):
+            job = jobs.enqueue_report(self.user, self.today, self.today)
+        self.assertEqual(
+            sorted(call.args for call in self.executor.submit.call_args_list),
+            sorted([(jobs.run_in_thread, job.pk), (jobs.run_in_thread, stale.pk)]),
+        )
+        self.assertEqual(
+            dict(ReportJob.objects.filter(pk__in=[stale.pk, running.pk]).values_list('pk', 'status')),
+            {stale.pk: ReportJob.QUEUED, running.pk: ReportJob.RUNNING},
+        )
+        self.assertEqual(jobs.reclaim_stale_jobs(), [])
+
+    def test_stale_jobs_reclaimed_by_job_list(self):
+        stale = self.stale_job()
+        self.client.force_login(get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='admin'))
+        self.client.get(reverse('admin:sales_reportjob_changelist'))
+        self.executor.submit.assert_called_once_with(jobs.run_in_thread, stale.pk)
+        self.assertEqual(ReportJob.objects.get(pk=stale.pk).status, ReportJob.QUEUED)
+
+    def test_cleanup_expired(self):
+        past, future = timezone.now() - timedelta(hours=1), timezone.now() + timedelta(hours=1)
+        cached = default_storage.save('reports/cache/shared.pdf', ContentFile(b'%PDF-1.4'))
+        own = default_storage.save('reports/own/report.pdf', ContentFile(b'%PDF-1.4'))
+        for name in (cached, own):
+            ReportJob.objects.create(user=self.user, start_date=self.today, end_date=self.today, status=ReportJob.DONE, file=name, expires_at=past)
+        kept = ReportJob.objects.create(user=self.user, start_date=self.today, end_date=self.today, status=ReportJob.DONE, file=cached, expires_at=future)
+
+        self.assertEqual(jobs.cleanup_expired_reports(), 2)
+        self.assertEqual(list(ReportJob.objects.values_list('pk', flat=True)), [kept.pk])
+        # Cached files are shared and left to prune_report_cache
+        self.assertTrue(default_storage.exists(cached))
+        self.assertFalse(default_storage.exists(own))
+
+
+class ReportDownloadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.owner = User.objects.create_user(username='owner', email='owner@example.com', password='owner', is_staff=True)
+        cls.other = User.objects.create_user(username='other', email='other@example.com', password='other', is_staff=True)
+        for user in (cls.owner, cls.other):
+            user.user_permissions.add(Permission.objects.get(codename='view_sales'))
+        cls.today = timezone.localdate()
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.key = 'a' * 64
+        name = default_storage.save(f'reports/cache/{self.key}.pdf', ContentFile(b'%PDF-1.4 report'))
+        self.job = ReportJob.objects.create(
+            user=self.owner, start_date=self.today, end_date=self.today, cache_key=self.key, status=ReportJob.DONE,
+            file=name, finished_at=timezone.now(), expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.url = reverse('admin:sales_reportjob_download', args=[self.key])
+
+    def test_validators(self):
+        self.client.force_login(self.owner)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'%PDF-1.4 report')
+        self.assertEqual(response['ETag'], f'"{self.key}"')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('attachment', response['Content-Disposition'])
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"stale"').status_code, 200)
+
+    def test_only_own_unexpired_reports(self):
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+        self.client.force_login(self.owner)
+        ReportJob.objects.filter(pk=self.job.pk).update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
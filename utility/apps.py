@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UtilityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'utility'
+
+    def ready(self):
+        # Per-connection SQLite PRAGMAs
+        import erp.db
@@ -0,0 +1,267 @@
+import math
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, time as day_time, timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.db import transaction
+from django.test import Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from inventory.models import Category, Stock
+from purchase_returns.models import PurchaseReturn
+from purchases.models import Purchase
+from sales.jobs import run_pending_jobs
+from sales.models import ReportJob, Sales
+from sales.report_cache import prune_report_cache
+from .instrumentation import record_queries
+from .seeding import bulk_insert, explicit_auto_now, refresh_derived_data
+
+User = get_user_model()
+
+BENCHMARK_ADMIN_EMAIL = 'benchmark-admin@example.com'
+
+CATEGORY_NAMES = ['T-Shirts', 'Jeans', 'Kurtas', 'Sarees', 'Leggings', 'Jackets', 'Shirts', 'Trousers']
+
+
+# ==================== DATASET ====================
+
+def seed_dataset(sales=1_000_000, skus=50_000, days=365, users=20, seed=0):
+    """
+    Insert a deterministic benchmark dataset: for a given ``seed`` every run
+    produces the same users, stock, purchases and sales, laid out over the
+    ``days`` up to today (so dashboard windows always have data). Derived
+    tables are rebuilt once at the end.
+    """
+    rng = random.Random(seed)
+    end_date = timezone.localdate()
+    start_date = end_date - timedelta(days=days - 1)
+
+    password = make_password('benchmark')
+    admin = User.objects.create(
+        username='benchmark-admin', email=BENCHMARK_ADMIN_EMAIL, password=password,
+        first_name='Benchmark', is_staff=True, is_superuser=True,
+    )
+    bulk_insert(User, (
+        User(username=f'partner{n}', email=f'partner{n}@example.com', password=password,
+             first_name=f'Partner {n}', role=rng.choice(['Partner', 'Manager']))
+        for n in range(users)
+    ))
+    owners = [admin] + list(User.objects.exclude(pk=admin.pk))
+
+    bulk_insert(Category, (Category(name=name) for name in CATEGORY_NAMES))
+    categories = list(Category.objects.all())
+
+    def stocks():
+        for n in range(skus):
+            category = rng.choice(categories)
+            cost_price = rng.randint(200, 2000)
+            yield Stock(
+                user=rng.choice(owners),
+                category=category,
+                name=f'SKU-{n:06d} {category.name}',
+                cost_price=cost_price,
+                selling_price=cost_price + rng.randint(50, 1000),
+                quantity=rng.randint(0, 500),
+            )
+
+    bulk_insert(Stock, stocks())
+    stock_rows = list(Stock.objects.values_list('id', 'cost_price', 'selling_price'))
+
+    def sales_rows():
+        day_start = timezone.make_aware(datetime.combine(start_date, day_time.min))
+        span = days * 24 * 60 * 60
+        for _ in range(sales):
+            # Squared uniform draw: a few best sellers and a long tail
+            stock_id, cost_price, selling_price = stock_rows[int(len(stock_rows) * rng.random() ** 2)]
+            quantity = rng.randint(1, 10)
+            yield Sales(
+                stock_id=stock_id,
+                quantity_sold=quantity,
+                selling_price=selling_price,
+                total_amount=quantity * selling_price,
+                gross_profit=(selling_price - cost_price) * quantity,
+                sold_on=day_start + timedelta(seconds=rng.randrange(span)),
+                is_verified=rng.random() < 0.9,
+            )
+
+    with explicit_auto_now(Sales, 'sold_on'):
+        bulk_insert(Sales, sales_rows())
+
+    def purchases():
+        for _ in range(max(sales // 20, 100)):
+            stock_id, cost_price, selling_price = rng.choice(stock_rows)
+            quantity = rng.randint(10, 100)
+            yield Purchase(
+                stock_item_id=stock_id,
+                purchase_date=start_date + timedelta(days=rng.randrange(days)),
+                quantity_purchased=quantity,
+                cost_price_per_unit=cost_price,
+                selling_price=selling_price,
+                total_cost=quantity * cost_price,
+                is_received=rng.random() < 0.8,
+            )
+
+    bulk_insert(Purchase, purchases())
+    bulk_insert(PurchaseReturn, (
+        PurchaseReturn(stock_item_id=rng.choice(stock_rows)[0], quantity_returned=rng.randint(1, 5), is_processed=True)
+        for _ in range(max(sales // 1000, 10))
+    ))
+
+    refresh_derived_data(start_date, end_date)
+    return {'sales': sales, 'skus': skus, 'days': days, 'users': users, 'seed': seed}
+
+
+# ==================== SCENARIOS ====================
+
+class Scenario:
+    """
+    One benchmarked interaction. ``setup`` runs untimed before every
+    iteration; with ``rollback`` the iteration runs in a transaction that is
+    rolled back, so write actions see the same data on every iteration.
+    """
+
+    def __init__(self, name, run, setup=None, rollback=False):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.rollback = rollback
+
+    def execute(self, client):
+        if self.setup:
+            self.setup()
+        if not self.rollback:
+            return self.run(client)
+        with transaction.atomic():
+            response = self.run(client)
+            transaction.set_rollback(True)
+        return response
+
+
+def check(response, *statuses):
+    if response.status_code not in statuses:
+        raise AssertionError(f'{response.request["PATH_INFO"]} returned {response.status_code}')
+    return response
+
+
+def admin_action(url, action, ids, query='', status=302):
+    def run(client):
+        return check(client.post(f'{url}{query}', {'action': action, '_selected_action': ids, 'index': 0}), status)
+    return run
+
+
+def default_scenarios(batch=50, report_days=30):
+    """The admin index, its widgets, the Sales changelist, and the bulk actions and report."""
+    from dashboard.stats import DashboardStats
+
+    sales_url = reverse('admin:sales_sales_changelist')
+    purchases_url = reverse('admin:purchases_purchase_changelist')
+
+    def widgets(client):
+        for name in DashboardStats.WIDGETS:
+            check(client.get(reverse('dashboard_widget', args=[name])), 200)
+
+    unverified = list(Sales.objects.filter(is_verified=False).values_list('id', flat=True)[:batch])
+    unreceived = list(Purchase.objects.filter(is_received=False).values_list('id', flat=True)[:batch])
+
+    today = timezone.localdate()
+    start = today - timedelta(days=report_days - 1)
+    report_query = f'?sold_on__date__gte={start}&sold_on__date__lte={today}'
+    report_ids = list(Sales.objects.values_list('id', flat=True)[:1])
+    queue_report = admin_action(sales_url, 'download_sales_report', report_ids, report_query)
+
+    def generate_report(client):
+        # The action only queues a job; render it here so the timing covers the PDF
+        with override_settings(REPORT_JOBS_IN_PROCESS=False):
+            response = queue_report(client)
+        run_pending_jobs()
+        return response
+
+    def clear_reports():
+        ReportJob.objects.all().delete()
+        prune_report_cache(max_age=0)
+
+    return [
+        Scenario('admin_index', lambda client: check(client.get(reverse('admin:index')), 200), setup=cache.clear),
+        Scenario('dashboard_widgets_cold', widgets, setup=cache.clear),
+        Scenario('dashboard_widgets_warm', widgets),
+        Scenario('sales_changelist', lambda client: check(client.get(sales_url), 200)),
+        Scenario('verify_sale', admin_action(sales_url, 'verify_sale', unverified), rollback=True),
+        Scenario('mark_as_received', admin_action(purchases_url, 'mark_as_received', unreceived), rollback=True),
+        Scenario('generate_sales_report', generate_report, setup=clear_reports),
+        Scenario('sales_report_cached', generate_report),
+    ]
+
+
+# ==================== RUNNER ====================
+
+def percentile(values, pct):
+    """Nearest-rank percentile."""
+    values = sorted(values)
+    return values[max(0, math.ceil(pct / 100 * len(values)) - 1)]
+
+
+def measure(scenario, client, iterations=10, warmup=1):
+    """
+    Latency percentiles and query counts over ``iterations`` timed runs,
+    then one extra run under ``tracemalloc`` for peak Python memory (kept
+    out of the timed runs because tracing slows everything down).
+    """
+    for _ in range(warmup):
+        scenario.execute(client)
+
+    durations = []
+    queries = []
+    for _ in range(iterations):
+        with record_queries() as recorder:
+            start = time.perf_counter()
+            scenario.execute(client)
+            durations.append((time.perf_counter() - start) * 1000)
+        queries.append(recorder.count)
+
+    tracemalloc.start()
+    try:
+        scenario.execute(client)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'iterations': iterations,
+        'p50_ms': round(statistics.median(durations), 2),
+        'p95_ms': round(percentile(durations, 95), 2),
+        'min_ms': round(min(durations), 2),
+        'max_ms': round(max(durations), 2),
+        'queries': max(queries),
+        'peak_memory_kb': round(peak / 1024),
+    }
+
+
+def run_benchmarks(scenarios, iterations=10, warmup=1, only=None):
+    client = Client()
+    client.force_login(User.objects.get(email=BENCHMARK_ADMIN_EMAIL))
+    return {
+        scenario.name: measure(scenario, client, iterations, warmup)
+        for scenario in scenarios
+        if not only or scenario.name in only
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Regressions of ``results`` against a ``baseline`` report: p95 latency
+    more than ``tolerance`` (a fraction) slower, or any extra query.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current['queries'] > previous['queries']:
+            regressions.append(f"{name}: queries {previous['queries']} -> {current['queries']}")
+    return regressions
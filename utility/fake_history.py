@@ -0,0 +1,106 @@
+"""
+Fake sales history generated in worker processes for
+``populate_fake_data --workers``.
+
+Nothing here touches Django or the database: a partition is generated from
+plain values into CSV files, which the command then bulk loads. That keeps
+workers safe to run in parallel against a single SQLite file.
+"""
+import csv
+import os
+import random
+from datetime import datetime, timedelta
+
+STAGED_FILES = {
+    'purchases': ('stock_item_id', 'purchase_date', 'quantity_purchased', 'cost_price_per_unit', 'selling_price', 'total_cost'),
+    'sales': ('stock_id', 'quantity_sold', 'selling_price', 'total_amount', 'gross_profit', 'sold_on', 'is_verified'),
+    'bills': ('date', 'bill_amount'),
+    'returns': ('stock_item_id', 'quantity_returned'),
+}
+
+
+def partition_rng(seed, partition):
+    """Random generator for one partition, independent of which worker runs it."""
+    return random.Random(f'{seed}:{partition}')
+
+
+def generate_partition(partition, seed, first_day, days, stocks, budget, sales_per_day, staging_dir):
+    """
+    Simulate ``days`` days starting at ``first_day`` (an aware datetime) and
+    write the rows to CSV files in ``staging_dir``.
+
+    ``stocks`` is a list of ``(id, cost_price, selling_price)``. ``budget``
+    maps stock ids to the units this partition may sell on top of its own
+    purchases: partitions never draw on stock bought in another partition,
+    so quantities can't go negative however the partitions are scheduled.
+
+    Returns the staged file paths and the net quantity change per stock id.
+    """
+    rng = partition_rng(seed, partition)
+    quantity = dict(budget)
+    delta = dict.fromkeys(quantity, 0)
+
+    paths = {name: os.path.join(staging_dir, f'{partition:05d}-{name}.csv') for name in STAGED_FILES}
+    files = {name: open(path, 'w', newline='') for name, path in paths.items()}
+    try:
+        writers = {name: csv.writer(files[name]) for name in STAGED_FILES}
+
+        def move(stock_id, units):
+            quantity[stock_id] = quantity.get(stock_id, 0) + units
+            delta[stock_id] = delta.get(stock_id, 0) + units
+
+        for day in range(days):
+            current_date = first_day + timedelta(days=day)
+
+            # 1. Purchases (Restock)
+            if rng.random() > 0.3: # 70% chance to have purchases on a day
+                for _ in range(rng.randint(1, 5)):
+                    stock_id, cost_price, selling_price = rng.choice(stocks)
+                    qty = rng.randint(10, 100)
+                    writers['purchases'].writerow((
+                        stock_id, current_date.date().isoformat(), qty, cost_price, selling_price, qty * cost_price,
+                    ))
+                    move(stock_id, qty)
+
+            # 2. Sales
+            for _ in range(max(rng.randint(sales_per_day - 5, sales_per_day + 5), 0)):
+                stock_id, cost_price, selling_price = rng.choice(stocks)
+                if quantity.get(stock_id, 0) <= 0:
+                    continue # Out of stock
+
+                qty_sold = rng.randint(1, min(10, quantity[stock_id]))
+                writers['sales'].writerow((
+                    stock_id, qty_sold, selling_price, qty_sold * selling_price,
+                    (selling_price - cost_price) * qty_sold, current_date.isoformat(),
+                    int(rng.choice([True, True, True, False])), # Mostly verified
+                ))
+                move(stock_id, -qty_sold)
+
+            # 3. Bills (random expenses)
+            if rng.random() > 0.7: # 30% chance of bill
+                writers['bills'].writerow((current_date.date().isoformat(), rng.randint(500, 50000)))
+
+            # 4. Purchase Returns (return to vendor reduces stock)
+            if rng.random() > 0.9: # 10% chance
+                stock_id = rng.choice(stocks)[0]
+                writers['returns'].writerow((stock_id, rng.randint(1, 5)))
+                if quantity.get(stock_id, 0) >= 1:
+                    move(stock_id, -1)
+    finally:
+        for f in files.values():
+            f.close()
+
+    return {
+        'partition': partition,
+        'paths': paths,
+        'delta': {stock_id: units for stock_id, units in delta.items() if units},
+    }
+
+
+def read_staged(path):
+    with open(path, newline='') as f:
+        yield from csv.reader(f)
+
+
+def parse_datetime(value):
+    return datetime.fromisoformat(value)
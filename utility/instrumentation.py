@@ -0,0 +1,236 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack, contextmanager
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Number of recent requests kept for the in-process summary page
+HISTORY_SIZE = getattr(settings, 'REQUEST_INSTRUMENTATION_HISTORY', 500)
+
+# A statement repeated this many times in one request is reported as a likely N+1
+REPEATED_QUERY_THRESHOLD = getattr(settings, 'REPEATED_QUERY_THRESHOLD', 10)
+
+# Fingerprints stored per request, most repeated first
+TOP_FINGERPRINTS = 5
+
+_history = deque(maxlen=HISTORY_SIZE)
+_history_lock = threading.Lock()
+
+# "IN (%s, %s, %s)" -> "IN (...)" so batches of different sizes group together
+_PLACEHOLDER_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    SQL with literals and placeholder lists collapsed, so that the same
+    statement run with different parameters is counted as one.
+    """
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER_LIST.sub('(...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryRecorder:
+    """
+    ``connection.execute_wrapper`` that counts queries, their total time and
+    how often each raw statement ran.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.statements[sql] += 1
+
+    def fingerprints(self):
+        """Fingerprint -> executions, computed once per request rather than per query."""
+        counts = Counter()
+        for sql, executions in self.statements.items():
+            counts[fingerprint(sql)] += executions
+        return counts
+
+    def repeated(self, threshold=REPEATED_QUERY_THRESHOLD):
+        return [(sql, n) for sql, n in self.fingerprints().most_common() if n >= threshold]
+
+
+@contextmanager
+def record_queries(using=None, recorder=None):
+    """
+    Record the queries run on ``using`` (every connection when ``None``)
+    inside the block, into ``recorder`` if given so it can keep counting.
+    """
+    recorder = recorder or QueryRecorder()
+    aliases = [using] if using else list(connections)
+    with ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+@contextmanager
+def query_budget(max_queries, using=None):
+    """
+    Fail with ``AssertionError`` if the block runs more than ``max_queries``
+    queries. Meant for tests that pin a view's query budget::
+
+        with query_budget(10):
+            self.client.get(reverse('admin:sales_sales_changelist'))
+
+    The error lists the most repeated statements, which is usually enough
+    to spot the N+1.
+    """
+    with record_queries(using) as recorder:
+        yield recorder
+
+    if recorder.count > max_queries:
+        worst = '\n'.join(
+            f'  {n}x {sql}' for sql, n in recorder.fingerprints().most_common(TOP_FINGERPRINTS)
+        )
+        raise AssertionError(
+            f'{recorder.count} queries executed, budget is {max_queries}. '
+            f'Most repeated:\n{worst}'
+        )
+
+
+# ==================== MIDDLEWARE ====================
+
+class RequestInstrumentationMiddleware:
+    """
+    Record query count, database time and wall time for every request.
+
+    The numbers are sent back as a ``Server-Timing`` header (shown in the
+    browser's network panel) to staff, or to everyone with ``DEBUG`` on,
+    and kept in a rolling in-process history that
+    superusers can browse on the instrumentation summary page. Requests
+    repeating a statement ``REPEATED_QUERY_THRESHOLD`` times or more are
+    logged as likely N+1s.
+
+    Streaming responses (the CSV exports) run most of their queries while
+    the body is sent, after the headers: those are added to the history when
+    the stream ends, but ``Server-Timing`` only covers the view itself.
+    Files streamed by ``FileResponse`` are left alone, so the server can
+    still send them with ``wsgi.file_wrapper``.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        wall = time.perf_counter() - start
+
+        # Timings tell outsiders how much work a request caused: staff only
+        if settings.DEBUG or getattr(getattr(request, 'user', None), 'is_staff', False):
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries"',
+                f'app;dur={(wall - recorder.duration) * 1000:.1f}',
+                f'total;dur={wall * 1000:.1f}',
+            ))
+
+        if response.streaming and not response.is_async and getattr(response, 'file_to_stream', None) is None:
+            response.streaming_content = self.recorded_stream(response.streaming_content, request, response, recorder, start)
+        else:
+            self.record(request, response, recorder, wall)
+        return response
+
+    def recorded_stream(self, content, request, response, recorder, start):
+        try:
+            with record_queries(recorder=recorder):
+                yield from content
+        finally:
+            self.record(request, response, recorder, time.perf_counter() - start)
+
+    def record(self, request, response, recorder, wall):
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else request.path
+        top = recorder.fingerprints().most_common(TOP_FINGERPRINTS)
+        with _history_lock:
+            _history.append({
+                'view': view,
+                'method': request.method,
+                'status': response.status_code,
+                'queries': recorder.count,
+                'db_ms': recorder.duration * 1000,
+                'wall_ms': wall * 1000,
+                'top': top,
+            })
+
+        repeated = [(sql, n) for sql, n in top if n >= REPEATED_QUERY_THRESHOLD]
+        if repeated:
+            logger.warning(
+                'Possible N+1 in %s %s: %s', request.method, view,
+                '; '.join(f'{n}x {sql[:200]}' for sql, n in repeated),
+            )
+
+
+# ==================== SUMMARY ====================
+
+def request_history():
+    with _history_lock:
+        return list(_history)
+
+
+def clear_history():
+    with _history_lock:
+        _history.clear()
+
+
+def summary():
+    """
+    Per view statistics over the recorded history, heaviest views (by total
+    database time) first.
+    """
+    views = {}
+    for entry in request_history():
+        stats = views.setdefault(entry['view'], {
+            'view': entry['view'],
+            'requests': 0,
+            'queries': [],
+            'db_ms': [],
+            'wall_ms': [],
+            'repeated': Counter(),
+        })
+        stats['requests'] += 1
+        stats['queries'].append(entry['queries'])
+        stats['db_ms'].append(entry['db_ms'])
+        stats['wall_ms'].append(entry['wall_ms'])
+        for sql, n in entry['top']:
+            stats['repeated'][sql] = max(stats['repeated'][sql], n)
+
+    rows = []
+    for stats in views.values():
+        requests = stats['requests']
+        rows.append({
+            'view': stats['view'],
+            'requests': requests,
+            'avg_queries': sum(stats['queries']) / requests,
+            'max_queries': max(stats['queries']),
+            'avg_db_ms': sum(stats['db_ms']) / requests,
+            'avg_wall_ms': sum(stats['wall_ms']) / requests,
+            'max_wall_ms': max(stats['wall_ms']),
+            'total_db_ms': sum(stats['db_ms']),
+            'repeated': [
+                (sql, n) for sql, n in stats['repeated'].most_common(3)
+                if n >= REPEATED_QUERY_THRESHOLD
+            ],
+        })
+    return sorted(rows, key=lambda row: row['total_db_ms'], reverse=True)
@@ -0,0 +1,103 @@
+import json
+import platform
+import sqlite3
+import tempfile
+import time
+import django
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from utility.benchmark import (
+    BENCHMARK_ADMIN_EMAIL, User, compare, default_scenarios, run_benchmarks, seed_dataset,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds a deterministic dataset into a separate SQLite database and reports latency, '
+        'query counts and peak memory of the admin index, Sales changelist, bulk actions and '
+        'sales report as JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=1_000_000, help='Number of sales to seed')
+        parser.add_argument('--skus', type=int, default=50_000, help='Number of stock items to seed')
+        parser.add_argument('--days', type=int, default=365, help='Days of sales history, ending today')
+        parser.add_argument('--users', type=int, default=20, help='Number of stock owners to seed')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed of the dataset')
+        parser.add_argument('--iterations', type=int, default=10, help='Timed runs per scenario')
+        parser.add_argument('--warmup', type=int, default=1, help='Untimed runs per scenario before timing')
+        parser.add_argument('--batch', type=int, default=50, help='Rows selected for verify_sale and mark_as_received')
+        parser.add_argument('--report-days', type=int, default=30, help='Days covered by the sales report')
+        parser.add_argument('--only', nargs='+', help='Run only these scenarios')
+        parser.add_argument('--db-file', help='SQLite file for the benchmark database (in memory by default)')
+        parser.add_argument('--keepdb', action='store_true', help='Keep --db-file afterwards and reuse its dataset on the next run')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+        parser.add_argument('--compare', help='Baseline JSON report; fail on regressions against it')
+        parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 slowdown against the baseline, as a fraction')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The benchmark runs on SQLite only.')
+        if options['keepdb'] and not options['db_file']:
+            raise CommandError('--keepdb needs --db-file.')
+
+        # Never touch the real database: everything runs in a test database
+        if options['db_file']:
+            connection.settings_dict['TEST']['NAME'] = options['db_file']
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'], serialize=False,
+        )
+        cache.clear()
+        try:
+            report = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stderr.write(self.style.SUCCESS(f"Benchmark report written to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = compare(report['scenarios'], baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('Performance regressions:\n' + '\n'.join(regressions))
+            self.stderr.write(self.style.SUCCESS('No regressions against the baseline.'))
+
+    def benchmark(self, options):
+        dataset = {key: options[key] for key in ('sales', 'skus', 'days', 'users', 'seed')}
+        seed_seconds = None
+        if options['keepdb'] and User.objects.filter(email=BENCHMARK_ADMIN_EMAIL).exists():
+            self.stderr.write('Reusing the dataset already in the benchmark database.')
+        else:
+            self.stderr.write(f"Seeding {options['sales']} sales over {options['skus']} stock items...")
+            start = time.perf_counter()
+            seed_dataset(**dataset)
+            seed_seconds = round(time.perf_counter() - start, 2)
+
+        scenarios = default_scenarios(batch=options['batch'], report_days=options['report_days'])
+        unknown = set(options['only'] or ()) - {scenario.name for scenario in scenarios}
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+        self.stderr.write('Running scenarios...')
+        # Rendered reports are written to media; keep them out of the real one
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            results = run_benchmarks(scenarios, options['iterations'], options['warmup'], options['only'])
+        return {
+            'dataset': dataset,
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'sqlite': sqlite3.sqlite_version,
+            },
+            'seed_seconds': seed_seconds,
+            'scenarios': results,
+        }
@@ -1,8 +1,12 @@
+import multiprocessing
 import random
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta, date
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
 from django.db import transaction
 from faker import Faker
 
@@ -15,6 +19,9 @@ from utility.models import Bills
 from partners.models import * # Just in case, though empty
 # Payments are handled by signals, but we might want to verify or trigger manually if needed
 from payments.models import Payments
+from utility.recompute import deferred_recompute
+from utility.seeding import BulkBuffer, explicit_auto_now, refresh_derived_data
+from utility.fake_history import generate_partition, parse_datetime, read_staged
 
 User = get_user_model()
 
@@ -27,10 +34,17 @@ class Command(BaseCommand):
         parser.add_argument('--users', type=int, default=5, help='Number of extra users to create')
         parser.add_argument('--products', type=int, default=20, help='Number of products (stocks) to create')
         parser.add_argument('--sales-per-day', type=int, default=15, help='Average sales per day')
+        parser.add_argument('--bulk', action='store_true', help='Insert rows in bulk chunks without per-row saves and signals; derived tables are rebuilt once at the end')
+        parser.add_argument('--seed', type=int, help='Random seed, for reproducible data')
+        parser.add_argument('--workers', type=int, help='Generate the history in this many processes (implies --bulk)')
+        parser.add_argument('--partition-days', type=int, default=30, help='Days of history per partition with --workers')
 
     def handle(self, *args, **options):
         # Initialize Faker with Indian locale
         self.fake = Faker('en_IN')
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+            self.fake.seed_instance(options['seed'])
         
         days = options['days']
         flush = options['flush']
@@ -52,10 +66,22 @@ class Command(BaseCommand):
             User.objects.exclude(is_superuser=True).delete()
             self.stdout.write(self.style.SUCCESS('Database flushed.'))
 
-        with transaction.atomic():
-            self.create_users(num_users)
-            self.create_categories_and_stocks(num_products)
-            self.generate_history(days, sales_per_day)
+        if options['bulk'] or options['workers']:
+            # sold_on is auto_now_add; bulk inserts keep the historical timestamps
+            with transaction.atomic(), explicit_auto_now(Sales, 'sold_on'):
+                self.bulk_create_users(num_users)
+                self.bulk_create_categories_and_stocks(num_products)
+                if options['workers']:
+                    self.parallel_generate_history(days, sales_per_day, options['workers'], options['partition_days'])
+                else:
+                    self.bulk_generate_history(days, sales_per_day)
+        else:
+            # Recompute daily payments, sales rollups etc. once at the end
+            # instead of on every save
+            with transaction.atomic(), deferred_recompute():
+                self.create_users(num_users)
+                self.create_categories_and_stocks(num_products)
+                self.generate_history(days, sales_per_day)
 
         self.stdout.write(self.style.SUCCESS(f'Successfully populated database with {days} days of data.'))
 
@@ -224,3 +250,244 @@ class Command(BaseCommand):
                     stock.save()
 
             current_date += timedelta(days=1)
+
+    # ==================== BULK MODE ====================
+    # Same data as above, but stock quantities are tracked in memory and rows
+    # are written with bulk_create, so no save() or signal runs per row.
+    # Payments, sales rollups and inventory counters are rebuilt at the end.
+
+    def bulk_create_users(self, count):
+        self.stdout.write('Creating users...')
+        roles = ['Partner', 'Manager']
+        taken_usernames = set(User.objects.values_list('username', flat=True))
+        taken_emails = set(User.objects.values_list('email', flat=True))
+        # Hashing is deliberately slow; every fake user shares one password anyway
+        password = make_password('password123')
+
+        users = []
+        for _ in range(count):
+            profile = self.fake.profile()
+            username = profile['username']
+            email = profile['mail']
+            if username in taken_usernames or email in taken_emails:
+                continue
+            taken_usernames.add(username)
+            taken_emails.add(email)
+
+            users.append(User(
+                username=username,
+                email=email,
+                password=password,
+                first_name=self.fake.first_name(),
+                last_name=self.fake.last_name(),
+                phone_number=self.fake.phone_number().replace('+91', '').strip()[:10],
+                role=random.choice(roles),
+                region_name=self.fake.state(),
+                city=self.fake.city(),
+                zip_code=self.fake.postcode(),
+                isp=random.choice(['Jio', 'Airtel', 'Vi', 'BSNL']) if random.random() > 0.5 else None,
+                is_active=True
+            ))
+        User.objects.bulk_create(users)
+        self.stdout.write(self.style.SUCCESS(f'Created {len(users)} users.'))
+
+    def bulk_create_categories_and_stocks(self, count):
+        self.stdout.write('Creating inventory...')
+        categories = ['T-Shirts', 'Jeans', 'Kurtas', 'Sarees', 'Leggings', 'Jackets', 'Shirts', 'Trousers']
+        Category.objects.bulk_create([Category(name=name) for name in categories], ignore_conflicts=True)
+        category_objs = list(Category.objects.filter(name__in=categories))
+
+        users = list(User.objects.all())
+        if not users:
+            self.stdout.write(self.style.ERROR('No users found to assign stock to.'))
+            return
+
+        taken_names = set(Stock.objects.values_list('name', flat=True))
+        buffer = BulkBuffer()
+        for _ in range(count):
+            category = random.choice(category_objs)
+            name = f"{self.fake.word().title()} {category.name}"
+            # Ensure unique name
+            while name in taken_names:
+                name = f"{self.fake.word().title()} {category.name} {random.randint(1, 999)}"
+            taken_names.add(name)
+
+            cost_price = random.randint(200, 2000)
+            buffer.add(Stock(
+                user=random.choice(users),
+                category=category,
+                name=name,
+                cost_price=cost_price,
+                selling_price=cost_price + random.randint(50, 1000),
+                quantity=random.randint(0, 50) # Initial stock, will grow with purchases
+            ))
+        buffer.flush()
+        self.stdout.write(self.style.SUCCESS(f'Created {count} stock items.'))
+
+    def bulk_generate_history(self, days, sales_daily_avg):
+        self.stdout.write(f'Generating {days} days of history...')
+        stocks = list(Stock.objects.all())
+        if not stocks:
+            return
+
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=days)
+        buffer = BulkBuffer()
+
+        current_date = start_date
+        while current_date <= end_date:
+            self.stdout.write(f'Processing {current_date.date()}...', ending='\r')
+
+            # 1. Purchases (Restock)
+            if random.random() > 0.3: # 70% chance to have purchases on a day
+                for _ in range(random.randint(1, 5)):
+                    stock = random.choice(stocks)
+                    qty = random.randint(10, 100)
+                    buffer.add(Purchase(
+                        stock_item=stock,
+                        purchase_date=current_date.date(),
+                        quantity_purchased=qty,
+                        cost_price_per_unit=stock.cost_price,
+                        selling_price=stock.selling_price,
+                        total_cost=qty * stock.cost_price,
+                        is_received=True
+                    ))
+                    stock.quantity += qty
+
+            # 2. Sales, with the fields Sales.save() would fill in
+            daily_sales_count = max(random.randint(sales_daily_avg - 5, sales_daily_avg + 5), 0)
+            for _ in range(daily_sales_count):
+                stock = random.choice(stocks)
+                if stock.quantity <= 0:
+                    continue # Out of stock
+
+                qty_sold = random.randint(1, min(10, stock.quantity))
+                buffer.add(Sales(
+                    stock=stock,
+                    quantity_sold=qty_sold,
+                    selling_price=stock.selling_price,
+                    total_amount=qty_sold * stock.selling_price,
+                    gross_profit=(stock.selling_price - stock.cost_price) * qty_sold,
+                    sold_on=current_date,
+                    is_verified=random.choice([True, True, True, False]) # Mostly verified
+                ))
+                stock.quantity -= qty_sold
+
+            # 3. Bills (random expenses)
+            if random.random() > 0.7: # 30% chance of bill
+                buffer.add(Bills(
+                    file='bills/dummy.pdf',
+                    date=current_date.date(),
+                    bill_amount=random.randint(500, 50000)
+                ))
+
+            # 4. Purchase Returns (return to vendor reduces stock)
+            if random.random() > 0.9: # 10% chance
+                stock = random.choice(stocks)
+                buffer.add(PurchaseReturn(
+                    stock_item=stock,
+                    quantity_returned=random.randint(1, 5),
+                    is_processed=True,
+                ))
+                if stock.quantity >= 1:
+                    stock.quantity -= 1
+
+            current_date += timedelta(days=1)
+
+        buffer.flush()
+        Stock.objects.bulk_update(stocks, ['quantity'], batch_size=buffer.chunk_size)
+
+        self.stdout.write('\nRebuilding payments, sales rollups and inventory counters...')
+        refresh_derived_data(timezone.localdate(start_date), timezone.localdate(end_date))
+
+    # ==================== PARALLEL MODE ====================
+    # The date range is split into partitions of --partition-days, generated
+    # in worker processes into staged CSV files (utility.fake_history) and
+    # then bulk loaded here in partition order. Each partition is seeded from
+    # (seed, partition), so the data doesn't depend on the number of workers.
+
+    def plan_budgets(self, stocks, partitions):
+        """
+        Split every stock item's starting quantity between the partitions.
+        A partition sells from its share plus what it purchases itself, so
+        quantities stay consistent without the partitions talking to each other.
+        """
+        budgets = [{} for _ in range(partitions)]
+        for stock in stocks:
+            share, remainder = divmod(stock.quantity, partitions)
+            for partition, budget in enumerate(budgets):
+                budget[stock.id] = share + (1 if partition < remainder else 0)
+        return budgets
+
+    def parallel_generate_history(self, days, sales_daily_avg, workers, partition_days):
+        stocks = list(Stock.objects.all())
+        if not stocks:
+            return
+
+        end_date = timezone.now()
+        start_date = end_date - timedelta(days=days)
+        total_days = days + 1
+        offsets = list(range(0, total_days, partition_days))
+        self.stdout.write(f'Generating {days} days of history in {len(offsets)} partitions on {workers} workers...')
+
+        seed = random.randrange(2 ** 32)
+        stock_values = [(stock.id, stock.cost_price, stock.selling_price) for stock in stocks]
+        budgets = self.plan_budgets(stocks, len(offsets))
+
+        with tempfile.TemporaryDirectory(prefix='fake-history-') as staging_dir:
+            # Workers only write files; spawn keeps them clear of this process's DB connection
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                futures = [
+                    executor.submit(
+                        generate_partition, partition, seed, start_date + timedelta(days=offset),
+                        min(partition_days, total_days - offset), stock_values, budgets[partition],
+                        sales_daily_avg, staging_dir,
+                    )
+                    for partition, offset in enumerate(offsets)
+                ]
+                results = [future.result() for future in futures]
+
+            self.stdout.write('Loading staged rows...')
+            buffer = BulkBuffer()
+            for result in results:
+                self.load_partition(result['paths'], buffer)
+            buffer.flush()
+
+        # The budgets add up to the starting quantities, so only the changes remain
+        stocks_by_id = {stock.id: stock for stock in stocks}
+        for result in results:
+            for stock_id, units in result['delta'].items():
+                stocks_by_id[stock_id].quantity += units
+        Stock.objects.bulk_update(stocks, ['quantity'], batch_size=buffer.chunk_size)
+
+        self.stdout.write('Rebuilding payments, sales rollups and inventory counters...')
+        refresh_derived_data(timezone.localdate(start_date), timezone.localdate(end_date))
+
+    def load_partition(self, paths, buffer):
+        for row in read_staged(paths['purchases']):
+            stock_id, purchase_date, qty, cost, selling_price, total_cost = row
+            buffer.add(Purchase(
+                stock_item_id=int(stock_id),
+                purchase_date=date.fromisoformat(purchase_date),
+                quantity_purchased=int(qty),
+                cost_price_per_unit=float(cost),
+                selling_price=float(selling_price),
+                total_cost=float(total_cost),
+                is_received=True
+            ))
+        for row in read_staged(paths['sales']):
+            stock_id, qty_sold, selling_price, total_amount, gross_profit, sold_on, is_verified = row
+            buffer.add(Sales(
+                stock_id=int(stock_id),
+                quantity_sold=int(qty_sold),
+                selling_price=float(selling_price),
+                total_amount=float(total_amount),
+                gross_profit=float(gross_profit),
+                sold_on=parse_datetime(sold_on),
+                is_verified=is_verified == '1'
+            ))
+        for bill_date, amount in read_staged(paths['bills']):
+            buffer.add(Bills(file='bills/dummy.pdf', date=date.fromisoformat(bill_date), bill_amount=float(amount)))
+        for stock_id, qty in read_staged(paths['returns']):
+            buffer.add(PurchaseReturn(stock_item_id=int(stock_id), quantity_returned=int(qty), is_processed=True))
@@ -0,0 +1,73 @@
+import threading
+from contextlib import contextmanager
+
+_local = threading.local()
+
+# name -> handler(keys), called in registration order when a deferred block exits
+_handlers = {}
+
+
+def register(name, handler):
+    """
+    Register ``handler(keys)`` as the batched recomputation for ``name``.
+    Signal modules register theirs at import time (from ``AppConfig.ready``).
+    """
+    _handlers[name] = handler
+
+
+def defer(name, keys):
+    """
+    Inside ``deferred_recompute()``, collect ``keys`` for a batched
+    recomputation of ``name`` at the end of the block and return True.
+    Outside of it, do nothing and return False so the caller recomputes now.
+    """
+    pending = getattr(_local, 'pending', None)
+    if pending is None:
+        return False
+    pending.setdefault(name, set()).update(keys)
+    return True
+
+
+def recompute(name, keys):
+    """
+    Run the registered recomputation of ``name`` for ``keys``, for code that
+    changes rows without sending signals (``queryset.update()``): at the end
+    of the enclosing ``deferred_recompute()`` block, or right away outside
+    of one.
+    """
+    keys = set(keys)
+    if keys and not defer(name, keys):
+        _handlers[name](keys)
+
+
+@contextmanager
+def deferred_recompute():
+    """
+    Defer signal-driven recomputation (daily payments, sales rollups,
+    dashboard invalidation) until the end of the block, then run each one
+    once for the set of affected keys.
+
+    Meant for bulk flows such as admin actions and management commands::
+
+        with transaction.atomic(), deferred_recompute():
+            for sale in sales:
+                sale.save()
+
+    Nested blocks join the outermost one. If the block raises, the
+    collected keys are dropped: the surrounding transaction is expected to
+    roll back the changes that produced them.
+    """
+    if getattr(_local, 'pending', None) is not None:
+        yield
+        return
+
+    _local.pending = {}
+    try:
+        yield
+        pending = _local.pending
+    finally:
+        _local.pending = None
+
+    for name, handler in _handlers.items():
+        if pending.get(name):
+            handler(pending[name])
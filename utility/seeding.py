@@ -0,0 +1,84 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+from inventory.counters import reconcile_counters
+from inventory.ledger import reconcile_stock
+from payments.signals import recompute_daily_payments
+from sales.rollups import rebuild_rollup
+
+# Rows per bulk INSERT when seeding large datasets
+SEED_CHUNK_SIZE = 5000
+
+
+@contextmanager
+def explicit_auto_now(model, *field_names):
+    """
+    Let ``bulk_create`` store the given ``auto_now``/``auto_now_add`` fields
+    as set on the instances (e.g. a past ``Sales.sold_on``) instead of
+    overwriting them with the current time.
+    """
+    fields = [model._meta.get_field(name) for name in field_names]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def bulk_insert(model, objects, chunk_size=SEED_CHUNK_SIZE):
+    """
+    ``bulk_create`` an iterable of unsaved instances in chunks, so that
+    generators of millions of rows never sit in memory at once. Signals are
+    not sent; see ``refresh_derived_data``. Returns the number of rows.
+    """
+    objects = iter(objects)
+    inserted = 0
+    while True:
+        chunk = list(islice(objects, chunk_size))
+        if not chunk:
+            return inserted
+        model.objects.bulk_create(chunk)
+        inserted += len(chunk)
+
+
+class BulkBuffer:
+    """
+    Collects unsaved instances of several models and ``bulk_create``s each
+    model's rows whenever ``chunk_size`` of them are pending. Call
+    ``flush()`` at the end for the remainder.
+    """
+
+    def __init__(self, chunk_size=SEED_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.pending = {}
+        self.inserted = {}
+
+    def add(self, obj):
+        model = type(obj)
+        rows = self.pending.setdefault(model, [])
+        rows.append(obj)
+        if len(rows) >= self.chunk_size:
+            self.flush(model)
+
+    def flush(self, model=None):
+        for model in [model] if model else list(self.pending):
+            rows = self.pending.pop(model, [])
+            if rows:
+                model.objects.bulk_create(rows)
+                self.inserted[model] = self.inserted.get(model, 0) + len(rows)
+
+
+def refresh_derived_data(start_date, end_date):
+    """
+    Rebuild everything the signal handlers normally maintain (daily sales
+    rollup, inventory counters, daily payments, stock movement ledger) after
+    rows were inserted with ``bulk_insert``. Dates are local and inclusive.
+    """
+    rebuild_rollup(start_date, end_date)
+    reconcile_counters(fix=True)
+    reconcile_stock(fix=True)
+    days = [start_date + timedelta(days=n) for n in range((end_date - start_date).days + 1)]
+    recompute_daily_payments(days)
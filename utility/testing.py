@@ -0,0 +1,69 @@
+"""
+Test helpers shared by the apps' test modules.
+"""
+from collections import defaultdict
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from inventory.counters import reconcile_counters
+from inventory.ledger import reconcile_stock
+from payments.models import Payments
+from sales.models import Sales, SalesDailyRollup
+from sales.rollups import ROLLUP_COLUMNS, rebuild_rollup
+
+
+def rollup_rows():
+    """
+    ``{(date, stock_id): (category_id, *ROLLUP_COLUMNS)}`` of the stored
+    rollup. Rows left at zero by deltas (a sale moved away) are left out.
+    """
+    rows = {}
+    for date, stock_id, category_id, *columns in SalesDailyRollup.objects.values_list('date', 'stock_id', 'category_id', *ROLLUP_COLUMNS):
+        columns = [round(value, 2) for value in columns]
+        if any(columns):
+            rows[date, stock_id] = (category_id, *columns)
+    return rows
+
+
+def payment_totals():
+    """``{date: total}`` of the stored Payments rows, zero days left out."""
+    return {day: round(float(total), 2) for day, total in Payments.objects.values_list('date', 'total_sales') if total}
+
+
+def expected_payment_totals():
+    """``{date: total}`` of verified sales per local day, recomputed from Sales."""
+    totals = defaultdict(float)
+    rows = Sales.objects.filter(is_verified=True).annotate(
+        day=TruncDate('sold_on', tzinfo=timezone.get_current_timezone())
+    ).values('day').annotate(total=Sum('total_amount')).order_by().values_list('day', 'total')
+    for day, total in rows:
+        totals[day] += total
+    return {day: round(total, 2) for day, total in totals.items() if round(total, 2)}
+
+
+class DerivedDataAssertions:
+    """
+    Assertions that the data kept up to date incrementally (sales rollup,
+    daily payments, inventory counters, stock ledger) matches a full
+    recompute from Sales and Stock.
+    """
+
+    def assertRollupConsistent(self):
+        stored = rollup_rows()
+        rebuild_rollup()
+        self.assertEqual(stored, rollup_rows(), 'SalesDailyRollup differs from rebuild_rollup()')
+
+    def assertPaymentsConsistent(self):
+        self.assertEqual(payment_totals(), expected_payment_totals(), 'Payments differ from the verified sales')
+
+    def assertCountersConsistent(self):
+        self.assertEqual(reconcile_counters(), [], 'InventoryCounter differs from Stock')
+
+    def assertLedgerConsistent(self):
+        self.assertEqual(reconcile_stock(), [], 'StockMovement ledger differs from Stock')
+
+    def assertDerivedConsistent(self):
+        self.assertRollupConsistent()
+        self.assertPaymentsConsistent()
+        self.assertCountersConsistent()
+        self.assertLedgerConsistent()
@@ -1,3 +1,393 @@
-from django.test import TestCase
+import csv
+import re
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+from dashboard.stats import DashboardStats
+from erp.db import _read_only, read_only
+from inventory.models import Category, Stock
+from purchase_returns.models import PurchaseReturn
+from purchases.models import Purchase
+from sales.dates import local_day_start
+from sales.models import Sales
+from sales.reports import SUMMARY_MODES, TRANSACTIONS, generate_sales_report
+from utility.benchmark import compare, default_scenarios, run_benchmarks, seed_dataset
+from utility.exports import Workbook
+from utility.instrumentation import clear_history, query_budget, request_history
+from utility.testing import DerivedDataAssertions
 
-# Create your tests here.
+# Tables whose hot filters are indexed (see the models' Meta.indexes)
+HOT_TABLES = {'sales_sales', 'purchases_purchase', 'inventory_stock', 'purchase_returns_purchasereturn'}
+
+# "SCAN <table>" without "USING ... INDEX": every row of the table is read
+TABLE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+
+# A WHERE clause of the query itself, not of an aggregate's FILTER (WHERE ...)
+WHERE_CLAUSE = re.compile(r'(?<!\()\bWHERE\b')
+
+
+class CaptureSelects:
+    """Collects the ``(sql, params)`` of every SELECT run inside the block."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.wrapper = connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        self.wrapper.__exit__(*exc)
+
+
+def table_scans(sql, params):
+    """Hot tables a query reads in full, according to ``EXPLAIN QUERY PLAN``."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        plan = [row[-1] for row in cursor.fetchall()]
+    return [
+        detail for detail in plan
+        if (match := TABLE_SCAN.match(detail)) and match.group(1) in HOT_TABLES
+    ]
+
+
+class SampleDataTestCase(TestCase):
+    """A superuser, six stock items and a sale, purchase and return of each."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_superuser(username='admin', email='admin@example.com', password='admin')
+        cls.category = Category.objects.create(name='Shirts')
+        cls.stocks = [
+            Stock.objects.create(user=cls.user, category=cls.category, name=f'Shirt {n}', cost_price=100, selling_price=150, quantity=n)
+            for n in range(6)
+        ]
+        cls.today = timezone.localdate()
+        for n, stock in enumerate(cls.stocks):
+            Sales.objects.create(stock=stock, quantity_sold=1, selling_price=150, is_verified=n % 2 == 0)
+            Purchase.objects.create(stock_item=stock, quantity_purchased=5, cost_price_per_unit=100, is_received=n % 2 == 0)
+            PurchaseReturn.objects.create(stock_item=stock, quantity_returned=1, is_processed=n % 2 == 0)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite')
+class HotQueryPlanTests(SampleDataTestCase):
+    """
+    The filtered dashboard, changelist and report queries must be answered
+    from an index. Queries without a WHERE clause (whole-table totals,
+    unfiltered listings) read every row by nature and are not checked.
+    """
+
+    def assertIndexed(self, label, run):
+        with CaptureSelects() as captured:
+            run()
+        self.assertTrue(captured.queries, f'{label} ran no queries')
+        for sql, params in captured.queries:
+            if not WHERE_CLAUSE.search(sql):
+                continue
+            with self.subTest(label, sql=sql):
+                self.assertEqual(table_scans(sql, params), [], f'{label} scans a whole table:\n{sql}')
+
+    def test_dashboard_widgets(self):
+        for name in DashboardStats.WIDGETS:
+            self.assertIndexed(f'{name} widget', lambda: self.client.get(reverse('dashboard_widget', args=[name])))
+
+    def test_changelists(self):
+        start = self.today - timedelta(days=30)
+        # As the admin's date filter links pass them
+        sold = urlencode({'sold_on__gte': local_day_start(start), 'sold_on__lt': local_day_start(self.today)})
+        changelists = [
+            ('sales_sales', ''),
+            ('sales_sales', '?is_verified__exact=0'),
+            ('sales_sales', '?is_verified__exact=1'),
+            ('sales_sales', f'?{sold}'),
+            ('sales_sales', f'?is_verified__exact=1&{sold}'),
+            ('sales_sales', f'?stock__id__exact={self.stocks[0].pk}'),
+            ('sales_sales', f'?stock__category__id__exact={self.category.pk}'),
+            ('purchases_purchase', ''),
+            ('purchases_purchase', '?is_received__exact=0'),
+            ('purchases_purchase', f'?is_received__exact=0&purchase_date__gte={start}&purchase_date__lt={self.today}'),
+            ('inventory_stock', ''),
+            ('inventory_stock', f'?user__id__exact={self.user.pk}'),
+            ('purchase_returns_purchasereturn', ''),
+            ('purchase_returns_purchasereturn', '?is_processed__exact=0'),
+        ]
+        for changelist, query in changelists:
+            url = reverse(f'admin:{changelist}_changelist') + query
+            self.assertIndexed(url, lambda: self.assertEqual(self.client.get(url).status_code, 200))
+
+    def test_reports(self):
+        start = self.today - timedelta(days=30)
+        for mode in [TRANSACTIONS, *SUMMARY_MODES]:
+            self.assertIndexed(f'{mode} report', lambda: generate_sales_report(start, self.today, output=BytesIO(), mode=mode))
+
+
+class QueryBudgetTests(SampleDataTestCase):
+    """
+    Query counts of the hot pages, which must not grow with the number of
+    rows listed (one query per row would blow every budget here).
+    """
+
+    def test_admin_pages(self):
+        budgets = [
+            ('admin:index', 2),
+            ('admin:sales_sales_changelist', 9),
+            ('admin:inventory_stock_changelist', 9),
+        ]
+        for name, budget in budgets:
+            with self.subTest(name), query_budget(budget):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    def test_dashboard_widgets(self):
+        budgets = {'kpis': 6}
+        for name in DashboardStats.WIDGETS:
+            cache.clear()
+            with self.subTest(name), query_budget(budgets.get(name, 3)):
+                self.assertEqual(self.client.get(reverse('dashboard_widget', args=[name])).status_code, 200)
+
+    def test_streamed_export_is_recorded(self):
+        selected = list(Sales.objects.values_list('pk', flat=True)[:1])
+        clear_history()
+        with query_budget(16) as recorder:
+            response = self.client.post(reverse('admin:sales_sales_changelist'), {
+                'action': 'export_csv', '_selected_action': selected,
+            })
+            # The rows are read while the body streams, after the view returned
+            self.assertEqual(request_history(), [])
+            b''.join(response.streaming_content)
+        self.assertEqual(request_history()[-1]['queries'], recorder.count)
+
+
+class RecordingRouter:
+    """Routes nothing, but notes whether each read of a model was routed inside ``read_only()``."""
+
+    decisions = []
+
+    def db_for_read(self, model, **hints):
+        self.decisions.append((model, _read_only.get()))
+        return None
+
+
+class ExportTests(SampleDataTestCase):
+    """The export actions write the filtered changelist, not just the selected rows."""
+
+    def export(self, changelist, action, query='', selected=None):
+        url = reverse(f'admin:{changelist}_changelist') + query
+        response = self.client.post(url, {'action': action, '_selected_action': selected or [self.stocks[0].pk]})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def csv_rows(self, response):
+        text = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.reader(StringIO(text)))
+
+    def test_csv_follows_filters(self):
+        cases = [
+            ('sales_sales', '?is_verified__exact=1', ['Shirt 0', 'Shirt 2', 'Shirt 4']),
+            ('sales_sales', '?q=Shirt+5', ['Shirt 5']),
+            ('purchases_purchase', '?is_received__exact=0', ['Shirt 1', 'Shirt 3', 'Shirt 5']),
+            ('purchase_returns_purchasereturn', '?is_processed__exact=1', ['Shirt 0', 'Shirt 2', 'Shirt 4']),
+        ]
+        for changelist, query, products in cases:
+            with self.subTest(changelist, query=query):
+                header, *rows = self.csv_rows(self.export(changelist, 'export_csv', query))
+                self.assertEqual(header[:2], ['Product', 'Category'])
+                self.assertEqual(sorted(row[0] for row in rows), products)
+
+    def test_csv_cells(self):
+        sale = Sales.objects.get(stock=self.stocks[0])
+        [header, row] = self.csv_rows(self.export('sales_sales', 'export_csv', f'?stock__id__exact={self.stocks[0].pk}'))
+        self.assertEqual(dict(zip(header, row)), {
+            'Product': 'Shirt 0', 'Category': 'Shirts', 'Quantity': '1', 'Selling Price': '150.0',
+            'Total Amount': '150.0', 'Gross Profit': '50.0', 'Verified': 'True',
+            # Local time, without a time zone
+            'Sold On': str(timezone.localtime(sale.sold_on).replace(tzinfo=None, microsecond=0)),
+        })
+
+    @unittest.skipIf(Workbook is None, 'openpyxl is not installed')
+    def test_xlsx_follows_filters(self):
+        from openpyxl import load_workbook
+
+        response = self.export('sales_sales', 'export_xlsx', '?is_verified__exact=0')
+        sheet = load_workbook(BytesIO(b''.join(response.streaming_content)), read_only=True).active
+        header, *rows = list(sheet.values)
+        self.assertEqual(header[0], 'Product')
+        self.assertEqual(sorted(row[0] for row in rows), ['Shirt 1', 'Shirt 3', 'Shirt 5'])
+
+    @override_settings(DATABASE_ROUTERS=['utility.tests.RecordingRouter'])
+    def test_alias_fixed_inside_read_only(self):
+        RecordingRouter.decisions.clear()
+        response = self.export('sales_sales', 'export_csv', '?is_verified__exact=1')
+        self.assertEqual(RecordingRouter.decisions[-1], (Sales, True))
+
+        # Streamed after the action returned, on the alias picked then
+        RecordingRouter.decisions.clear()
+        self.assertEqual(len(self.csv_rows(response)), 4)
+        self.assertEqual(RecordingRouter.decisions, [])
+
+
+def dataset_rows():
+    """Every seeded row by its natural keys, so runs with different ids compare equal."""
+    return {
+        'users': sorted(get_user_model().objects.values_list('username', 'role')),
+        'stock': sorted(Stock.objects.values_list('name', 'user__username', 'cost_price', 'selling_price', 'quantity')),
+        'sales': sorted(Sales.objects.values_list('stock__name', 'quantity_sold', 'total_amount', 'sold_on', 'is_verified')),
+        'purchases': sorted(Purchase.objects.values_list('stock_item__name', 'purchase_date', 'quantity_purchased', 'is_received')),
+        'returns': sorted(PurchaseReturn.objects.values_list('stock_item__name', 'quantity_returned')),
+    }
+
+
+class BenchmarkTests(DerivedDataAssertions, TestCase):
+    """The benchmark's dataset and scenarios, at a tiny scale."""
+
+    SCALE = {'sales': 400, 'skus': 40, 'days': 20, 'users': 3}
+
+    def test_seed_reproducible(self):
+        with transaction.atomic():
+            seed_dataset(**self.SCALE, seed=7)
+            first = dataset_rows()
+            transaction.set_rollback(True)
+        seed_dataset(**self.SCALE, seed=7)
+
+        self.assertEqual(len(first['sales']), 400)
+        self.assertEqual(dataset_rows(), first)
+        self.assertDerivedConsistent()
+
+    def test_scenarios(self):
+        seed_dataset(**self.SCALE)
+        unverified = Sales.objects.filter(is_verified=False).count()
+        scenarios = default_scenarios(batch=5, report_days=7)
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            results = run_benchmarks(scenarios, iterations=2, warmup=0)
+
+        self.assertEqual(list(results), [scenario.name for scenario in scenarios])
+        for name, result in results.items():
+            with self.subTest(name):
+                self.assertEqual(result['iterations'], 2)
+                self.assertLessEqual(result['min_ms'], result['p50_ms'])
+                self.assertLessEqual(result['p95_ms'], result['max_ms'])
+                self.assertGreater(result['queries'], 0)
+        # The bulk actions ran in rolled back transactions
+        self.assertEqual(Sales.objects.filter(is_verified=False).count(), unverified)
+
+    def test_compare(self):
+        baseline = {'scenarios': {
+            'admin_index': {'p95_ms': 10.0, 'queries': 2},
+            'sales_changelist': {'p95_ms': 10.0, 'queries': 9},
+        }}
+        results = {
+            'admin_index': {'p95_ms': 11.9, 'queries': 2},
+            'sales_changelist': {'p95_ms': 12.5, 'queries': 10},
+            'verify_sale': {'p95_ms': 50.0, 'queries': 5},
+        }
+        self.assertEqual(compare(results, baseline), [
+            'sales_changelist: p95 10.0ms -> 12.5ms',
+            'sales_changelist: queries 9 -> 10',
+        ])
+        self.assertEqual(compare(results, baseline, tolerance=0.5), ['sales_changelist: queries 9 -> 10'])
+
+    def test_command_keepdb_needs_db_file(self):
+        with self.assertRaisesMessage(CommandError, '--keepdb needs --db-file.'):
+            call_command('benchmark', '--keepdb')
+
+
+class PopulateFakeDataTests(DerivedDataAssertions, TestCase):
+    """populate_fake_data's bulk modes: reproducible for a seed, derived data rebuilt."""
+
+    # Every run generates the same days, however long the previous one took
+    NOW = timezone.now()
+
+    def populate(self, *options):
+        with mock.patch('django.utils.timezone.now', return_value=self.NOW):
+            call_command(
+                'populate_fake_data', '--days', '12', '--users', '2', '--products', '8', '--sales-per-day', '6', *options,
+                stdout=StringIO(),
+            )
+        return dataset_rows()
+
+    def populate_and_roll_back(self, *options):
+        with transaction.atomic():
+            rows = self.populate(*options)
+            transaction.set_rollback(True)
+        return rows
+
+    def test_bulk_seed_reproducible(self):
+        first = self.populate_and_roll_back('--bulk', '--seed', '3')
+        self.assertNotEqual(self.populate_and_roll_back('--bulk', '--seed', '4'), first)
+        self.assertEqual(self.populate('--bulk', '--seed', '3'), first)
+        self.assertTrue(first['sales'])
+        self.assertFalse(Stock.objects.filter(quantity__lt=0).exists())
+        self.assertDerivedConsistent()
+
+    def test_workers_independent_of_worker_count(self):
+        options = ('--seed', '3', '--partition-days', '4')
+        first = self.populate_and_roll_back('--workers', '1', *options)
+        self.assertEqual(self.populate('--workers', '2', *options), first)
+        self.assertTrue(first['sales'])
+        self.assertFalse(Stock.objects.filter(quantity__lt=0).exists())
+        self.assertDerivedConsistent()
+
+
+class ServerTimingTests(SampleDataTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_staff_only(self):
+        url = reverse('admin:login')
+        self.assertNotIn('Server-Timing', self.client.get(url))
+
+        clerk = get_user_model().objects.create_user(username='clerk', email='clerk@example.com', password='clerk')
+        self.client.force_login(clerk)
+        self.assertNotIn('Server-Timing', self.client.get(url))
+
+        self.client.force_login(self.user)
+        self.assertRegex(self.client.get(reverse('admin:index'))['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", app;')
+
+    @override_settings(DEBUG=True)
+    def test_everyone_in_debug(self):
+        # Redirected to log in, without rendering a page
+        response = self.client.get(reverse('dashboard_widget', args=['kpis']))
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('Server-Timing', response)
+
+
+class ReadOnlyTests(SimpleTestCase):
+
+    def test_decorated_view_overlapping_threads(self):
+        # Both calls are inside the same decorated function at once
+        barrier = threading.Barrier(2, timeout=5)
+
+        @read_only()
+        def view():
+            barrier.wait()
+            return _read_only.get()
+
+        def request():
+            inside = view()
+            return inside, _read_only.get()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            results = [future.result() for future in [executor.submit(request) for _ in range(2)]]
+        self.assertEqual(results, [(True, False), (True, False)])
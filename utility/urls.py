@@ -0,0 +1,7 @@
+from django.contrib import admin
+from django.urls import path
+from .views import instrumentation_summary
+
+urlpatterns = [
+    path('', admin.site.admin_view(instrumentation_summary), name='instrumentation_summary'),
+]
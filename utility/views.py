@@ -1,3 +1,20 @@
+from django.contrib import admin
+from django.core.exceptions import PermissionDenied
 from django.shortcuts import render
+from .instrumentation import HISTORY_SIZE, REPEATED_QUERY_THRESHOLD, request_history, summary
 
-# Create your views here.
+
+def instrumentation_summary(request):
+    """Per view query counts and timings for the requests this process served recently."""
+    if not request.user.is_superuser:
+        raise PermissionDenied
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Request instrumentation',
+        'views': summary(),
+        'recorded': len(request_history()),
+        'history_size': HISTORY_SIZE,
+        'repeated_threshold': REPEATED_QUERY_THRESHOLD,
+    }
+    return render(request, 'utility/instrumentation.html', context)